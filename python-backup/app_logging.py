@@ -0,0 +1,181 @@
+# --- STRUCTURED LOGGING ---
+# print() helyett: a hívó szál csak egy LogRecord-ot tesz egy korlátos queue-ba
+# (QueueHandler), a formázás (JSON) és a stdout írás egy háttér szálon történik
+# (QueueListener). A job ID egy contextvar-ból kerül minden sorba, így a worker
+# szálak logjai is a jobhoz köthetők. A request log route-onként mintavételezett.
+
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json | text
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+# Path prefix: a sikeres kérések ekkora hányada kerül a logba (hibák mindig)
+# (a WebSocket kapcsolatok nem mennek át a HTTP middleware-en, azokra nincs mintavétel)
+DEFAULT_SAMPLE_RATES = {"/status": 0.01, "/health": 0.0, "/metrics": 0.0}
+
+job_ids_var = contextvars.ContextVar("job_ids", default=())
+
+logger = logging.getLogger("tube")
+_listener = None
+
+
+def get_logger(name):
+    return logger.getChild(name)
+
+
+def set_job_ids(job_ids):
+    """Az aktuális (async task / worker) kontextus jobjai; a token-nel visszaállítható"""
+    return job_ids_var.set(tuple(job_ids))
+
+
+class ContextFilter(logging.Filter):
+    # A hívó szálon fut (a queue előtt), itt még a helyes contextvar érték látszik
+    def filter(self, record):
+        record.job_ids = job_ids_var.get()
+        return True
+
+
+_exception_formatter = logging.Formatter()
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Teli queue esetén eldobja a rekordot (és számolja), a hot path sosem blokkol"""
+
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        # A stdlib prepare a hívó szálon formáz és törli az exc_info-t (a JSON "exc" mező így
+        # üres maradna): az üzenetet és a traceback-et szöveggé alakítjuk, a formázás a writer
+        # szálon marad. A traceback objektum (a frame-ekkel) nem utazik a queue-n.
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    _RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "job_ids"}
+
+    def format(self, record):
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        job_ids = getattr(record, "job_ids", ())
+        if len(job_ids) == 1:
+            entry["job_id"] = job_ids[0]
+        elif job_ids:
+            entry["job_ids"] = list(job_ids)
+        for key, value in record.__dict__.items():
+            if key not in self._RESERVED:
+                entry[key] = value
+        exc = self.formatException(record.exc_info) if record.exc_info else record.exc_text
+        if exc:
+            entry["exc"] = exc
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+
+class TextFormatter(logging.Formatter):
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)s %(name)s%(job_tag)s: %(message)s")
+
+    def format(self, record):
+        job_ids = getattr(record, "job_ids", ())
+        record.job_tag = f" [{','.join(job_ids)}]" if job_ids else ""
+        return super().format(record)
+
+
+def setup_logging(level=LOG_LEVEL, fmt=LOG_FORMAT, stream=None):
+    """A "tube" logger bekötése a queue -> háttér writer láncba (többszöri hívás no-op)"""
+    global _listener
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(stream or sys.stdout)
+    writer.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+    handler = DroppingQueueHandler(queue.Queue(LOG_QUEUE_SIZE))
+    handler.addFilter(ContextFilter())
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    _listener = logging.handlers.QueueListener(handler.queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging():
+    """A queue-ban maradt sorok kiírása, a writer szál leállítása"""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def parse_sample_rates(value):
+    rates = dict(DEFAULT_SAMPLE_RATES)
+    for item in filter(None, (value or "").split(",")):
+        prefix, _, rate = item.partition("=")
+        rates[prefix.strip()] = float(rate)
+    return rates
+
+
+SAMPLE_RATES = parse_sample_rates(os.getenv("LOG_SAMPLE_RATES"))
+# Hosszabb prefix előbb (pl. /download/zip a /download előtt)
+_SAMPLE_PREFIXES = sorted(SAMPLE_RATES.items(), key=lambda item: -len(item[0]))
+
+
+def sample_rate(path):
+    for prefix, rate in _SAMPLE_PREFIXES:
+        if path.startswith(prefix):
+            return rate
+    return 1.0
+
+
+request_logger = get_logger("http")
+
+
+async def log_requests(request, call_next):
+    """HTTP middleware: metódus, path, státusz, időtartam - headerek nélkül, mintavételezve"""
+    t0 = time.perf_counter()
+    response = await call_next(request)
+    if not request_logger.isEnabledFor(logging.INFO):
+        return response
+    path = request.url.path
+    if response.status_code < 400:
+        rate = sample_rate(path)
+        if rate <= 0 or (rate < 1 and random.random() >= rate):
+            return response
+    request_logger.info(
+        "%s %s %s", request.method, path, response.status_code,
+        extra={
+            "method": request.method,
+            "path": path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - t0) * 1000, 2),
+        },
+    )
+    return response
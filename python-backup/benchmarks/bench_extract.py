@@ -0,0 +1,113 @@
+# --- EXTRACT STAGE BENCHMARK ---
+# Stream copy fast path vs. teljes újrakódolás az EXTRACT lépésben, lokális fixture fájlokon.
+# Használat (python-backup könyvtárból):
+#   python benchmarks/bench_extract.py [--repeat 5] [--json out.json] [--compare baseline.json]
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import ExitStack
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from tube_audio_extractor import PreparedSource, ProgressReporter, cut_segments  # noqa: E402
+from compare import compare, print_regressions, load  # noqa: E402
+
+# (név, fájl kiterjesztés, ffmpeg encoder, yt-dlp acodec, output formátum)
+FIXTURES = [
+    ("opus-webm", "webm", "libopus", "opus", "opus"),
+    ("aac-m4a", "m4a", "aac", "mp4a.40.2", "m4a"),
+]
+DURATIONS = (60, 600)
+CLIP = (30, 33)  # 3 másodperces klip
+
+
+class QuietReporter(ProgressReporter):
+    def log(self, msg, *args, **fields):
+        pass
+
+
+def make_fixture(work_dir, name, ext, encoder, duration):
+    """Szinusz + zaj teszt forrás generálása (stereo, 48 kHz)"""
+    path = os.path.join(work_dir, f"{name}-{duration}s.{ext}")
+    subprocess.run([
+        "ffmpeg", "-v", "error", "-y",
+        "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={duration}",
+        "-f", "lavfi", "-i", f"anoisesrc=amplitude=0.05:sample_rate=48000:duration={duration}",
+        "-filter_complex", "amix=inputs=2,pan=stereo|c0=c0|c1=c0",
+        "-c:a", encoder, "-b:a", "128k", path,
+    ], check=True)
+    return path
+
+
+def children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run_cut(path, acodec, duration, output_format, precise):
+    info = {"acodec": acodec, "duration": duration, "title": "fixture"}
+    source = PreparedSource(info, path, 0, tempfile.mkdtemp(prefix="bench-src-"), ExitStack())
+    wall0, cpu0 = time.perf_counter(), children_cpu()
+    with source:
+        result = cut_segments(source, [(CLIP[0], CLIP[1], output_format)], QuietReporter(), precise)[0]
+    wall, cpu = time.perf_counter() - wall0, children_cpu() - cpu0
+    if isinstance(result, Exception):
+        raise result
+    shutil.rmtree(result[1], ignore_errors=True)
+    return wall, cpu
+
+
+def main():
+    parser = argparse.ArgumentParser(description="EXTRACT stage benchmark: stream copy vs re-encode")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--json", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON: flag regressions (exit code 1)")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    results = []
+    work_dir = tempfile.mkdtemp(prefix="bench-fixtures-")
+    try:
+        for name, ext, encoder, acodec, output_format in FIXTURES:
+            for duration in DURATIONS:
+                path = make_fixture(work_dir, name, ext, encoder, duration)
+                # baseline-mp3: a korábbi (mindig mp3/wav újrakódoló) EXTRACT út
+                modes = (("copy", False, output_format), ("re-encode", True, output_format), ("baseline-mp3", True, "mp3"))
+                for mode, precise, fmt in modes:
+                    samples = [run_cut(path, acodec, duration, fmt, precise) for _ in range(args.repeat)]
+                    walls = sorted(s[0] for s in samples)
+                    cpus = sorted(s[1] for s in samples)
+                    row = {
+                        "fixture": name,
+                        "source_seconds": duration,
+                        "output_format": fmt,
+                        "mode": mode,
+                        "wall_median_ms": round(walls[len(walls) // 2] * 1000, 2),
+                        "cpu_median_ms": round(cpus[len(cpus) // 2] * 1000, 2),
+                    }
+                    results.append(row)
+                    print(f"{name:10} {duration:5}s {fmt:5} {mode:12} "
+                          f"wall {row['wall_median_ms']:8.2f}ms  cpu {row['cpu_median_ms']:8.2f}ms")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {"benchmark": "extract", "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        regressions = compare(load(args.compare), report, args.threshold)
+        print_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
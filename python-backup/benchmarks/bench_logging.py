@@ -0,0 +1,155 @@
+# --- LOGGING OVERHEAD BENCHMARK ---
+# A régi print() alapú request log middleware / worker log vs. az app_logging
+# (queue + háttér writer, mintavételezés) overheadje. A kimenet /dev/null-ba megy,
+# de valódi fájl leírón keresztül, így a szinkron write + flush költsége benne van.
+# Használat (python-backup könyvtárból):
+#   python benchmarks/bench_logging.py [--requests 5000] [--json out.json] [--compare baseline.json]
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compare import compare, print_regressions, load  # noqa: E402
+
+HEADERS = {
+    "user-agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0",
+    "accept": "application/json",
+    "accept-language": "en-US,en;q=0.9",
+    "origin": "https://tube-soundboard.example",
+    "referer": "https://tube-soundboard.example/",
+}
+
+
+async def legacy_log_requests(request, call_next):
+    # A korábbi main.py middleware, változatlanul
+    print(f"Incoming request: {request.method} {request.url}")
+    print(f"Headers: {dict(request.headers)}")
+    response = await call_next(request)
+    print(f"Response status: {response.status_code}")
+    return response
+
+
+def make_app(middleware):
+    from fastapi import FastAPI
+
+    app = FastAPI()
+    if middleware is not None:
+        app.middleware("http")(middleware)
+
+    @app.get("/status/{job_id}")
+    def status(job_id: str):
+        return {"job_id": job_id, "status": "running", "progress": 42}
+
+    return app
+
+
+async def bench_requests(app, paths, requests, concurrency):
+    import httpx
+
+    latencies = []
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", headers=HEADERS) as client:
+        async def worker(n):
+            for i in range(n, requests, concurrency):
+                t0 = time.perf_counter()
+                await client.get(paths[i % len(paths)])
+                latencies.append(time.perf_counter() - t0)
+
+        t0 = time.perf_counter()
+        await asyncio.gather(*(worker(n) for n in range(concurrency)))
+        wall = time.perf_counter() - t0
+    return sorted(latencies), wall
+
+
+def bench_worker_lines(log_line, lines, threads):
+    """Worker szálak log sorai (ProgressReporter.log): szálanként `lines` hívás"""
+    def run():
+        for i in range(lines):
+            log_line(f"🔄 [STEP] EXTRACT: Audio extraction and conversion - segment {i} (70%)")
+
+    workers = [threading.Thread(target=run) for _ in range(threads)]
+    t0 = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    return time.perf_counter() - t0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Request / worker logging overhead: print() vs app_logging")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--lines", type=int, default=20000, help="Worker log lines per thread")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--json", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON: flag regressions (exit code 1)")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    import app_logging
+
+    devnull = open(os.devnull, "w")
+    app_logging.setup_logging(stream=devnull)
+    worker_logger = app_logging.get_logger("bench")
+    # /status polling: a tipikus hot path (alapból 1% mintavétel)
+    paths = [f"/status/job-{i}" for i in range(100)]
+    variants = (
+        ("none", None),
+        ("print", legacy_log_requests),
+        ("app_logging", app_logging.log_requests),
+    )
+
+    results = []
+    with contextlib.redirect_stdout(devnull):
+        for name, middleware in variants:
+            latencies, wall = asyncio.run(bench_requests(make_app(middleware), paths, args.requests, args.concurrency))
+            results.append({
+                "scenario": "request",
+                "logging": name,
+                "p50_ms": round(latencies[len(latencies) // 2] * 1000, 3),
+                "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 3),
+                "throughput_rps": round(len(latencies) / wall, 1),
+            })
+        for name, log_line in (
+            ("print", lambda msg: print(msg, flush=True)),
+            ("app_logging", worker_logger.info),
+        ):
+            wall = bench_worker_lines(log_line, args.lines, args.threads)
+            total = args.lines * args.threads
+            results.append({
+                "scenario": "worker_lines",
+                "logging": name,
+                "per_line_ms": round(wall / total * 1000, 6),
+                "throughput_rps": round(total / wall, 1),
+            })
+    app_logging.shutdown_logging()
+    devnull.close()
+
+    for row in results:
+        if row["scenario"] == "request":
+            print(f"request      {row['logging']:12} p50 {row['p50_ms']:7.3f}ms  p95 {row['p95_ms']:7.3f}ms  "
+                  f"{row['throughput_rps']:9.1f} req/s")
+        else:
+            print(f"worker_lines {row['logging']:12} {row['throughput_rps']:11.1f} lines/s")
+
+    report = {"benchmark": "logging", "results": results}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        regressions = compare(load(args.compare), report, args.threshold)
+        print_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+# --- PIPELINE / API BENCHMARK ---
+# Offline benchmark: a yt-dlp egy stubbal van helyettesítve, ami lokális fixture fájlokat
+# "tölt le", így a mérés hálózat nélkül, ismételhetően fut.
+# - stages: extract_audio_segment lépésenkénti ideje (VALIDATE, DOWNLOAD, TIMESTAMP, FORMAT, EXTRACT),
+#   hideg (új videó ID, üres cache) és meleg (cache-elt forrás / metadata) futásra
+# - load: /extract, /batch, /status, /download terhelés növekvő párhuzamossággal (in-process ASGI)
+# - playlist: N videós playlist egyenként (/extract kérések egymás után, a régi kliens mód)
+#   vs. egyetlen /playlist kérés (letöltés / encode átfedésben); a stub letöltés
+#   --bandwidth-mbps sávszélességre fojtható, hogy a hálózati idő is látszódjon
+# Használat (python-backup könyvtárból):
+#   python benchmarks/bench_pipeline.py [--repeat 5] [--json out.json] [--compare baseline.json]
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import types
+
+# Izolált cache / registry könyvtárak - még a pipeline modulok importja előtt
+BENCH_DIR = tempfile.mkdtemp(prefix="bench-pipeline-")
+os.environ.setdefault("SOURCE_CACHE_DIR", os.path.join(BENCH_DIR, "source-cache"))
+os.environ.setdefault("PCM_CACHE_DIR", os.path.join(BENCH_DIR, "pcm-cache"))
+os.environ.setdefault("REGISTRY_BACKEND", "memory")
+os.environ.setdefault("RANGE_FETCH", "0")
+# Azonos kérések dedup-ja nélkül: a terhelés a pipeline-t méri, nem a registry találatot
+os.environ.setdefault("OUTPUT_DEDUP", "0")
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_extract import FIXTURES, make_fixture  # noqa: E402
+from compare import compare, print_regressions, load  # noqa: E402
+
+STAGES = ("VALIDATE", "DOWNLOAD", "TIMESTAMP", "FORMAT", "EXTRACT")
+DURATIONS = (60, 600, 3600)
+CLIP = ("0:30", "0:33")
+CONCURRENCY = (1, 4, 16, 64)
+BATCH_SIZE = 4
+
+
+# --- yt-dlp stub ---
+class StubYoutubeDL:
+    """A YoutubeDL felület általunk használt része, lokális fixture fájlokkal"""
+
+    media = {}  # video_id: (path, acodec, ext, duration)
+    playlists = {}  # list_id: [video_id, ...]
+    bandwidth = None  # byte/s a szimulált letöltéshez (None: fojtás nélkül)
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def extract_info(self, url, download=False):
+        from tube_audio_extractor import extract_video_id
+
+        list_id = url.partition("list=")[2].partition("&")[0]
+        if list_id in self.playlists:
+            return {
+                "_type": "playlist",
+                "id": list_id,
+                "title": f"fixture playlist {list_id}",
+                "entries": [
+                    {"_type": "url", "id": video_id, "url": f"https://www.youtube.com/watch?v={video_id}",
+                     "title": f"fixture {video_id}"}
+                    for video_id in self.playlists[list_id]
+                ],
+            }
+        video_id = extract_video_id(url)
+        if video_id not in self.media:
+            raise RuntimeError(f"Unknown fixture video: {url}")
+        path, acodec, ext, duration = self.media[video_id]
+        return {
+            "id": video_id,
+            "format_id": "fixture",
+            "title": f"fixture {video_id}",
+            "duration": duration,
+            "acodec": acodec,
+            "ext": ext,
+            "url": path,
+            "protocol": "file",
+            "uploader": "bench",
+            "view_count": 0,
+            "thumbnail": "",
+        }
+
+    def prepare_filename(self, info):
+        return self.opts["outtmpl"] % info
+
+    def process_ie_result(self, info, download=True):
+        path = self.prepare_filename(info)
+        total = os.path.getsize(info["url"])
+        hooks = self.opts.get("progress_hooks", [])
+        downloaded = 0
+        with open(info["url"], "rb") as src, open(path, "wb") as dst:
+            while chunk := src.read(1024 * 1024):
+                dst.write(chunk)
+                downloaded += len(chunk)
+                if self.bandwidth:
+                    time.sleep(len(chunk) / self.bandwidth)
+                for hook in hooks:
+                    hook({"status": "downloading", "downloaded_bytes": downloaded, "total_bytes": total})
+        for hook in hooks:
+            hook({"status": "finished", "downloaded_bytes": downloaded, "total_bytes": total})
+        return {**info, "requested_downloads": [{"filepath": path}]}
+
+
+def install_stub():
+    sys.modules["yt_dlp"] = types.SimpleNamespace(YoutubeDL=StubYoutubeDL)
+
+
+def register_video(video_id, fixture):
+    StubYoutubeDL.media[video_id] = fixture
+    return f"https://www.youtube.com/watch?v={video_id}"
+
+
+def register_playlist(list_id, video_ids):
+    StubYoutubeDL.playlists[list_id] = list(video_ids)
+    return f"https://www.youtube.com/playlist?list={list_id}"
+
+
+# --- helpers ---
+def percentile(values, q):
+    values = sorted(values)
+    return values[min(int(len(values) * q), len(values) - 1)] if values else 0.0
+
+
+@contextlib.contextmanager
+def quiet(enabled=True):
+    # A pipeline és a request log middleware print-jei ne torzítsák a mérést
+    if not enabled:
+        yield
+        return
+    with contextlib.redirect_stdout(io.StringIO()):
+        yield
+
+
+# --- stage timings ---
+def stage_reporter():
+    from tube_audio_extractor import ProgressReporter
+
+    class StageTimer(ProgressReporter):
+        def __init__(self):
+            super().__init__()
+            self.timings = {}
+
+        def log(self, msg, *args, **fields):
+            pass
+
+        def complete(self, step, elapsed, detail):
+            self.timings[step] = elapsed
+
+    return StageTimer()
+
+
+def bench_stages(fixtures, repeat, verbose):
+    from tube_audio_extractor import extract_audio_segment
+
+    rows = []
+    for name, duration, fixture, output_format in fixtures:
+        for cache in ("cold", "warm"):
+            samples = []
+            for i in range(repeat):
+                # cold: minden futás új videó ID (metadata + forrás cache miss), warm: ugyanaz
+                video_id = f"{name}-{duration}-cold{i}" if cache == "cold" else f"{name}-{duration}-warm"
+                url = register_video(video_id, fixture)
+                if cache == "warm" and i == 0:
+                    with quiet(not verbose):
+                        _, temp_dir, _ = extract_audio_segment(url, *CLIP, output_format)
+                    shutil.rmtree(temp_dir, ignore_errors=True)
+                reporter = stage_reporter()
+                t0 = time.perf_counter()
+                with quiet(not verbose):
+                    _, temp_dir, _ = extract_audio_segment(url, *CLIP, output_format, progress=reporter)
+                reporter.timings["TOTAL"] = time.perf_counter() - t0
+                shutil.rmtree(temp_dir, ignore_errors=True)
+                samples.append(reporter.timings)
+            for stage in STAGES + ("TOTAL",):
+                values = [s.get(stage, 0.0) for s in samples]
+                row = {
+                    "fixture": name,
+                    "source_seconds": duration,
+                    "output_format": output_format,
+                    "cache": cache,
+                    "stage": stage,
+                    "median_ms": round(percentile(values, 0.5) * 1000, 2),
+                    "p95_ms": round(percentile(values, 0.95) * 1000, 2),
+                }
+                rows.append(row)
+                print(f"{name:10} {duration:5}s {cache:5} {stage:9} "
+                      f"median {row['median_ms']:9.2f}ms  p95 {row['p95_ms']:9.2f}ms")
+    return rows
+
+
+# --- API load ---
+async def wait_for_job(client, job_id, poll=0.02):
+    while True:
+        job = (await client.get(f"/status/{job_id}")).json()
+        if job["status"] in ("done", "error", "cancelled"):
+            return job
+        await asyncio.sleep(poll)
+
+
+async def run_level(concurrency, per_worker, request):
+    """`concurrency` worker, mindegyik `per_worker` kérést küld egymás után"""
+    latencies, errors = [], 0
+
+    async def worker():
+        nonlocal errors
+        for _ in range(per_worker):
+            t0 = time.perf_counter()
+            ok = await request()
+            latencies.append(time.perf_counter() - t0)
+            errors += 0 if ok else 1
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    wall = time.perf_counter() - t0
+    return latencies, errors, wall
+
+
+async def bench_load(fixture, output_format, levels, per_worker):
+    import httpx
+    import main as api
+
+    url = register_video("load-fixture", fixture)
+    body = {"youtube_url": url, "start_time": CLIP[0], "end_time": CLIP[1], "output_format": output_format}
+    rows = []
+    transport = httpx.ASGITransport(app=api.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+        # Egy kész job / fájl a /status és /download méréshez (és meleg forrás cache)
+        job_id = (await client.post("/extract", json=body)).json()["job_id"]
+        file_id = (await wait_for_job(client, job_id))["file_id"]
+
+        async def extract():
+            resp = await client.post("/extract", json=body)
+            if resp.status_code != 200:
+                return False
+            return (await wait_for_job(client, resp.json()["job_id"]))["status"] == "done"
+
+        async def batch():
+            resp = await client.post("/batch", json={"requests": [body] * BATCH_SIZE})
+            if resp.status_code != 200:
+                return False
+            jobs = await asyncio.gather(*(wait_for_job(client, j) for j in resp.json()["job_ids"]))
+            return all(job["status"] == "done" for job in jobs)
+
+        async def status():
+            return (await client.get(f"/status/{job_id}")).status_code == 200
+
+        async def download():
+            resp = await client.get(f"/download/{file_id}")
+            return resp.status_code == 200 and len(resp.content) > 0
+
+        for endpoint, request in (("/extract", extract), ("/batch", batch), ("/status", status), ("/download", download)):
+            for concurrency in levels:
+                latencies, errors, wall = await run_level(concurrency, per_worker, request)
+                row = {
+                    "endpoint": endpoint,
+                    "concurrency": concurrency,
+                    "requests": len(latencies),
+                    "errors": errors,
+                    "p50_ms": round(percentile(latencies, 0.5) * 1000, 2),
+                    "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+                    "throughput_rps": round(len(latencies) / wall, 2) if wall else 0.0,
+                }
+                rows.append(row)
+                print(f"{endpoint:10} c={concurrency:<3} p50 {row['p50_ms']:9.2f}ms  "
+                      f"p95 {row['p95_ms']:9.2f}ms  {row['throughput_rps']:8.2f} req/s  errors {errors}",
+                      file=sys.__stdout__)
+    return rows
+
+
+async def bench_playlist(fixture, output_format, videos, segments, bandwidth):
+    import httpx
+    import main as api
+
+    clips = [(f"0:{10 + 5 * i:02d}", f"0:{13 + 5 * i:02d}") for i in range(segments)]
+    StubYoutubeDL.bandwidth = bandwidth
+    rows = []
+    try:
+        transport = httpx.ASGITransport(app=api.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=600) as client:
+            for mode in ("serial", "pipeline"):
+                # Módonként új videó ID-k: mindkettő hideg source cache-ből indul
+                video_ids = [f"pl-{mode}-{i}" for i in range(videos)]
+                urls = [register_video(video_id, fixture) for video_id in video_ids]
+                t0 = time.perf_counter()
+                if mode == "serial":
+                    jobs = []
+                    for url in urls:
+                        for start, end in clips:
+                            body = {"youtube_url": url, "start_time": start, "end_time": end, "output_format": output_format}
+                            job_id = (await client.post("/extract", json=body)).json()["job_id"]
+                            jobs.append(await wait_for_job(client, job_id))
+                else:
+                    body = {
+                        "playlist_url": register_playlist(f"bench-{mode}", video_ids),
+                        "default_segments": [
+                            {"start_time": start, "end_time": end, "output_format": output_format} for start, end in clips
+                        ],
+                    }
+                    resp = await client.post("/playlist", json=body)
+                    resp.raise_for_status()
+                    jobs = await asyncio.gather(*(wait_for_job(client, j) for j in resp.json()["job_ids"]))
+                wall = time.perf_counter() - t0
+                errors = sum(1 for job in jobs if job["status"] != "done")
+                row = {
+                    "scenario": "playlist",
+                    "mode": mode,
+                    "videos": videos,
+                    "segments_per_video": segments,
+                    "errors": errors,
+                    "wall_ms": round(wall * 1000, 2),
+                    "per_video_ms": round(wall / videos * 1000, 2),
+                }
+                rows.append(row)
+                print(f"playlist   {mode:8} {videos} videos x {segments} clips  wall {row['wall_ms']:10.2f}ms  "
+                      f"per video {row['per_video_ms']:9.2f}ms  errors {errors}", file=sys.__stdout__)
+    finally:
+        StubYoutubeDL.bandwidth = None
+    return rows
+
+
+async def bench_api(args, fixtures):
+    """load + playlist egy scheduler életciklusban (a leállítás a poolokat is lezárja)"""
+    import main as api
+
+    load_rows, playlist_rows = [], []
+    await api.start_scheduler()
+    try:
+        if not args.skip_load:
+            # Terheléshez a legrövidebb fixture: a queue / pool viselkedést mérjük, nem az ffmpeg-et
+            _, _, fixture, output_format = min(fixtures, key=lambda f: f[1])
+            load_rows = await bench_load(fixture, output_format, args.concurrency, args.per_worker)
+        if not args.skip_playlist:
+            # A leghosszabb fixture: a letöltés és a vágás ideje is számottevő
+            _, _, fixture, output_format = max(fixtures, key=lambda f: f[1])
+            bandwidth = args.bandwidth_mbps * 1024 * 1024 / 8 if args.bandwidth_mbps else None
+            playlist_rows = await bench_playlist(
+                fixture, output_format, args.playlist_videos, args.playlist_segments, bandwidth
+            )
+    finally:
+        await api.stop_scheduler()
+    return load_rows, playlist_rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline pipeline + API benchmark (stubbed yt-dlp)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per fixture for stage timings")
+    parser.add_argument("--durations", type=int, nargs="+", default=list(DURATIONS), help="Fixture lengths (s)")
+    parser.add_argument("--concurrency", type=int, nargs="+", default=list(CONCURRENCY))
+    parser.add_argument("--per-worker", type=int, default=2, help="Sequential requests per concurrent client")
+    parser.add_argument("--skip-stages", action="store_true")
+    parser.add_argument("--skip-load", action="store_true")
+    parser.add_argument("--skip-playlist", action="store_true")
+    parser.add_argument("--playlist-videos", type=int, default=8)
+    parser.add_argument("--playlist-segments", type=int, default=2, help="Clips per playlist video")
+    parser.add_argument("--bandwidth-mbps", type=float, default=40.0,
+                        help="Simulated download speed for the playlist scenario (0 = unthrottled)")
+    parser.add_argument("--json", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON: flag regressions (exit code 1)")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    parser.add_argument("--verbose", action="store_true", help="Keep pipeline log output")
+    args = parser.parse_args()
+
+    install_stub()
+    report = {"benchmark": "pipeline", "stages": [], "load": [], "playlist": []}
+    fixture_dir = os.path.join(BENCH_DIR, "fixtures")
+    os.makedirs(fixture_dir)
+    try:
+        fixtures = []
+        for name, ext, encoder, acodec, output_format in FIXTURES:
+            for duration in args.durations:
+                path = make_fixture(fixture_dir, name, ext, encoder, duration)
+                fixtures.append((name, duration, (path, acodec, ext, duration), output_format))
+
+        if not args.skip_stages:
+            report["stages"] = bench_stages(fixtures, args.repeat, args.verbose)
+        if not (args.skip_load and args.skip_playlist):
+            with quiet(not args.verbose):
+                report["load"], report["playlist"] = asyncio.run(bench_api(args, fixtures))
+    finally:
+        shutil.rmtree(BENCH_DIR, ignore_errors=True)
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        regressions = compare(load(args.compare), report, args.threshold)
+        print_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
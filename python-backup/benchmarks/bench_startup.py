@@ -0,0 +1,111 @@
+# --- COLD START BENCHMARK ---
+# Konténer / serverless cold start: `import main` ideje, az első /health válaszig eltelt
+# idő (friss interpreterben, startup eventekkel), és egy -X importtime profil arról,
+# hogy melyik modul importja mennyi (kumulált) időt visz el.
+# Használat (python-backup könyvtárból):
+#   python benchmarks/bench_startup.py [--repeat 5] [--top 15] [--json out.json] [--compare baseline.json]
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from compare import compare, print_regressions, load  # noqa: E402
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_MAIN = """
+import time
+t0 = time.perf_counter()
+import main
+print(time.perf_counter() - t0)
+"""
+
+FIRST_REQUEST = """
+import time
+t0 = time.perf_counter()
+import main
+from fastapi.testclient import TestClient
+with TestClient(main.app) as client:
+    assert client.get("/health").status_code == 200
+    print(time.perf_counter() - t0)
+"""
+
+
+def run_python(code, *flags):
+    env = {**os.environ, "YDL_POOL_WARM": os.getenv("YDL_POOL_WARM", "1")}
+    return subprocess.run(
+        [sys.executable, *flags, "-c", code], cwd=APP_DIR, env=env,
+        capture_output=True, text=True, check=True,
+    )
+
+
+def timed(code, repeat):
+    samples = sorted(float(run_python(code).stdout.strip().splitlines()[-1]) for _ in range(repeat))
+    return samples[len(samples) // 2]
+
+
+def import_profile(top):
+    """-X importtime: a `top` leglassabb import kumulált ideje (mélységgel), és a betöltött modulok"""
+    stderr = run_python("import main", "-X", "importtime").stderr
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        cumulative = cumulative.strip()
+        if not cumulative.isdigit():
+            continue  # fejléc sor
+        name = name[1:]  # a "|" utáni szóköz, utána 2 szóköz / mélység
+        depth = (len(name) - len(name.lstrip())) // 2
+        modules[name.strip()] = (int(cumulative), depth)
+    loaded = set(modules)
+    ranked = sorted(modules.items(), key=lambda item: -item[1][0])[:top]
+    rows = [
+        {"module": name, "depth": depth, "import_cumulative_ms": round(us / 1000, 2)}
+        for name, (us, depth) in ranked
+    ]
+    return rows, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold start benchmark: import time and time to first request")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=15, help="Slowest imports to report")
+    parser.add_argument("--json", help="Write results as JSON to this path")
+    parser.add_argument("--compare", help="Baseline JSON: flag regressions (exit code 1)")
+    parser.add_argument("--threshold", type=float, default=0.15)
+    args = parser.parse_args()
+
+    phases = [
+        {"phase": "import_main", "wall_ms": round(timed(IMPORT_MAIN, args.repeat) * 1000, 2)},
+        {"phase": "first_request", "wall_ms": round(timed(FIRST_REQUEST, args.repeat) * 1000, 2)},
+    ]
+    imports, loaded = import_profile(args.top)
+    # Lusta importok: ezek nem kellenek a szerver indulásához
+    lazy = {name: name not in loaded for name in ("yt_dlp", "uvicorn", "numpy", "httpx", "validators")}
+
+    for row in phases:
+        print(f"{row['phase']:14} {row['wall_ms']:9.2f}ms")
+    print("\nSlowest imports (cumulative):")
+    for row in imports:
+        print(f"  {row['import_cumulative_ms']:9.2f}ms  {'  ' * row['depth']}{row['module']}")
+    print("\nDeferred until first use: " + ", ".join(f"{name}={'yes' if v else 'NO'}" for name, v in lazy.items()))
+
+    report = {"benchmark": "startup", "phases": phases, "imports": imports, "lazy_imports": lazy}
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        # Az import profil sorai gépfüggők, csak a fázisokat hasonlítjuk
+        baseline = load(args.compare)
+        regressions = compare({"phases": baseline.get("phases", [])}, {"phases": phases}, args.threshold)
+        print_regressions(regressions, args.threshold)
+        sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
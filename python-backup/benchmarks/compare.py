@@ -0,0 +1,93 @@
+# --- BENCHMARK COMPARE ---
+# Két benchmark JSON (bench_extract / bench_pipeline --json) összevetése, regressziók jelzése.
+# Használat (python-backup könyvtárból):
+#   python benchmarks/compare.py baseline.json current.json [--threshold 0.15]
+# Kilépési kód 1, ha van regresszió (CI-ben is használható).
+
+import argparse
+import json
+import sys
+
+# Metrika mezők a név végződése alapján: *_ms kisebb a jobb, *_rps nagyobb a jobb
+LOWER_IS_BETTER = "_ms"
+HIGHER_IS_BETTER = "_rps"
+# Nem metrika és nem is kulcs (futásonként változhat)
+IGNORED_FIELDS = ("errors", "requests", "rejected")
+
+
+def _is_metric(field):
+    return field.endswith(LOWER_IS_BETTER) or field.endswith(HIGHER_IS_BETTER)
+
+
+def _rows(report):
+    """(kulcs, sor) párok: a kulcs a szekció neve + a sor nem metrika mezői"""
+    for section, rows in report.items():
+        if not isinstance(rows, list):
+            continue
+        for row in rows:
+            identity = tuple(sorted(
+                (k, v) for k, v in row.items() if not _is_metric(k) and k not in IGNORED_FIELDS
+            ))
+            yield (section,) + identity, row
+
+
+def compare(baseline, current, threshold=0.15, min_delta_ms=5.0):
+    """
+    Regressziók listája: [(kulcs, mező, baseline érték, aktuális érték, relatív változás)]
+    - threshold: ennyi relatív romlás felett jelez
+    - min_delta_ms: *_ms metrikáknál ennél kisebb abszolút romlás zajnak számít
+    """
+    base = dict(_rows(baseline))
+    regressions = []
+    for key, row in _rows(current):
+        old_row = base.get(key)
+        if old_row is None:
+            continue
+        for field, new in row.items():
+            old = old_row.get(field)
+            if not _is_metric(field) or not old or new is None:
+                continue
+            change = (new - old) / old
+            if field.endswith(LOWER_IS_BETTER):
+                worse = change > threshold and new - old > min_delta_ms
+            else:
+                worse = change < -threshold
+            if worse:
+                regressions.append((key, field, old, new, change))
+    return regressions
+
+
+def format_key(key):
+    section, *fields = key
+    return f"{section} " + " ".join(f"{k}={v}" for k, v in fields)
+
+
+def print_regressions(regressions, threshold):
+    if not regressions:
+        print(f"✅ No regressions (threshold {threshold:.0%})")
+        return
+    print(f"❌ {len(regressions)} regression(s) (threshold {threshold:.0%}):")
+    for key, field, old, new, change in regressions:
+        print(f"  {format_key(key)}: {field} {old} -> {new} ({change:+.1%})")
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark JSON reports")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.15, help="Relative change that counts as a regression")
+    parser.add_argument("--min-delta-ms", type=float, default=5.0, help="Ignore smaller absolute slowdowns")
+    args = parser.parse_args()
+
+    regressions = compare(load(args.baseline), load(args.current), args.threshold, args.min_delta_ms)
+    print_regressions(regressions, args.threshold)
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+# --- JOB CANCELLATION ---
+# Megszakítható pipeline: egy CancelToken a job (vagy batch csoport) összes blokkoló
+# lépéséhez. A token contextvar-ban utazik (a scheduler a worker szálra is átviszi),
+# így a mélyen lévő lépések is látják:
+# - track(process): a futó ffmpeg gyerek folyamat regisztrálása - cancel() azonnal leállítja
+# - check(): a lépések határán (és a yt-dlp progress hookban) JobCancelled-t dob
+# A szál a leállított folyamat után a szokásos hibaágon takarít (temp könyvtár, cache pin).
+# child(): egy lépés / videó saját tokenje - a szülő cancel-je rá is átterjed, de az ő
+# cancel-je (pl. lejárt stage határidő) a szülőt és a testvéreit nem érinti.
+
+import contextvars
+import subprocess
+import threading
+from contextlib import contextmanager
+
+TERMINATE_GRACE = 2.0  # sec a SIGTERM és a SIGKILL között
+
+
+class JobCancelled(Exception):
+    """A job megszakítva (DELETE /jobs/{job_id} vagy lejárt stage határidő)"""
+
+
+class CancelToken:
+    def __init__(self, parent=None):
+        self.reason = None
+        self._event = threading.Event()
+        self._processes = set()
+        self._children = set()
+        self._lock = threading.Lock()
+        self._parent = parent
+        if parent is not None:
+            parent._adopt(self)
+
+    def child(self):
+        return CancelToken(parent=self)
+
+    def detach(self):
+        """A lépés végén: a szülő ne tartsa tovább számon (és ne cancel-elje)"""
+        if self._parent is not None:
+            with self._parent._lock:
+                self._parent._children.discard(self)
+
+    def _adopt(self, child):
+        with self._lock:
+            if not self._event.is_set():
+                self._children.add(child)
+                return
+        child.cancel(self.reason)
+
+    @property
+    def cancelled(self):
+        return self._event.is_set()
+
+    def cancel(self, reason="Job cancelled"):
+        with self._lock:
+            if self._event.is_set():
+                return
+            self.reason = reason
+            self._event.set()
+            processes = list(self._processes)
+            children = list(self._children)
+            self._children.clear()
+        for process in processes:
+            _stop(process)
+        for child in children:
+            child.cancel(reason)
+
+    def check(self):
+        if self._event.is_set():
+            raise JobCancelled(self.reason)
+
+    @contextmanager
+    def track(self, process):
+        with self._lock:
+            self._processes.add(process)
+            cancelled = self._event.is_set()
+        if cancelled:
+            _stop(process)
+        try:
+            yield process
+        finally:
+            with self._lock:
+                self._processes.discard(process)
+
+
+def _stop(process):
+    if process.poll() is not None:
+        return
+    process.terminate()
+    # A kill ne a cancel() hívóját (event loop) blokkolja
+    def reap():
+        try:
+            process.wait(TERMINATE_GRACE)
+        except subprocess.TimeoutExpired:
+            process.kill()
+    threading.Thread(target=reap, daemon=True).start()
+
+
+current_token = contextvars.ContextVar("cancel_token", default=None)
+
+
+def check():
+    """Az aktuális kontextus tokenjének ellenőrzése (token nélkül no-op)"""
+    token = current_token.get()
+    if token is not None:
+        token.check()
+
+
+@contextmanager
+def track(process):
+    """Gyerek folyamat hozzárendelése az aktuális tokenhez (token nélkül no-op)"""
+    token = current_token.get()
+    if token is None:
+        yield process
+        return
+    with token.track(process):
+        yield process
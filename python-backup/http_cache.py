@@ -0,0 +1,64 @@
+# --- HTTP CACHE / RANGE HELPERS ---
+# A /download validátorai és részleges válaszai:
+# - content_etag: erős ETag a fájl tartalmából (sha256), egyszer, az encode végén
+#   számolva és a file registryben tárolva
+# - etag_matches: If-None-Match / If-Range összevetés
+# - parse_range: egyetlen "bytes=" tartomány (206), több tartomány esetén a teljes fájl megy (200)
+# - iter_file_range: a kért byte tartomány chunkonként
+
+import hashlib
+
+CHUNK_SIZE = 256 * 1024
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def content_etag(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def etag_matches(header, etag):
+    """If-None-Match: "*" vagy vesszővel elválasztott lista (a W/ prefix a gyenge összevetéshez elhagyható)"""
+    if not header or not etag:
+        return False
+    if header.strip() == "*":
+        return True
+    return any(candidate.strip().removeprefix("W/") == etag for candidate in header.split(","))
+
+
+def parse_range(header, size):
+    """
+    "bytes=start-end" / "bytes=start-" / "bytes=-suffix" -> (start, end) zárt intervallum.
+    None: nem teljesíthető (416); ValueError: nem értelmezhető vagy több tartomány (200, teljes fájl).
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        raise ValueError(header)
+    first, _, last = spec.strip().partition("-")
+    if not first:
+        suffix = int(last)
+        if suffix <= 0 or size == 0:
+            return None
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if start >= size:
+        return None
+    end = int(last) if last else size - 1
+    if start > end:
+        raise ValueError(header)
+    return start, min(end, size - 1)
+
+
+def iter_file_range(path, start, end, chunk_size=CHUNK_SIZE):
+    with open(path, "rb") as f:
+        f.seek(start)
+        remaining = end - start + 1
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
@@ -3,26 +3,65 @@
 
 
 # --- REST API PREPARATION ---
-from fastapi import FastAPI, HTTPException, BackgroundTasks, WebSocket, WebSocketDisconnect
-from fastapi.responses import FileResponse, JSONResponse
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import FileResponse, JSONResponse, RedirectResponse, StreamingResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import uvicorn
 import os
+import re
+import asyncio
 import uuid
+import shutil
+import tempfile
 import threading
-from tube_audio_extractor import extract_audio_segment
+import time
+from contextlib import aclosing
+from tube_audio_extractor import (
+    extract_video_id, parse_timestamp, prepare_source, PreparedSource, cut_segments, segments_window,
+    resolve_video_info, ProgressReporter, MEDIA_TYPES, OUTPUT_FORMATS, validate_segment, segment_stream_command, fix_wav_header,
+)
+from streaming import stream_command
+from source_cache import source_cache
+from video_info_cache import video_info_cache
+from thumbnails import thumbnail_resolver, THUMBNAIL_ORDER, SCREENSHOT_ORDER
+from ydl_pool import ydl_pool
+from cancellation import CancelToken, current_token
+from scheduler import scheduler, QueueFullError, PRIORITY_INTERACTIVE, PRIORITY_BATCH
+from registry import registry, MemoryRegistry, TERMINAL_STATUSES
+from progress_events import progress_bus
+import pcm_store
+from waveform import peaks_window, cached_peaks, build_peaks, peaks_cache
+from zip_export import iter_zip
+from playlist import resolve_playlist, plan_playlist
+from segmentation import analyze_segments, validate_segment_params
+from sprite import sprite_key, build_sprite, sprite_index, SPRITE_MAX_CLIPS, SPRITE_TIMEOUT
+from http_cache import content_etag, etag_matches, parse_range, iter_file_range, IMMUTABLE_CACHE_CONTROL
+from app_logging import setup_logging, get_logger, set_job_ids, log_requests
+from metrics import metrics, CONTENT_TYPE as METRICS_CONTENT_TYPE, FFMPEG_PROCESSES, FFMPEG_RUNNING, FFMPEG_FAILURES, ENCODED_BYTES
+
+setup_logging()
+logger = get_logger("api")
 
 app = FastAPI()
 
-# Add request logging middleware
-@app.middleware("http")
-async def log_requests(request, call_next):
-    print(f"Incoming request: {request.method} {request.url}")
-    print(f"Headers: {dict(request.headers)}")
-    response = await call_next(request)
-    print(f"Response status: {response.status_code}")
-    return response
+@app.on_event("startup")
+async def start_scheduler():
+    scheduler.handler = run_work
+    scheduler.start()
+    registry.start_sweeper(int(os.getenv("SWEEP_INTERVAL", 60)))
+    # A YoutubeDL pool (és a yt_dlp import) háttérben melegszik, a startup nem vár rá
+    if os.getenv("YDL_POOL_WARM", "1") != "0":
+        asyncio.get_running_loop().run_in_executor(scheduler.download_pool, ydl_pool.warm)
+
+@app.on_event("shutdown")
+async def stop_scheduler():
+    await scheduler.shutdown()
+    await thumbnail_resolver.close()
+    registry.stop_sweeper()
+    ydl_pool.close()
+
+# Request logging middleware (app_logging.py: sampled per route, queued JSON output)
+app.middleware("http")(log_requests)
 
 app.add_middleware(
     CORSMiddleware,
@@ -30,12 +69,45 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Job-Id", "X-File-Id", "Content-Disposition", "ETag", "Content-Range", "Accept-Ranges"],
 )
 
 # Health check endpoint
 @app.get("/health")
 def health_check():
-    return {"status": "healthy", "service": "tube-soundboard-api"}
+    return {"status": "healthy", "service": "tube-soundboard-api", "source_cache": source_cache.stats()}
+
+# Source audio cache + scheduler statistics
+@app.get("/stats")
+def get_stats():
+    return {
+        "source_cache": source_cache.stats(),
+        "video_info_cache": video_info_cache.stats(),
+        "thumbnails": thumbnail_resolver.stats(),
+        "scheduler": scheduler.stats(),
+        "ydl_pool": ydl_pool.stats(),
+        "registry": registry.stats(),
+        "pcm_cache": pcm_store.pcm_cache.stats(),
+        "waveform_cache": peaks_cache.stats(),
+    }
+
+# Prometheus scrape endpoint (metrics.py); the gauges below are computed at scrape time
+metrics.gauge(
+    "tube_jobs", "Jobs in the registry by status", ("status",),
+    collect=lambda: {(status,): count for status, count in registry.status_counts().items()},
+)
+metrics.gauge(
+    "tube_scheduler_jobs", "Scheduler jobs waiting in the queue / running", ("state",),
+    collect=lambda: {(state,): scheduler.stats()[state] for state in ("queued", "active")},
+)
+metrics.gauge(
+    "tube_source_cache_bytes", "Bytes held in the source audio cache",
+    collect=lambda: {(): source_cache.stats()["bytes"]},
+)
+
+@app.get("/metrics")
+def get_metrics():
+    return Response(metrics.render(), media_type=METRICS_CONTENT_TYPE)
 
 # Debug endpoint to check deployment version
 @app.get("/debug/version")
@@ -102,298 +174,897 @@ def debug_test_extract():
 @app.post("/video-info")
 def get_video_info(request: dict):
     try:
-        import yt_dlp
-        
-        # Debug logging
-        print(f"Received request: {request}")
-        
         url = request.get('youtube_url')
         if not url:
-            print("Missing youtube_url in request")
+            logger.warning("Missing youtube_url in request")
             raise HTTPException(status_code=400, detail="Missing youtube_url in request")
         
-        print(f"Processing URL: {url}")
+        logger.debug(f"Processing URL: {url}")
         
-        # Configure yt-dlp to only extract info, not download
-        ydl_opts = {
-            'quiet': True,
-            'no_warnings': True,
-            'extract_flat': False,
-            # Additional options to avoid blocking
-            'extractor_retries': 3,
-            'fragment_retries': 3,
-            'retries': 3,
-            'socket_timeout': 30,
-            # Add comprehensive headers to avoid 403 errors
-            'http_headers': {
-                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-                'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-                'Accept-Language': 'en-us,en;q=0.5',
-                'Accept-Encoding': 'gzip,deflate',
-                'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
-                'Keep-Alive': '300',
-                'Connection': 'keep-alive',
-            }
+        # Metadata a video info cache-en keresztül (ugyanazt használja a DOWNLOAD lépés)
+        info = resolve_video_info(url)
+
+        # Get duration in seconds and convert to MM:SS format
+        duration_seconds = info.get('duration', 0)
+        if duration_seconds:
+            minutes = duration_seconds // 60
+            seconds = duration_seconds % 60
+            duration_formatted = f"{minutes:02d}:{seconds:02d}"
+        else:
+            duration_formatted = "00:00"
+        
+        result = {
+            "title": info.get('title', 'Unknown Title'),
+            "duration": duration_formatted,
+            "duration_seconds": duration_seconds,
+            "thumbnail": info.get('thumbnail', ''),
+            "uploader": info.get('uploader', ''),
+            "view_count": info.get('view_count', 0)
         }
         
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(url, download=False)
-            
-            # Get duration in seconds and convert to MM:SS format
-            duration_seconds = info.get('duration', 0)
-            if duration_seconds:
-                minutes = duration_seconds // 60
-                seconds = duration_seconds % 60
-                duration_formatted = f"{minutes:02d}:{seconds:02d}"
-            else:
-                duration_formatted = "00:00"
-            
-            result = {
-                "title": info.get('title', 'Unknown Title'),
-                "duration": duration_formatted,
-                "duration_seconds": duration_seconds,
-                "thumbnail": info.get('thumbnail', ''),
-                "uploader": info.get('uploader', ''),
-                "view_count": info.get('view_count', 0)
-            }
-            
-            print(f"Returning result: {result}")
-            return result
-            
+        logger.debug(f"Returning result: {result}")
+        return result
+        
     except Exception as e:
-        print(f"Error in get_video_info: {str(e)}")
+        logger.warning(f"Error in get_video_info: {str(e)}")
         raise HTTPException(status_code=400, detail=f"Error fetching video info: {str(e)}")
 
-# --- In-memory job and file registry ---
-jobs = {}  # job_id: {status, progress, result, error, file_id}
-files = {} # file_id: {path, metadata}
+# Waveform min/max peaks for the clip picker (precomputed peak pyramid, see waveform.py)
+@app.get("/waveform/{video_id}")
+async def get_waveform(video_id: str, points: int = 1000, start: str | None = None, end: str | None = None):
+    if not pcm_store.numpy_available():
+        raise HTTPException(status_code=503, detail="Waveform support requires numpy")
+    if not re.fullmatch(r"[A-Za-z0-9_-]{11}", video_id):
+        raise HTTPException(status_code=400, detail="Invalid video ID")
+    youtube_url = f"https://www.youtube.com/watch?v={video_id}"
+    try:
+        start_sec, end_sec = peaks_window(points, start, end)
+        info = await scheduler.run_download(resolve_video_info, youtube_url)
+        result = await asyncio.to_thread(cached_peaks, info, points, start_sec, end_sec)
+        if result is None:
+            result = await _analyze_source(youtube_url, build_peaks, points, start_sec, end_sec)
+    except Exception as e:
+        logger.warning(f"Error in get_waveform: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error building waveform: {str(e)}")
+    return {"video_id": video_id, **result}
+
+async def _analyze_source(youtube_url, analyze, *args):
+    """
+    Teljes forrás elemzése: a letöltés a download poolon, a dekódolás + NumPy munka
+    (analyze(source, *args)) az encode poolon - ugyanazon a CPU limiten, mint a vágások.
+    """
+    source = await scheduler.run_download(prepare_source, youtube_url, discard=PreparedSource.close)
+    try:
+        return await scheduler.run_encode(analyze, source, *args)
+    finally:
+        source.close()
+
+# --- Job and file registry (registry.py: TTL/size eviction, optional SQLite backend) ---
 
 class ExtractionRequest(BaseModel):
     youtube_url: str
-    start_time: str | int
-    end_time: str | int
+    start_time: str | int | float
+    end_time: str | int | float
     output_format: str = "mp3"
+    precise: bool = False  # True: always re-encode instead of the stream copy fast path
 
 class BatchRequest(BaseModel):
     requests: list[ExtractionRequest]
 
+class SegmentSpec(BaseModel):
+    start_time: str | int | float
+    end_time: str | int | float
+    output_format: str = "mp3"
+
+class PlaylistVideo(BaseModel):
+    video_id: str | None = None
+    index: int | None = None  # 1-alapú pozíció a playlistben (video_id helyett)
+    segments: list[SegmentSpec]
+
+class PlaylistRequest(BaseModel):
+    playlist_url: str
+    videos: list[PlaylistVideo] = []
+    default_segments: list[SegmentSpec] = []  # a videos-ban nem szereplő elemekhez
+    precise: bool = False
+
+class SpriteRequest(BaseModel):
+    file_ids: list[str]
+    output_format: str = "mp3"
+    gap_ms: int = 250  # csend a klipek között
+
+class SegmentsRequest(BaseModel):
+    youtube_url: str
+    limit: int = 20
+    min_duration: float = 0.3   # sec
+    max_duration: float = 10.0  # sec - a hosszabb aktív szakaszok a legcsendesebb pontjukon darabolódnak
+    threshold_db: float | None = None  # None: adaptív (zajpadló + 10 dB)
+    extract: bool = False  # True: a jelöltek egyből batch-ként sorba kerülnek
+    output_format: str = "mp3"
+    precise: bool = False
+
+class ZipRequest(BaseModel):
+    file_ids: list[str] = []
+    batch_id: str | None = None  # a /batch válasz batch_id-ja: a batch összes kész fájlja
+
 # --- Helper: background extraction ---
-def run_extraction(job_id, req: ExtractionRequest):
+async def run_work(job_ids, payload):
+    """Scheduler handler: a work queue entry (bármelyik worker tette a sorba) futtatása"""
+    if "pipeline" in payload:
+        # Playlist: videónként egy csoport, a job_ids a csoportok sorrendjében
+        groups, offset = [], 0
+        for group in payload["pipeline"]:
+            reqs = [ExtractionRequest(**r) for r in group["requests"]]
+            groups.append((job_ids[offset:offset + len(reqs)], reqs))
+            offset += len(reqs)
+        await run_pipeline(groups)
+        return
+    await run_batch_group(job_ids, [ExtractionRequest(**r) for r in payload["requests"]])
+
+def _work_payload(reqs: list[ExtractionRequest]):
+    return {"requests": [r.model_dump() for r in reqs]}
+
+def _file_metadata(req: ExtractionRequest, video_metadata):
+    return {
+        "youtube_url": req.youtube_url,
+        "start_time": req.start_time,
+        "end_time": req.end_time,
+        "output_format": req.output_format,
+        "video_title": video_metadata.get("title", "Unknown") if video_metadata else "Unknown"
+    }
+
+def _register_result(job_id, req: ExtractionRequest, output_path, temp_dir, video_metadata, file_id=None):
+    """Worker szálon hívandó: a tartalom hash (ETag) itt, egyszer számolódik"""
+    file_id = file_id or str(uuid.uuid4())
+    metadata = _file_metadata(req, video_metadata)
+    registry.add_file(file_id, output_path, temp_dir, metadata, etag=content_etag(output_path))
+    key = _output_key(req)
+    if key is not None:
+        registry.complete_output(key, job_id, file_id, os.path.getsize(output_path))
+    _update_job(job_id, only_active=True, status="done", progress=100, file_id=file_id, result=metadata)
+
+# --- Output dedup (registry "outputs"): azonos kérés -> kész fájl vagy a futó job ---
+OUTPUT_DEDUP = os.getenv("OUTPUT_DEDUP", "1") != "0"
+
+def _output_key(req: ExtractionRequest):
+    """Normalizált kulcs: videó ID + másodpercre parse-olt start/end + formátum (+ precise), vagy None"""
+    if not OUTPUT_DEDUP:
+        return None
+    video_id = extract_video_id(req.youtube_url)
+    if video_id is None:
+        return None
     try:
-        jobs[job_id]["status"] = "running"
-        jobs[job_id]["progress"] = 10
-        
-        # Extract video info for metadata
-        print(f"🚀 Starting extraction for job {job_id}")
-        print(f"📺 URL: {req.youtube_url}")
-        print(f"⏰ Start: {req.start_time}, End: {req.end_time}")
-        print(f"🎵 Format: {req.output_format}")
-        
-        # Import and version info
-        import yt_dlp
-        import ffmpeg
-        print(f"📦 yt-dlp version: {yt_dlp.version.__version__}")
-        print(f"📦 Python version: {__import__('sys').version}")
-        
-        result = extract_audio_segment(
-            req.youtube_url, req.start_time, req.end_time, req.output_format
+        start_sec, end_sec = parse_timestamp(req.start_time), parse_timestamp(req.end_time)
+    except ValueError:
+        return None  # a hibát a job adja vissza, mint eddig
+    # repr(float): pontos (nem 6 értékes jegyre kerekített) alak - ms pontos timestampek, hosszú videók
+    return f"{video_id}:{float(start_sec)!r}:{float(end_sec)!r}:{req.output_format.lower()}:{int(req.precise)}"
+
+def _claim_job(req: ExtractionRequest):
+    """
+    Job egy kéréshez: (job_id, "new" | "hit" | "attach").
+    hit: kész job jön létre a meglévő file_id-val; attach: a futó azonos job ID-ja.
+    """
+    job_id = str(uuid.uuid4())
+    key = _output_key(req)
+    outcome, existing = registry.claim_output(key, job_id) if key is not None else ("new", None)
+    if outcome == "attach":
+        return existing, outcome
+    if outcome == "hit":
+        file = registry.get_file(existing)
+        registry.create_job(job_id, status="done", progress=100, file_id=existing,
+                            result=file.metadata if file is not None else None)
+        return job_id, outcome
+    registry.create_job(job_id)
+    return job_id, outcome
+
+def _release_job(job_id, req: ExtractionRequest):
+    registry.delete_job(job_id)
+    key = _output_key(req)
+    if key is not None:
+        registry.release_output(key, job_id)
+
+def _update_job(job_id, **changes):
+    """Registry frissítés + push a /ws/progress feliratkozóknak (közös backendnél blokkolhat: worker szálon hívandó)"""
+    job = registry.update_job(job_id, **changes)
+    if job is not None:
+        progress_bus.publish(job_id, {"job_id": job_id, **job.to_dict()})
+
+def _update_jobs(job_ids, **changes):
+    for job_id in job_ids:
+        _update_job(job_id, **changes)
+
+def _group_progress(job_ids):
+    """ProgressReporter az egy videóhoz tartozó jobokra: stage / byte / ffmpeg idő események"""
+    def on_event(event):
+        if event["type"] == "error":
+            return  # a szegmens hibák a job végállapotában jelennek meg
+        if "progress" in event:
+            for job_id in job_ids:
+                registry.update_job(job_id, only_active=True, progress=event["progress"])
+        for job_id in job_ids:
+            progress_bus.publish(job_id, {"job_id": job_id, "status": "running", **event})
+    return ProgressReporter(on_event)
+
+# --- Cancellation: DELETE /jobs/{job_id} ---
+_running = {}  # job_id: (asyncio.Task, a task job_id-jai, a videó job_id-jai, a videó CancelToken-je)
+CANCEL_POLL_INTERVAL = float(os.getenv("CANCEL_POLL_INTERVAL", 2))
+
+def _is_cancelled(job_id):
+    job = registry.get_job(job_id)
+    return job is not None and job.status == "cancelled"
+
+def _discard_outputs(results):
+    """Megszakítás után elkészült kimenetek (cut_segments eredmény) törlése"""
+    for result in results:
+        if not isinstance(result, Exception):
+            shutil.rmtree(result[1], ignore_errors=True)
+
+def _cancelled_jobs(job_ids):
+    """A visszavont job_id-k halmaza (registry olvasás: worker szálon hívandó)"""
+    return {job_id for job_id in job_ids if _is_cancelled(job_id)}
+
+def _stop_cancelled(job_id, cancelled):
+    """Ezen a workeren futó job: a videó tokenje / a task leáll, ha minden jobja visszavont (cancelled-ben van)"""
+    running = _running.get(job_id)
+    if running is None:
+        return
+    task, job_ids, group, token = running
+    # Egy videó egy ffmpeg futás: csak akkor állítjuk le, ha az összes jobja visszavont
+    if all(other in cancelled for other in group):
+        token.cancel("Cancelled by client")
+    if all(other in cancelled for other in job_ids):
+        task.cancel()
+
+async def _watch_cancellation(job_ids):
+    # Közös sornál a DELETE egy másik workerre is eshet: a registry-t figyeljük
+    while True:
+        await asyncio.sleep(CANCEL_POLL_INTERVAL)
+        cancelled = await asyncio.to_thread(_cancelled_jobs, job_ids)
+        for job_id in cancelled:
+            _stop_cancelled(job_id, cancelled)
+
+# --- Helper: grouped batch extraction (one download + one ffmpeg pass per video) ---
+async def run_batch_group(job_ids, reqs: list[ExtractionRequest]):
+    """
+    DOWNLOAD a download poolon, EXTRACT az encode poolon (scheduler).
+    A csoport task-ja megszakítható (DELETE /jobs/{job_id}): a cancel token leállítja a
+    futó ffmpeg / yt-dlp munkát, a temp fájlok és a scheduler slot azonnal felszabadulnak.
+    """
+    # A sorban várakozás közben visszavont jobok kimaradnak
+    groups = await asyncio.to_thread(_live_groups, [(job_ids, reqs)])
+    if groups:
+        await _run_cancellable(groups, _run_group)
+
+async def run_pipeline(groups):
+    """
+    Több videó (playlist) producer / consumer pipeline-ként: a letöltések előre futnak
+    (legfeljebb PIPELINE_PREFETCH kész forrás várhat), közben az encode workerek a már
+    letöltött forrásokat vágják - a hálózat és a CPU egyszerre dolgozik.
+    """
+    groups = await asyncio.to_thread(_live_groups, groups)
+    if groups:
+        await _run_cancellable(groups, _run_pipeline)
+
+def _live_jobs(job_ids, reqs: list[ExtractionRequest]):
+    """A még nem visszavont jobok (és kéréseik) - a csoport többi jobja nélkülük fut tovább"""
+    pairs = [(job_id, req) for job_id, req in zip(job_ids, reqs) if not _is_cancelled(job_id)]
+    return [job_id for job_id, _ in pairs], [req for _, req in pairs]
+
+def _live_groups(groups):
+    return [live for live in (_live_jobs(job_ids, reqs) for job_ids, reqs in groups) if live[0]]
+
+async def _run_cancellable(groups, work):
+    """
+    work(groups, tokens) futtatása megszakíthatóan. Videónként (csoportonként) saját CancelToken:
+    egy videó visszavonása / lejárt határideje a többit nem érinti; a task cancel (az összes
+    job visszavonva) a közös szülő tokenen át mindet leállítja.
+    """
+    job_ids = [job_id for ids, _ in groups for job_id in ids]
+    task = asyncio.current_task()
+    parent = CancelToken()
+    tokens = [parent.child() for _ in groups]
+    for (ids, _), token in zip(groups, tokens):
+        for job_id in ids:
+            _running[job_id] = (task, job_ids, ids, token)
+    watcher = asyncio.create_task(_watch_cancellation(job_ids)) if scheduler.queue.poll_interval else None
+    set_job_ids(job_ids)
+    current_token.set(parent)
+    try:
+        await work(groups, tokens)
+    except asyncio.CancelledError:
+        parent.cancel("Cancelled")
+        await asyncio.to_thread(_update_jobs, job_ids, only_active=True, status="cancelled", error="Cancelled")
+        logger.info(f"🛑 Cancelled {len(job_ids)} job(s): {groups[0][1][0].youtube_url}")
+        raise
+    finally:
+        for job_id in job_ids:
+            _running.pop(job_id, None)
+        if watcher is not None:
+            watcher.cancel()
+
+async def _run_group(groups, tokens):
+    (job_ids, reqs), = groups
+    current_token.set(tokens[0])
+    progress = _group_progress(job_ids)
+    source = await _download_group(job_ids, reqs, progress)
+    await _encode_group(job_ids, reqs, progress, source)
+
+async def _download_group(job_ids, reqs: list[ExtractionRequest], progress):
+    """DOWNLOAD lépés egy videó (még nem visszavont) jobjaira: PreparedSource, vagy a hiba (Exception)"""
+    set_job_ids(job_ids)
+    await asyncio.to_thread(_update_jobs, job_ids, only_active=True, status="running", progress=10)
+    logger.info(
+        f"🚀 Starting extraction for {len(job_ids)} job(s): {reqs[0].youtube_url}",
+        extra={"url": reqs[0].youtube_url, "segments": [(r.start_time, r.end_time, r.output_format) for r in reqs]},
+    )
+    segments = [(r.start_time, r.end_time, r.output_format) for r in reqs]
+    try:
+        return await scheduler.run_download(
+            prepare_source, reqs[0].youtube_url, *segments_window(segments), progress,
+            discard=PreparedSource.close,
         )
-        
-        print(f"🔍 Result type: {type(result)}")
-        print(f"🔍 Result length: {len(result) if isinstance(result, tuple) else 'not tuple'}")
-        print(f"🔍 Result preview: {str(result)[:200]}...")
-        
-        # Handle different return formats with detailed logging
-        if isinstance(result, tuple):
-            print(f"✅ Got tuple with {len(result)} values")
-            if len(result) == 2:
-                output_path, temp_dir = result
-                video_metadata = {}
-                print("📁 Using 2-value unpacking (legacy mode)")
-            elif len(result) == 3:
-                output_path, temp_dir, video_metadata = result
-                print("📁 Using 3-value unpacking (new mode)")
-            elif len(result) == 5:
-                output_path, screenshot_path, thumbnail_path, video_metadata, temp_dir = result
-                print("📁 Using 5-value unpacking (full mode)")
-            else:
-                error_msg = f"Unexpected return format: {len(result)} values returned: {result}"
-                print(f"❌ {error_msg}")
-                raise ValueError(error_msg)
-        else:
-            error_msg = f"Expected tuple, got {type(result)}: {result}"
-            print(f"❌ {error_msg}")
-            raise ValueError(error_msg)
-        
-        print(f"📁 Output path: {output_path}")
-        print(f"📁 Temp dir: {temp_dir}")
-        print(f"📊 Metadata: {video_metadata}")
-        
-        file_id = str(uuid.uuid4())
-        files[file_id] = {"path": output_path, "metadata": {
-            "youtube_url": req.youtube_url,
-            "start_time": req.start_time,
-            "end_time": req.end_time,
-            "output_format": req.output_format,
-            "video_title": video_metadata.get("title", "Unknown") if video_metadata else "Unknown"
-        }}
-        jobs[job_id]["status"] = "done"
-        jobs[job_id]["progress"] = 100
-        jobs[job_id]["file_id"] = file_id
-        jobs[job_id]["result"] = files[file_id]["metadata"]
-        
-        print(f"🎉 Job {job_id} completed successfully")
-        
     except Exception as e:
-        error_msg = f"Job {job_id} failed: {str(e)}"
-        print(f"❌ {error_msg}")
-        import traceback
-        print("📋 Full traceback:")
-        traceback.print_exc()
-        jobs[job_id]["status"] = "error"
-        jobs[job_id]["error"] = str(e)
+        return e
+
+async def _encode_group(job_ids, reqs: list[ExtractionRequest], progress, source):
+    """EXTRACT lépés (egy ffmpeg futás a videó összes szegmensére) + a jobok lezárása"""
+    # A letöltés közben visszavont jobok szegmensei már nem kerülnek az ffmpeg futásba
+    job_ids, reqs = await asyncio.to_thread(_live_jobs, job_ids, reqs)
+    if not job_ids:
+        if not isinstance(source, Exception):
+            source.close()
+        return
+    set_job_ids(job_ids)
+    segments = [(r.start_time, r.end_time, r.output_format) for r in reqs]
+    if isinstance(source, Exception):
+        results = [source] * len(reqs)
+    else:
+        try:
+            results = await scheduler.run_encode(
+                cut_segments, source, segments, progress, reqs[0].precise, discard=_discard_outputs
+            )
+        except Exception as e:
+            results = [e] * len(reqs)
+        finally:
+            source.close()
+    await asyncio.to_thread(_finish_jobs, job_ids, reqs, results)
+
+def _finish_jobs(job_ids, reqs: list[ExtractionRequest], results):
+    """A csoport jobjainak lezárása az EXTRACT eredményeivel (worker szálon: registry írás, ETag hash)"""
+    for job_id, req, result in zip(job_ids, reqs, results):
+        if _is_cancelled(job_id):
+            # A csoport többi jobja miatt lefutott, de ezt a kliens visszavonta
+            _discard_outputs([result])
+            continue
+        if isinstance(result, Exception):
+            logger.error(f"❌ Job {job_id} failed: {result}")
+            key = _output_key(req)
+            if key is not None:
+                registry.release_output(key, job_id)
+            _update_job(job_id, only_active=True, status="error", error=str(result))
+            continue
+        output_path, temp_dir, video_metadata = result
+        _register_result(job_id, req, output_path, temp_dir, video_metadata)
+        logger.info(f"🎉 Job {job_id} completed successfully")
+
+PIPELINE_DOWNLOADS = int(os.getenv("PIPELINE_DOWNLOADS", 2))  # párhuzamos letöltés pipeline-onként
+PIPELINE_PREFETCH = int(os.getenv("PIPELINE_PREFETCH", 2))    # ennyi letöltött forrás várhat encode-ra
+
+async def _run_pipeline(groups, tokens):
+    ready = asyncio.Queue(PIPELINE_PREFETCH)
+    pending = iter(zip(groups, tokens))  # a letöltő taskok közös iterátora
+
+    async def download():
+        for (job_ids, reqs), token in pending:
+            job_ids, reqs = await asyncio.to_thread(_live_jobs, job_ids, reqs)
+            if not job_ids or token.cancelled:
+                continue
+            # A videó saját tokenje: a lejárt határidő / visszavonás csak ezt a videót állítja le
+            current_token.set(token)
+            progress = _group_progress(job_ids)
+            source = await _download_group(job_ids, reqs, progress)
+            await ready.put((job_ids, reqs, progress, source, token))
+
+    async def encode():
+        while (item := await ready.get()) is not None:
+            job_ids, reqs, progress, source, token = item
+            current_token.set(token)
+            await _encode_group(job_ids, reqs, progress, source)
+
+    # Az encode pool mérete szerint fogyasztunk: annyi vágás fut, amennyi CPU slot van
+    downloaders = [asyncio.create_task(download()) for _ in range(max(1, PIPELINE_DOWNLOADS))]
+    encoders = [asyncio.create_task(encode()) for _ in range(scheduler.encode_workers)]
+    try:
+        await asyncio.gather(*downloaders)
+        for _ in encoders:
+            await ready.put(None)
+        await asyncio.gather(*encoders)
+    finally:
+        for task in downloaders + encoders:
+            task.cancel()
+        # Megszakításkor a már letöltött, de nem vágott források felszabadítása
+        while not ready.empty():
+            item = ready.get_nowait()
+            if item is not None and not isinstance(item[3], Exception):
+                item[3].close()
+
+def _queue_full(e: QueueFullError):
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
 
 @app.post("/extract")
-def extract_audio(req: ExtractionRequest, background_tasks: BackgroundTasks):
-    job_id = str(uuid.uuid4())
-    jobs[job_id] = {"status": "queued", "progress": 0, "result": None, "error": None, "file_id": None}
-    background_tasks.add_task(run_extraction, job_id, req)
+async def extract_audio(req: ExtractionRequest):
+    # A registry / sor hívások közös backendnél (sqlite lock, redis lock) blokkolhatnak: worker szálon
+    job_id, outcome = await asyncio.to_thread(_claim_job, req)
+    if outcome == "hit":
+        job = await asyncio.to_thread(registry.get_job, job_id)
+        return {"job_id": job_id, "status": "done", "file_id": job.file_id, "deduplicated": True}
+    if outcome == "attach":
+        job = await asyncio.to_thread(registry.get_job, job_id)
+        return {"job_id": job_id, "status": job.status if job is not None else "queued", "deduplicated": True}
+    try:
+        await scheduler.submit([job_id], _work_payload([req]), PRIORITY_INTERACTIVE)
+    except QueueFullError as e:
+        await asyncio.to_thread(_release_job, job_id, req)
+        raise _queue_full(e)
     return {"job_id": job_id, "status": "queued"}
 
-@app.post("/batch")
-def batch_extract(req: BatchRequest, background_tasks: BackgroundTasks):
+def _claim_jobs(reqs: list[ExtractionRequest]):
+    return [_claim_job(r) for r in reqs]
+
+def _release_jobs(created):
+    for job_id, r in created:
+        _release_job(job_id, r)
+
+async def _submit_batch(reqs: list[ExtractionRequest]):
+    """Dedup + videónkénti csoportosítás + sorba állítás; visszaad: (batch_id, job_ids). QueueFullError-t továbbdob."""
     job_ids = []
-    for r in req.requests:
-        job_id = str(uuid.uuid4())
-        jobs[job_id] = {"status": "queued", "progress": 0, "result": None, "error": None, "file_id": None}
-        background_tasks.add_task(run_extraction, job_id, r)
+    created = []  # (job_id, ExtractionRequest) - csak ezek kerülnek a sorba
+    groups = {}  # (video_id, precise): ([job_id, ...], [ExtractionRequest, ...])
+    # Kész / már futó azonos kérés (a batch-en belüli ismétlés is) nem kerül újra sorba
+    claims = await asyncio.to_thread(_claim_jobs, reqs)
+    for r, (job_id, outcome) in zip(reqs, claims):
         job_ids.append(job_id)
-    return {"job_ids": job_ids}
+        if outcome != "new":
+            continue
+        created.append((job_id, r))
+        group = groups.setdefault((extract_video_id(r.youtube_url) or r.youtube_url, r.precise), ([], []))
+        group[0].append(job_id)
+        group[1].append(r)
+    try:
+        if groups:
+            await scheduler.submit_many(
+                [(ids, _work_payload(reqs)) for ids, reqs in groups.values()],
+                PRIORITY_BATCH,
+            )
+    except QueueFullError:
+        await asyncio.to_thread(_release_jobs, created)
+        raise
+    batch_id = str(uuid.uuid4())
+    await asyncio.to_thread(registry.create_batch, batch_id, job_ids)
+    return batch_id, job_ids
+
+@app.post("/batch")
+async def batch_extract(req: BatchRequest):
+    try:
+        batch_id, job_ids = await _submit_batch(req.requests)
+    except QueueFullError as e:
+        raise _queue_full(e)
+    return {"batch_id": batch_id, "job_ids": job_ids}
+
+# Auto-segmentation: rangsorolt jelölt klipek (segmentation.py); extract=True esetén egyből batch
+@app.post("/segments")
+async def detect_segments_endpoint(req: SegmentsRequest):
+    if not pcm_store.numpy_available():
+        raise HTTPException(status_code=503, detail="Segment detection requires numpy")
+    if req.output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Unsupported output format: {req.output_format}")
+    try:
+        validate_segment_params(req.limit, req.min_duration, req.max_duration)
+        # Letöltés a download poolon, dekódolás + elemzés az encode poolon (CPU limit)
+        result = await _analyze_source(
+            req.youtube_url, analyze_segments, req.limit, req.min_duration, req.max_duration, req.threshold_db
+        )
+    except Exception as e:
+        logger.warning(f"Error in detect_segments_endpoint: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error detecting segments: {str(e)}")
+    # A jelöltek változtatás nélkül mehetnek a /batch-be (vagy extract=True-val itt)
+    reqs = [
+        ExtractionRequest(
+            youtube_url=req.youtube_url, start_time=segment["start"], end_time=segment["end"],
+            output_format=req.output_format, precise=req.precise,
+        )
+        for segment in result["segments"]
+    ]
+    response = {**result, "requests": [r.model_dump() for r in reqs]}
+    if req.extract and reqs:
+        try:
+            response["batch_id"], response["job_ids"] = await _submit_batch(reqs)
+        except QueueFullError as e:
+            raise _queue_full(e)
+    return response
+
+# Playlist ingest: egy work queue entry, a videók letöltése és vágása átfedésben (run_pipeline)
+@app.post("/playlist")
+async def playlist_extract(req: PlaylistRequest):
+    if not req.videos and not req.default_segments:
+        raise HTTPException(status_code=400, detail="Provide videos or default_segments")
+    try:
+        title, entries = await scheduler.run_download(resolve_playlist, req.playlist_url)
+        plan = plan_playlist(
+            entries, [v.model_dump() for v in req.videos], [s.model_dump() for s in req.default_segments]
+        )
+    except Exception as e:
+        logger.warning(f"Error in playlist_extract: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error resolving playlist: {str(e)}")
+
+    job_ids = []
+    created = []  # (job_id, ExtractionRequest)
+    groups = []   # videónként: ([job_id, ...], [ExtractionRequest, ...]) - csak az új jobok
+    videos = []
+    for entry, segments in plan:
+        reqs = [ExtractionRequest(youtube_url=entry["url"], precise=req.precise, **segment) for segment in segments]
+        video_job_ids, new_ids, new_reqs = [], [], []
+        for r, (job_id, outcome) in zip(reqs, await asyncio.to_thread(_claim_jobs, reqs)):
+            video_job_ids.append(job_id)
+            if outcome == "new":
+                created.append((job_id, r))
+                new_ids.append(job_id)
+                new_reqs.append(r)
+        if new_ids:
+            groups.append((new_ids, new_reqs))
+        job_ids.extend(video_job_ids)
+        videos.append({"video_id": entry["id"], "index": entry["index"], "title": entry["title"], "job_ids": video_job_ids})
+    try:
+        if groups:
+            await scheduler.submit(
+                [job_id for ids, _ in groups for job_id in ids],
+                {"pipeline": [_work_payload(reqs) for _, reqs in groups]},
+                PRIORITY_BATCH,
+            )
+    except QueueFullError as e:
+        await asyncio.to_thread(_release_jobs, created)
+        raise _queue_full(e)
+    batch_id = str(uuid.uuid4())
+    await asyncio.to_thread(registry.create_batch, batch_id, job_ids)
+    return {"batch_id": batch_id, "playlist_title": title, "job_ids": job_ids, "videos": videos}
+
+# --- Synchronous streaming extraction (no /status polling, no intermediate output file) ---
+@app.post("/extract/stream")
+async def extract_stream(req: ExtractionRequest):
+    job_id = str(uuid.uuid4())
+    file_id = str(uuid.uuid4())
+    set_job_ids([job_id])
+    await asyncio.to_thread(registry.create_job, job_id, status="running", progress=10)
+    body = _stream_body(job_id, file_id, req)
+    try:
+        # Az első elem az output kiterjesztés: a forrás / validálás hibái még a fejlécek előtt 400-at adnak
+        output_ext = await body.__anext__()
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES.get(output_ext, f"audio/{output_ext}"),
+        headers={
+            "X-Job-Id": job_id,
+            "X-File-Id": file_id,
+            "Content-Disposition": f'attachment; filename="output.{output_ext}"',
+        },
+    )
+
+async def _stream_body(job_id, file_id, req: ExtractionRequest):
+    """
+    Az /extract/stream válasz törzse. A source pin, a temp könyvtár és az FFMPEG_RUNNING
+    gauge a generátoron belül foglalódik, és a finally-ban szabadul fel - akkor is, ha a
+    kliens a törzs előtt bont, vagy a választ sosem iterálják (a generátor lezárásakor).
+    """
+    progress = _group_progress([job_id])
+    source = temp_dir = None
+    registered = False
+    try:
+        try:
+            source = await scheduler.run_download(prepare_source, req.youtube_url, req.start_time, req.end_time, progress)
+            start_sec, end_sec, output_ext = validate_segment(source.info, req.start_time, req.end_time, req.output_format, progress)
+        except Exception as e:
+            await asyncio.to_thread(_update_job, job_id, status="error", error=str(e))
+            raise
+        yield output_ext
+
+        # A stream bájtjai a registrybe is bekerülnek, így a későbbi /download nem kódol újra
+        temp_dir = tempfile.mkdtemp(prefix="yt-audio-")
+        output_path = os.path.join(temp_dir, f"output.{output_ext}")
+        command = segment_stream_command(source, start_sec, end_sec, output_ext, req.precise)
+        video_metadata = {"title": source.info.get("title")}
+
+        def on_finish(returncode, stderr):
+            nonlocal registered
+            if returncode == 0:
+                if output_ext == "wav":
+                    fix_wav_header(output_path)
+                ENCODED_BYTES.inc(os.path.getsize(output_path), format=output_ext)
+                _register_result(job_id, req, output_path, temp_dir, video_metadata, file_id)
+                registered = True
+            elif returncode is not None:
+                FFMPEG_FAILURES.inc(stage="STREAM")
+                error = stderr.decode(errors="ignore")
+                _update_job(job_id, status="error", error=f"FFmpeg segmentation/conversion error: {error}")
+
+        await asyncio.to_thread(_update_job, job_id, progress=70)
+        FFMPEG_PROCESSES.inc(stage="STREAM")
+        FFMPEG_RUNNING.inc(stage="STREAM")
+        try:
+            # aclosing: a mi lezárásunk (GeneratorExit) a belső streamet is lezárja -> ffmpeg kill
+            async with aclosing(stream_command(command, scheduler.encode_pool, tee_path=output_path, on_finish=on_finish)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        finally:
+            FFMPEG_RUNNING.dec(stage="STREAM")
+    finally:
+        if source is not None:
+            source.close()
+        if not registered:
+            if temp_dir is not None:
+                shutil.rmtree(temp_dir, ignore_errors=True)
+            await asyncio.to_thread(
+                _update_job, job_id, only_active=True, status="error", error="Stream cancelled by client"
+            )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    job = await asyncio.to_thread(registry.get_job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job.status in TERMINAL_STATUSES:
+        raise HTTPException(status_code=409, detail=f"Job already {job.status}")
+    # Check-and-set a registry-ben: közben egy másik worker / node befejezhette
+    job = await asyncio.to_thread(
+        registry.update_job, job_id, only_active=True, status="cancelled", error="Cancelled by client"
+    )
+    if job is None or job.status != "cancelled":
+        raise HTTPException(status_code=409, detail=f"Job already {job.status if job else 'gone'}")
+    progress_bus.publish(job_id, {"job_id": job_id, **job.to_dict()})
+    running = _running.get(job_id)
+    if running is not None:
+        _stop_cancelled(job_id, await asyncio.to_thread(_cancelled_jobs, running[1]))
+    logger.info(f"🛑 Job {job_id} cancelled by client")
+    return {"job_id": job_id, "status": "cancelled"}
 
 @app.get("/status/{job_id}")
 def get_status(job_id: str):
-    job = jobs.get(job_id)
+    job = registry.get_job(job_id)
     if not job:
         raise HTTPException(status_code=404, detail="Job not found")
-    return {"job_id": job_id, **job}
+    if job.status == "queued":
+        return {"job_id": job_id, **job.to_dict(), "queue_position": scheduler.queue_position(job_id)}
+    return {"job_id": job_id, **job.to_dict()}
 
 @app.get("/download/{file_id}")
-def download_file(file_id: str):
-    file = files.get(file_id)
+def download_file(file_id: str, request: Request):
+    file = registry.get_file(file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
-    path = file["path"]
-    fmt = file["metadata"]["output_format"]
-    return FileResponse(path, media_type=f"audio/{fmt}", filename=os.path.basename(path))
+    if not registry.is_local(file):
+        # Egy másik node állította elő: oda irányítjuk (NODE_URL)
+        return RedirectResponse(url=f"{file.node.rstrip('/')}/download/{file_id}")
+    path = file.path
+    fmt = file.metadata["output_format"].lower()
+    media_type = MEDIA_TYPES.get(fmt, f"audio/{fmt}")
+    headers = {"Accept-Ranges": "bytes"}
+    if file.etag:
+        # Egy file_id tartalma sosem változik: a böngésző / sw.js újravalidálás nélkül cache-elheti
+        headers.update({"ETag": file.etag, "Cache-Control": IMMUTABLE_CACHE_CONTROL})
+        if etag_matches(request.headers.get("if-none-match"), file.etag):
+            return Response(status_code=304, headers=headers)
 
-@app.get("/thumbnail/{file_id}")
-def get_thumbnail(file_id: str):
-    from fastapi.responses import RedirectResponse
-    import requests
-    
-    file = files.get(file_id)
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header and (if_range is None or (file.etag and if_range.strip() == file.etag)):
+        size = os.path.getsize(path)
+        try:
+            byte_range = parse_range(range_header, size)
+        except ValueError:
+            byte_range = ()  # értelmezhetetlen / több tartomány: teljes fájl
+        if byte_range is None:
+            return Response(status_code=416, headers={**headers, "Content-Range": f"bytes */{size}"})
+        if byte_range:
+            start, end = byte_range
+            return StreamingResponse(
+                iter_file_range(path, start, end), status_code=206, media_type=media_type,
+                headers={**headers, "Content-Range": f"bytes {start}-{end}/{size}", "Content-Length": str(end - start + 1)},
+            )
+    return FileResponse(path, media_type=media_type, filename=os.path.basename(path), headers=headers)
+
+# Streaming ZIP: több fájl (vagy egy teljes batch) egy letöltésben, manifest.json-nal (zip_export.py)
+@app.post("/download/zip")
+def download_zip(req: ZipRequest):
+    file_ids = list(req.file_ids)
+    missing = []
+    if req.batch_id:
+        batch = registry.get_batch(req.batch_id)
+        if batch is None:
+            raise HTTPException(status_code=404, detail="Batch not found")
+        for job_id in batch.job_ids:
+            job = registry.get_job(job_id)
+            if job is not None and job.file_id:
+                file_ids.append(job.file_id)
+            else:
+                missing.append({"job_id": job_id, "reason": job.status if job is not None else "expired"})
+    if not file_ids and not missing:
+        raise HTTPException(status_code=400, detail="Provide file_ids or batch_id")
+
+    items = []
+    for file_id in dict.fromkeys(file_ids):  # sorrendtartó dedup
+        file = registry.get_file(file_id)
+        if file is None:
+            missing.append({"file_id": file_id, "reason": "not_found"})
+        elif not registry.is_local(file):
+            # Más node fájlja: a kliens a /download/{file_id} redirecttel éri el
+            missing.append({"file_id": file_id, "reason": "remote", "node": file.node})
+        else:
+            items.append((file_id, file.path, file.metadata))
+    filename = f"batch-{req.batch_id}.zip" if req.batch_id else "soundboard.zip"
+    return StreamingResponse(
+        iter_zip(items, missing), media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+    )
+
+# Audio sprite: a board összes klipje egy fájlban + offset index (sprite.py), tartalom hash szerint cache-elve
+@app.post("/sprite")
+async def create_sprite(req: SpriteRequest):
+    output_format = req.output_format.lower()
+    if output_format not in OUTPUT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Only {', '.join(OUTPUT_FORMATS)} output formats are supported.")
+    if not 1 <= len(req.file_ids) <= SPRITE_MAX_CLIPS:
+        raise HTTPException(status_code=400, detail=f"file_ids: 1 to {SPRITE_MAX_CLIPS} clips")
+    if not 0 <= req.gap_ms <= 5000:
+        raise HTTPException(status_code=400, detail="gap_ms: 0 to 5000")
+    found = await asyncio.to_thread(lambda: [registry.get_file(file_id) for file_id in req.file_ids])
+    files = []
+    for file_id, file in zip(req.file_ids, found):
+        if file is None:
+            raise HTTPException(status_code=404, detail=f"File not found: {file_id}")
+        if not registry.is_local(file):
+            raise HTTPException(status_code=409, detail=f"File is stored on another node: {file_id}")
+        files.append(file)
+    gap = req.gap_ms / 1000
+    # A korábban (ETag nélkül) regisztrált fájlok hash-e itt számolódik
+    etags = await asyncio.to_thread(lambda: [file.etag or content_etag(file.path) for file in files])
+    key = sprite_key(etags, output_format, gap)
+
+    job_id = str(uuid.uuid4())
+    outcome, existing = await asyncio.to_thread(registry.claim_output, key, job_id)
+    if outcome == "hit":
+        file_id = existing
+    elif outcome == "attach":
+        file_id = await _wait_for_sprite(existing, key)
+    else:
+        file_id = await _build_sprite(job_id, key, req.file_ids, files, output_format, gap)
+    sprite = await asyncio.to_thread(registry.get_file, file_id)
+    index = sprite.metadata["sprite"]
+    return {
+        "file_id": file_id,
+        "sprite_id": key.partition(":")[2],
+        "cached": outcome != "new",
+        "download_url": f"/download/{file_id}",
+        **index,
+        # Azonos tartalmú klipek más file_id-val is ugyanazt a sprite-ot adják: a kért ID-kkal válaszolunk
+        "clips": [{**clip, "file_id": requested} for clip, requested in zip(index["clips"], req.file_ids)],
+    }
+
+async def _build_sprite(job_id, key, file_ids, files, output_format, gap):
+    await asyncio.to_thread(registry.create_job, job_id, status="running", progress=70)
+    temp_dir = tempfile.mkdtemp(prefix="yt-audio-")
+    output_path = os.path.join(temp_dir, f"sprite.{output_format}")
+    try:
+        layout = await scheduler.run_encode(build_sprite, [file.path for file in files], output_path, output_format, gap)
+    except BaseException as e:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+        await asyncio.to_thread(_fail_output, key, job_id, str(e) or "Cancelled")
+        if not isinstance(e, Exception):
+            raise
+        logger.warning(f"Error in create_sprite: {str(e)}")
+        raise HTTPException(status_code=400, detail=f"Error building sprite: {str(e)}")
+    metadata = {
+        "output_format": output_format,
+        "video_title": f"Soundboard sprite ({len(files)} clips)",
+        "sprite": sprite_index(file_ids, files, layout, output_format, gap),
+    }
+    file_id = str(uuid.uuid4())
+    await asyncio.to_thread(_complete_sprite, job_id, key, file_id, output_path, temp_dir, metadata)
+    logger.info(f"🎛️ Sprite built: {len(files)} clips -> {file_id}")
+    return file_id
+
+def _fail_output(key, job_id, error):
+    registry.release_output(key, job_id)
+    _update_job(job_id, status="error", error=error)
+
+def _complete_sprite(job_id, key, file_id, output_path, temp_dir, metadata):
+    registry.add_file(file_id, output_path, temp_dir, metadata, etag=content_etag(output_path))
+    registry.complete_output(key, job_id, file_id, os.path.getsize(output_path))
+    _update_job(job_id, status="done", progress=100, file_id=file_id, result=metadata)
+
+async def _wait_for_sprite(job_id, key, poll=0.2):
+    """
+    Ugyanez a sprite épp készül (másik kérés / worker): megvárjuk az eredményét, legfeljebb
+    SPRITE_TIMEOUT-ig. Ha az építő meghalt (a job sosem zárul le) vagy hibával állt le, a
+    kulcs felszabadul, így a következő kérés újraépíti.
+    """
+    deadline = time.monotonic() + SPRITE_TIMEOUT
+    while True:
+        job = await asyncio.to_thread(registry.get_job, job_id)
+        if job is None or job.status in TERMINAL_STATUSES or time.monotonic() > deadline:
+            break
+        await asyncio.sleep(poll)
+    if job is None or job.status != "done":
+        await asyncio.to_thread(registry.release_output, key, job_id)
+        raise HTTPException(status_code=503, detail="Concurrent sprite build failed, retry", headers={"Retry-After": "1"})
+    return job.file_id
+
+async def _redirect_to_thumbnail(file_id, order, not_found):
+    file = await asyncio.to_thread(registry.get_file, file_id)
     if not file:
         raise HTTPException(status_code=404, detail="File not found")
-    
-    # For now, return the YouTube thumbnail URL from metadata
-    metadata = file.get("metadata", {})
-    youtube_url = metadata.get("youtube_url", "")
-    
-    if youtube_url:
-        # Extract video ID from YouTube URL (supports both regular and Shorts URLs)
-        import re
-        # Try standard YouTube URL format first (v=VIDEO_ID)
-        match = re.search(r"v=([\w-]+)", youtube_url)
-        if not match:
-            # Try YouTube Shorts format (/shorts/VIDEO_ID)
-            match = re.search(r"/shorts/([\w-]+)", youtube_url)
-        if match:
-            video_id = match.group(1)
-            
-            # Try multiple thumbnail qualities in order of preference
-            thumbnail_options = [
-                f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg",  # 1280x720
-                f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",     # 480x360
-                f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg",     # 320x180
-                f"https://img.youtube.com/vi/{video_id}/sddefault.jpg",     # 640x480
-                f"https://img.youtube.com/vi/{video_id}/default.jpg"        # 120x90
-            ]
-            
-            # Test each thumbnail URL and return the first working one
-            for thumbnail_url in thumbnail_options:
-                try:
-                    # Quick HEAD request to check if thumbnail exists
-                    response = requests.head(thumbnail_url, timeout=5)
-                    if response.status_code == 200:
-                        return RedirectResponse(url=thumbnail_url)
-                except:
-                    continue
-    
-    raise HTTPException(status_code=404, detail="Thumbnail not available")
+
+    # Extract video ID from YouTube URL (supports both regular and Shorts URLs)
+    video_id = extract_video_id(file.metadata.get("youtube_url", ""))
+    if video_id:
+        # Try multiple thumbnail qualities in order of preference (cached, probed concurrently)
+        url = await thumbnail_resolver.resolve(video_id, order)
+        if url:
+            return RedirectResponse(url=url)
+
+    raise HTTPException(status_code=404, detail=not_found)
+
+@app.get("/thumbnail/{file_id}")
+async def get_thumbnail(file_id: str):
+    return await _redirect_to_thumbnail(file_id, THUMBNAIL_ORDER, "Thumbnail not available")
 
 @app.get("/screenshot/{file_id}")
-def get_screenshot(file_id: str):
-    from fastapi.responses import RedirectResponse
-    import requests
-    
-    file = files.get(file_id)
-    if not file:
-        raise HTTPException(status_code=404, detail="File not found")
-    
-    # Return a different YouTube thumbnail (medium quality) for screenshots
-    metadata = file.get("metadata", {})
-    youtube_url = metadata.get("youtube_url", "")
-    
-    if youtube_url:
-        # Extract video ID from YouTube URL (supports both regular and Shorts URLs)
-        import re
-        # Try standard YouTube URL format first (v=VIDEO_ID)
-        match = re.search(r"v=([\w-]+)", youtube_url)
-        if not match:
-            # Try YouTube Shorts format (/shorts/VIDEO_ID)
-            match = re.search(r"/shorts/([\w-]+)", youtube_url)
-        if match:
-            video_id = match.group(1)
-            
-            # Try multiple screenshot/thumbnail qualities in different order for variety
-            screenshot_options = [
-                f"https://img.youtube.com/vi/{video_id}/mqdefault.jpg",     # 320x180 - good for screenshots
-                f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg",     # 480x360
-                f"https://img.youtube.com/vi/{video_id}/sddefault.jpg",     # 640x480
-                f"https://img.youtube.com/vi/{video_id}/maxresdefault.jpg", # 1280x720
-                f"https://img.youtube.com/vi/{video_id}/default.jpg"        # 120x90
-            ]
-            
-            # Test each screenshot URL and return the first working one
-            for screenshot_url in screenshot_options:
-                try:
-                    # Quick HEAD request to check if thumbnail exists
-                    response = requests.head(screenshot_url, timeout=5)
-                    if response.status_code == 200:
-                        return RedirectResponse(url=screenshot_url)
-                except:
-                    continue
-    
-    raise HTTPException(status_code=404, detail="Screenshot not available")
+async def get_screenshot(file_id: str):
+    # Return a different YouTube thumbnail (medium quality first) for screenshots
+    return await _redirect_to_thumbnail(file_id, SCREENSHOT_ORDER, "Screenshot not available")
 
 # --- WebSocket for real-time progress ---
+WS_REGISTRY_POLL = float(os.getenv("WS_REGISTRY_POLL", 1.0))
+
+def _ws_poll_interval():
+    """Közös registry / sor esetén a jobot másik worker futtathatja: poll; különben elég a ProgressBus"""
+    if scheduler.queue.poll_interval is not None or not isinstance(registry, MemoryRegistry):
+        return WS_REGISTRY_POLL
+    return None
+
 @app.websocket("/ws/progress/{job_id}")
 async def websocket_progress(websocket: WebSocket, job_id: str):
     await websocket.accept()
     try:
-        while True:
-            job = jobs.get(job_id)
+        # Előbb feliratkozunk, utána küldjük az aktuális állapotot - így nem csúszik ki esemény
+        with progress_bus.subscribe(job_id) as events:
+            job = await asyncio.to_thread(registry.get_job, job_id)
             if not job:
                 await websocket.send_json({"error": "Job not found"})
-                break
-            await websocket.send_json({"job_id": job_id, "status": job["status"], "progress": job["progress"]})
-            if job["status"] in ("done", "error"):
-                break
-            import asyncio
-            await asyncio.sleep(1)
+                return
+            await websocket.send_json({"job_id": job_id, "status": job.status, "progress": job.progress})
+            status, progress = job.status, job.progress
+            poll = _ws_poll_interval()
+            while status not in TERMINAL_STATUSES:
+                try:
+                    event = await asyncio.wait_for(events.get(), poll)
+                except asyncio.TimeoutError:
+                    # A jobot egy másik worker / node futtathatja: a közös registry-ből frissítünk
+                    job = await asyncio.to_thread(registry.get_job, job_id)
+                    if job is None:
+                        # TTL eviction / visszavont sorba állítás: nincs mire várni
+                        await websocket.send_json({"job_id": job_id, "error": "Job not found"})
+                        await websocket.close()
+                        return
+                    if (job.status, job.progress) == (status, progress):
+                        continue
+                    event = {"job_id": job_id, **job.to_dict()}
+                await websocket.send_json(event)
+                status, progress = event.get("status"), event.get("progress", progress)
     except WebSocketDisconnect:
         pass
 
 if __name__ == "__main__":
+    import uvicorn
     port = int(os.getenv("PORT", 8000))
     uvicorn.run(app, host="0.0.0.0", port=port)
@@ -0,0 +1,184 @@
+# --- METRICS ---
+# Prometheus text formátumú metrikák (/metrics), külső függőség nélkül.
+# A hot path lock-mentes: minden szál a saját shard dict-jébe ír, a scrape összegzi
+# a shardokat. A gauge-ek (job státuszok, queue) scrape-kor callbackből számolódnak.
+
+import bisect
+import threading
+from contextlib import contextmanager
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# sec - a VALIDATE ms-os, a DOWNLOAD / EXTRACT hosszú videónál percekig tarthat
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+class _Metric:
+    type = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()  # csak új szál első írásakor
+
+    def _shard(self):
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+        return shard
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _snapshots(self):
+        with self._shards_lock:
+            shards = list(self._shards)
+        # dict.copy() a GIL alatt atomi, a tulajdonos szál közben nyugodtan írhat
+        return [shard.copy() for shard in shards]
+
+    def _labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ""
+        escape = lambda v: str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+        return "{" + ",".join(f'{k}="{escape(v)}"' for k, v in pairs) + "}"
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines.extend(self._samples())
+        return lines
+
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        shard[key] = shard.get(key, 0) + amount
+
+    def _totals(self):
+        totals = {}
+        for shard in self._snapshots():
+            for key, value in shard.items():
+                totals[key] = totals.get(key, 0) + value
+        return totals
+
+    def _samples(self):
+        return [f"{self.name}{self._labels(key)} {value}" for key, value in sorted(self._totals().items())]
+
+
+class Gauge(Counter):
+    """inc/dec gauge (shardonként, a +1 és -1 más szálon is történhet) vagy collect callback"""
+
+    type = "gauge"
+
+    def __init__(self, name, help, labelnames=(), collect=None):
+        super().__init__(name, help, labelnames)
+        self.collect = collect  # () -> {label value tuple: value}
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _totals(self):
+        if self.collect is None:
+            return super()._totals()
+        return self.collect()
+
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        shard = self._shard()
+        key = self._key(labels)
+        state = shard.get(key)
+        if state is None:
+            # [bucket számlálók..., +Inf, sum] - csak a tulajdonos szál módosítja
+            state = shard[key] = [0] * (len(self.buckets) + 1) + [0.0]
+        state[bisect.bisect_left(self.buckets, value)] += 1
+        state[-1] += value
+
+    def _samples(self):
+        merged = {}
+        for shard in self._snapshots():
+            for key, state in shard.items():
+                state = list(state)
+                total = merged.get(key)
+                merged[key] = state if total is None else [a + b for a, b in zip(total, state)]
+        lines = []
+        for key, state in sorted(merged.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), state[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{self._labels(key, [('le', bound)])} {cumulative}")
+            lines.append(f"{self.name}_sum{self._labels(key)} {round(state[-1], 6)}")
+            lines.append(f"{self.name}_count{self._labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self.register(Counter(name, help, labelnames))
+
+    def gauge(self, name, help, labelnames=(), collect=None):
+        return self.register(Gauge(name, help, labelnames, collect))
+
+    def histogram(self, name, help, labelnames=(), buckets=STAGE_BUCKETS):
+        return self.register(Histogram(name, help, labelnames, buckets))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                # Egy hibás collect callback ne vigye el az egész scrape-et
+                lines.append(f"# {metric.name} collect failed: {e}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsRegistry()
+
+# --- Pipeline metrikák ---
+STAGE_SECONDS = metrics.histogram(
+    "tube_stage_duration_seconds", "Pipeline stage latency (VALIDATE, DOWNLOAD, TIMESTAMP, FORMAT, EXTRACT)", ("stage",)
+)
+STAGE_ERRORS = metrics.counter("tube_stage_errors_total", "Pipeline stage failures", ("stage",))
+DOWNLOADED_BYTES = metrics.counter(
+    "tube_downloaded_bytes_total", "Source audio bytes fetched from YouTube", ("mode",)
+)
+ENCODED_BYTES = metrics.counter("tube_encoded_bytes_total", "Output clip bytes written", ("format",))
+FFMPEG_PROCESSES = metrics.counter("tube_ffmpeg_processes_total", "ffmpeg subprocesses started", ("stage",))
+FFMPEG_FAILURES = metrics.counter("tube_ffmpeg_failures_total", "ffmpeg subprocesses that failed", ("stage",))
+FFMPEG_RUNNING = metrics.gauge("tube_ffmpeg_running", "ffmpeg subprocesses currently running", ("stage",))
+
+
+@contextmanager
+def ffmpeg_process(stage):
+    """Egy ffmpeg futás számlálása (indított / futó / hibás) a megadott stage címkével"""
+    FFMPEG_PROCESSES.inc(stage=stage)
+    FFMPEG_RUNNING.inc(stage=stage)
+    try:
+        yield
+    except BaseException:
+        FFMPEG_FAILURES.inc(stage=stage)
+        raise
+    finally:
+        FFMPEG_RUNNING.dec(stage=stage)
@@ -0,0 +1,123 @@
+# --- DECODED PCM STORE ---
+# Opcionális mód (PCM_STORE=1): minden forrást egyszer dekódolunk nyers PCM fájlba
+# (s16le, 48 kHz, stereo), amit NumPy-jal memory-mapelünk. Így az ismételt vágás:
+# - wav: generált header + a memmap szelet zero-copy kiírása
+# - mp3/opus/...: csak a kivágott frame-ek mennek ffmpeg stdin-re (nincs decode / seek)
+# A PCM fájlok a source cache-sel azonos LRU byte-budget cache-ben élnek.
+
+import os
+import struct
+import subprocess
+from contextlib import contextmanager
+
+from source_cache import SourceCache, DEFAULT_CACHE_DIR
+from metrics import ffmpeg_process
+import cancellation
+
+SAMPLE_RATE = 48000
+CHANNELS = 2
+SAMPLE_WIDTH = 2  # s16le
+FRAME_BYTES = CHANNELS * SAMPLE_WIDTH
+
+PCM_STORE_ENABLED = os.getenv("PCM_STORE", "0") == "1"
+
+pcm_cache = SourceCache(
+    root=os.getenv("PCM_CACHE_DIR", DEFAULT_CACHE_DIR + "-pcm"),
+    max_bytes=int(os.getenv("PCM_CACHE_MAX_BYTES", 4 * 1024 * 1024 * 1024)),
+)
+
+
+def numpy_available():
+    try:
+        import numpy  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def enabled():
+    """PCM mód bekapcsolva és a NumPy elérhető"""
+    return PCM_STORE_ENABLED and numpy_available()
+
+
+def _decode(source_path):
+    """Forrás -> nyers PCM a pcm cache staging könyvtárába; visszaadja az útvonalat"""
+    staging_path = os.path.join(pcm_cache.staging_dir, os.path.basename(source_path) + ".pcm")
+    with ffmpeg_process("PCM_DECODE"):
+        process = subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-y", "-i", source_path, "-vn",
+             "-f", "s16le", "-acodec", "pcm_s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS),
+             staging_path],
+            stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+        )
+        with cancellation.track(process):
+            _, stderr = process.communicate()
+        if process.returncode != 0:
+            if os.path.exists(staging_path):
+                os.remove(staging_path)
+            cancellation.check()
+            raise subprocess.CalledProcessError(process.returncode, process.args, stderr=stderr)
+    return staging_path
+
+
+@contextmanager
+def open_pcm(info, source_path):
+    """
+    A forrás dekódolt PCM-je memmap-ként: shape (frames, CHANNELS), int16.
+    Yields (pcm, hit) - az első hívás dekódol, a többi a cache-ből olvas.
+    """
+    import numpy as np
+
+    with pcm_cache.acquire(info.get('id'), info.get('format_id'), lambda: _decode(source_path)) as (path, hit):
+        if os.path.getsize(path) == 0:
+            yield np.zeros((0, CHANNELS), dtype="<i2"), hit
+            return
+        pcm = np.memmap(path, dtype="<i2", mode="r").reshape(-1, CHANNELS)
+        try:
+            yield pcm, hit
+        finally:
+            del pcm
+
+
+def frame_range(pcm, start_sec, end_sec):
+    """[start, end) frame indexek (minta pontosan, a PCM hosszára vágva)"""
+    start = min(max(int(round(start_sec * SAMPLE_RATE)), 0), len(pcm))
+    end = min(max(int(round(end_sec * SAMPLE_RATE)), start), len(pcm))
+    return start, end
+
+
+def wav_header(frames):
+    """44 bájtos PCM WAV header a megadott frame számhoz"""
+    data_size = frames * FRAME_BYTES
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_size, b"WAVE",
+        b"fmt ", 16, 1, CHANNELS, SAMPLE_RATE, SAMPLE_RATE * FRAME_BYTES, FRAME_BYTES, SAMPLE_WIDTH * 8,
+        b"data", data_size,
+    )
+
+
+def write_wav_slice(pcm, start_sec, end_sec, output_path):
+    """WAV kimenet: header + a memmap szelet közvetlen kiírása (nincs ffmpeg, nincs másolás)"""
+    start, end = frame_range(pcm, start_sec, end_sec)
+    with open(output_path, "wb") as f:
+        f.write(wav_header(end - start))
+        f.write(memoryview(pcm[start:end]).cast("B"))
+
+
+def encode_slice(pcm, start_sec, end_sec, output_path, muxer, encoder):
+    """Tömörített kimenet: csak a kivágott frame-ek mennek ffmpeg stdin-re"""
+    start, end = frame_range(pcm, start_sec, end_sec)
+    with ffmpeg_process("EXTRACT"):
+        process = subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-y",
+             "-f", "s16le", "-ar", str(SAMPLE_RATE), "-ac", str(CHANNELS), "-i", "pipe:0",
+             "-acodec", encoder, "-f", muxer, output_path],
+            stdin=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        # communicate: nincs pipe deadlock, és ha ffmpeg korán kilép, a stderr megmondja miért
+        with cancellation.track(process):
+            _, stderr = process.communicate(memoryview(pcm[start:end]).cast("B"))
+        if process.returncode != 0:
+            cancellation.check()
+            raise RuntimeError(f"FFmpeg encode error: {stderr.decode(errors='ignore')}")
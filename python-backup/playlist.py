@@ -0,0 +1,72 @@
+# --- PLAYLIST INGEST ---
+# Egy playlist URL + videónkénti szegmens lista -> videónkénti job csoportok.
+# - resolve_playlist: flat playlist feloldás (csak ID / cím, letöltés és formátum
+#   feloldás nélkül - azt videónként a prepare_source végzi)
+# - plan_playlist: a kért szegmensek hozzárendelése a playlist elemeihez
+# A futtatás (letöltés előre, korlátos prefetch-csel, közben encode) a main.py
+# _run_pipeline-ja, a scheduler download / encode poolján.
+
+import os
+
+from ydl_pool import YDL_OPTS
+from app_logging import get_logger
+
+logger = get_logger("playlist")
+
+PLAYLIST_MAX_VIDEOS = int(os.getenv("PLAYLIST_MAX_VIDEOS", 200))
+
+PLAYLIST_OPTS = {
+    **YDL_OPTS,
+    'noplaylist': False,
+    'extract_flat': 'in_playlist',
+    'skip_download': True,
+}
+
+
+def _entry_url(entry):
+    url = entry.get('url') or ""
+    if url.startswith(("http://", "https://")):
+        return url
+    return f"https://www.youtube.com/watch?v={entry['id']}"
+
+
+def resolve_playlist(playlist_url):
+    """Visszaad: (cím, [{"index", "id", "url", "title"}]) - a playlist sorrendjében, 1-alapú indexszel"""
+    from yt_dlp import YoutubeDL
+
+    with YoutubeDL(PLAYLIST_OPTS) as ydl:
+        info = ydl.extract_info(playlist_url, download=False)
+    if info.get('_type') != 'playlist':
+        raise ValueError("Not a playlist URL")
+    entries = []
+    for index, entry in enumerate(info.get('entries') or [], start=1):
+        if not entry or not entry.get('id'):
+            continue  # törölt / privát videó
+        entries.append({"index": index, "id": entry['id'], "url": _entry_url(entry), "title": entry.get('title')})
+    logger.info(f"📃 Playlist resolved: {len(entries)} video(s)", extra={"url": playlist_url, "videos": len(entries)})
+    return info.get('title'), entries
+
+
+def plan_playlist(entries, videos, default_segments):
+    """
+    [(entry, segments)] a playlist sorrendjében.
+    - videos: [{"video_id" | "index", "segments"}] - videónkénti szegmensek
+    - default_segments: a videos-ban nem szereplő elemekhez (üres: azok kimaradnak)
+    ValueError, ha egy hivatkozott videó nincs a playlistben, vagy túl sok a videó.
+    """
+    by_id = {entry["id"]: entry for entry in entries}
+    by_index = {entry["index"]: entry for entry in entries}
+    explicit = {}
+    for video in videos:
+        entry = by_id.get(video["video_id"]) if video.get("video_id") else by_index.get(video.get("index"))
+        if entry is None:
+            raise ValueError(f"Video not in playlist: {video.get('video_id') or video.get('index')}")
+        explicit.setdefault(entry["id"], []).extend(video["segments"])
+    plan = [
+        (entry, explicit.get(entry["id"], default_segments))
+        for entry in entries
+        if explicit.get(entry["id"], default_segments)
+    ]
+    if len(plan) > PLAYLIST_MAX_VIDEOS:
+        raise ValueError(f"Too many videos: {len(plan)} (max {PLAYLIST_MAX_VIDEOS})")
+    return plan
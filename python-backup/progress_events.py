@@ -0,0 +1,63 @@
+# --- PROGRESS EVENT BUS ---
+# A pipeline (worker szálak) által publikált progress események azonnali továbbítása
+# a /ws/progress feliratkozóknak - polling helyett push.
+
+import asyncio
+import threading
+from contextlib import contextmanager
+
+
+class ProgressBus:
+    """
+    - publish(job_id, event): bármelyik szálról hívható
+    - subscribe(job_id): asyncio.Queue, amibe az események érkeznek (az event loopon)
+    """
+
+    def __init__(self, max_queue=256):
+        self.max_queue = max_queue
+        self._subscribers = {}  # job_id: set of (loop, asyncio.Queue)
+        self._lock = threading.Lock()
+        self.published = 0
+
+    def publish(self, job_id, event):
+        with self._lock:
+            targets = list(self._subscribers.get(job_id, ()))
+        self.published += 1
+        for loop, queue in targets:
+            try:
+                loop.call_soon_threadsafe(self._deliver, queue, event)
+            except RuntimeError:
+                pass  # a loop már leállt
+
+    @staticmethod
+    def _deliver(queue, event):
+        if queue.full():
+            # Lassú kliens: a legrégebbi köztes eseményt dobjuk, az utolsó állapot a fontos
+            queue.get_nowait()
+        queue.put_nowait(event)
+
+    @contextmanager
+    def subscribe(self, job_id):
+        subscriber = (asyncio.get_running_loop(), asyncio.Queue(self.max_queue))
+        with self._lock:
+            self._subscribers.setdefault(job_id, set()).add(subscriber)
+        try:
+            yield subscriber[1]
+        finally:
+            with self._lock:
+                subscribers = self._subscribers.get(job_id)
+                if subscribers is not None:
+                    subscribers.discard(subscriber)
+                    if not subscribers:
+                        del self._subscribers[job_id]
+
+    def stats(self):
+        with self._lock:
+            return {
+                "jobs_with_subscribers": len(self._subscribers),
+                "subscribers": sum(len(s) for s in self._subscribers.values()),
+                "published": self.published,
+            }
+
+
+progress_bus = ProgressBus()
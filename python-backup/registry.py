@@ -0,0 +1,549 @@
+# --- JOB / FILE REGISTRY ---
+# A korábbi modul szintű jobs/files dict-ek helyett: kompakt rekordok, TTL és méret
+# alapú eviction, háttér sweeper ami a lejárt output fájlokat és az árva yt-audio-*
+# temp könyvtárakat is törli. Opcionális SQLite backend (túléli az újraindítást, egy
+# hoszton több worker osztozhat rajta) és Redis backend (több node).
+
+import glob
+import json
+import os
+from contextlib import contextmanager
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field, asdict, fields as dataclass_fields
+
+from app_logging import get_logger
+
+logger = get_logger("registry")
+
+TERMINAL_STATUSES = ("done", "error", "cancelled")
+
+
+@dataclass(slots=True)
+class JobRecord:
+    status: str = "queued"
+    progress: int = 0
+    result: dict | None = None
+    error: str | None = None
+    file_id: str | None = None
+    created_at: float = field(default_factory=time.time)
+    updated_at: float = field(default_factory=time.time)
+
+    def to_dict(self):
+        """A /status válasz formája (a korábbi jobs dict mezői)"""
+        return {
+            "status": self.status,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "file_id": self.file_id,
+        }
+
+
+@dataclass(slots=True)
+class FileRecord:
+    path: str
+    temp_dir: str | None = None
+    metadata: dict = field(default_factory=dict)
+    created_at: float = field(default_factory=time.time)
+    node: str | None = None  # a fájlt tároló node base URL-je (NODE_URL), több node esetén
+    etag: str | None = None  # tartalom hash (http_cache.content_etag), az encode végén számolva
+
+
+@dataclass(slots=True)
+class OutputRecord:
+    """Dedup index: normalizált kérés kulcs -> a futó job, majd a kész output fájl"""
+    job_id: str | None = None
+    file_id: str | None = None
+    size: int = 0
+    created_at: float = field(default_factory=time.time)  # utolsó használat (LRU)
+
+
+@dataclass(slots=True)
+class BatchRecord:
+    """Egy /batch kérés jobjai (a ZIP export batch_id alapján ezekből gyűjti a fájlokat)"""
+    job_ids: list = field(default_factory=list)
+    created_at: float = field(default_factory=time.time)
+
+
+def _remove_file_data(record):
+    if record.temp_dir:
+        shutil.rmtree(record.temp_dir, ignore_errors=True)
+    elif record.path:
+        try:
+            os.remove(record.path)
+        except OSError:
+            pass
+
+
+class Registry:
+    """
+    Közös interfész + eviction/sweeper logika. A backendek a _get/_put/_delete/_scan
+    primitíveket valósítják meg ("jobs" és "files" táblákra).
+    - job_ttl / file_ttl: sec, ennyi idő után a befejezett job / output fájl törölhető
+    - max_jobs / max_files: méret korlát, a legrégebbi (befejezett) rekordok mennek először
+    """
+
+    def __init__(self, job_ttl=6 * 3600, file_ttl=6 * 3600, max_jobs=10000, max_files=5000, node=None,
+                 max_output_bytes=1024 * 1024 * 1024):
+        self.node = node
+        self.job_ttl = job_ttl
+        self.file_ttl = file_ttl
+        self.max_jobs = max_jobs
+        self.max_files = max_files
+        self.max_output_bytes = max_output_bytes
+        self._lock = threading.RLock()
+        self._sweeper = None
+        self._stop = threading.Event()
+        self.evicted_jobs = 0
+        self.evicted_files = 0
+        self.removed_orphans = 0
+        self.evicted_outputs = 0
+        self.output_hits = 0
+        self.output_attached = 0
+
+    # --- jobs ---
+    def create_job(self, job_id, **values):
+        record = JobRecord(**values)
+        with self._lock:
+            self._put("jobs", job_id, record)
+        return record
+
+    def get_job(self, job_id):
+        with self._lock:
+            return self._get("jobs", job_id)
+
+    @contextmanager
+    def _atomic(self):
+        # Read-modify-write védelem; a megosztott backendek folyamatok között is zárolnak
+        with self._lock:
+            yield
+
+    def update_job(self, job_id, only_active=False, **changes):
+        """only_active: befejezett (TERMINAL_STATUSES) jobot nem módosít - a rekord változatlanul jön vissza"""
+        with self._atomic():
+            record = self._get("jobs", job_id)
+            if record is None:
+                return None
+            if only_active and record.status in TERMINAL_STATUSES:
+                return record
+            for key, value in changes.items():
+                setattr(record, key, value)
+            record.updated_at = time.time()
+            self._put("jobs", job_id, record)
+            return record
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._delete("jobs", job_id)
+
+    # --- batches ---
+    def create_batch(self, batch_id, job_ids):
+        with self._lock:
+            self._put("batches", batch_id, BatchRecord(job_ids=list(job_ids)))
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            return self._get("batches", batch_id)
+
+    # --- files ---
+    def add_file(self, file_id, path, temp_dir=None, metadata=None, etag=None):
+        record = FileRecord(path=path, temp_dir=temp_dir, metadata=metadata or {}, node=self.node, etag=etag)
+        with self._lock:
+            self._put("files", file_id, record)
+        return record
+
+    def is_local(self, record):
+        return record.node is None or record.node == self.node
+
+    def get_file(self, file_id):
+        """A rekord, ha a fájl elérhető: helyben létezik, vagy egy másik node-on van (record.node)"""
+        with self._lock:
+            record = self._get("files", file_id)
+        if record is not None and self.is_local(record) and not os.path.exists(record.path):
+            return None
+        return record
+
+    def remove_file(self, file_id):
+        with self._lock:
+            record = self._get("files", file_id)
+            self._delete("files", file_id)
+        if record is not None and self.is_local(record):
+            _remove_file_data(record)
+
+    # --- output dedup ---
+    def claim_output(self, key, job_id):
+        """
+        Azonos (normalizált) kérés keresése:
+        - ("hit", file_id): a kimenet már kész (a fájl TTL-je ilyenkor újraindul)
+        - ("attach", job_id): egy azonos job már sorban áll / fut
+        - ("new", None): nincs ilyen - a kulcs mostantól job_id-hoz tartozik
+        Több workerrel / node-dal is egyetlen "new" lesz: SQLite-on BEGIN IMMEDIATE, Redisen a
+        registry lock alatt fut (ez csak a lock_lease-en belül kizárólagos, ezért itt nincs I/O).
+        """
+        now = time.time()
+        with self._atomic():
+            record = self._get("outputs", key)
+            if record is not None and record.file_id:
+                file = self._get("files", record.file_id)
+                if file is not None and (not self.is_local(file) or os.path.exists(file.path)):
+                    record.created_at = file.created_at = now
+                    self._put("outputs", key, record)
+                    self._put("files", record.file_id, file)
+                    self.output_hits += 1
+                    return "hit", record.file_id
+            elif record is not None and record.job_id:
+                job = self._get("jobs", record.job_id)
+                if job is not None and job.status not in TERMINAL_STATUSES:
+                    self.output_attached += 1
+                    return "attach", record.job_id
+            self._put("outputs", key, OutputRecord(job_id=job_id))
+            return "new", None
+
+    def complete_output(self, key, job_id, file_id, size):
+        with self._atomic():
+            record = self._get("outputs", key)
+            if record is None:
+                record = OutputRecord(job_id=job_id)  # pl. /extract/stream kimenet: claim nélkül is cache-elhető
+            if record.job_id == job_id:
+                record.file_id = file_id
+                record.size = size
+                record.created_at = time.time()
+                self._put("outputs", key, record)
+
+    def release_output(self, key, job_id):
+        """Sikertelen / visszavont job: a kulcs felszabadul, a következő kérés újra próbálja"""
+        with self._atomic():
+            record = self._get("outputs", key)
+            if record is not None and record.job_id == job_id and not record.file_id:
+                self._delete("outputs", key)
+
+    def _sweep_outputs_locked(self, expired_files):
+        # Lógó bejegyzések (a fájl / job már nincs meg) törlése, majd byte budget LRU szerint;
+        # a budget miatt kiesett fájlok az expired_files-hoz kerülnek (temp könyvtár törlés)
+        live, total = [], 0
+        for key, record in self._scan("outputs"):
+            if record.file_id:
+                if self._get("files", record.file_id) is None:
+                    self._delete("outputs", key)
+                    continue
+                live.append((key, record))
+                total += record.size
+            else:
+                job = self._get("jobs", record.job_id) if record.job_id else None
+                if job is None or job.status in TERMINAL_STATUSES:
+                    self._delete("outputs", key)
+        live.sort(key=lambda item: item[1].created_at)  # a memory backend beszúrási sorrendben scannel
+        for key, record in live:
+            if total <= self.max_output_bytes:
+                break
+            file = self._get("files", record.file_id)
+            self._delete("outputs", key)
+            self._delete("files", record.file_id)
+            expired_files.append((record.file_id, file))
+            total -= record.size
+            self.evicted_outputs += 1
+
+    # --- eviction ---
+    def sweep(self):
+        """Lejárt / limit feletti rekordok és fájlok törlése, árva temp könyvtárak takarítása."""
+        now = time.time()
+        with self._lock:
+            # Files: TTL, majd méret korlát (legrégebbi először)
+            expired_files = []
+            all_files = self._scan("files")  # [(id, record)] created_at szerint
+            for file_id, record in all_files:
+                if now - record.created_at > self.file_ttl:
+                    expired_files.append((file_id, record))
+            overflow = len(all_files) - len(expired_files) - self.max_files
+            if overflow > 0:
+                expired_ids = {file_id for file_id, _ in expired_files}
+                remaining = [item for item in all_files if item[0] not in expired_ids]
+                expired_files.extend(remaining[:overflow])
+            for file_id, _ in expired_files:
+                self._delete("files", file_id)
+            self.evicted_files += len(expired_files)
+
+            # Jobs: csak befejezett jobok évülnek el
+            expired_jobs = []
+            finished = [(job_id, r) for job_id, r in self._scan("jobs") if r.status in TERMINAL_STATUSES]
+            for job_id, record in finished:
+                if now - record.updated_at > self.job_ttl:
+                    expired_jobs.append(job_id)
+            overflow = self._count("jobs") - len(expired_jobs) - self.max_jobs
+            if overflow > 0:
+                expired_ids = set(expired_jobs)
+                remaining = [job_id for job_id, _ in finished if job_id not in expired_ids]
+                expired_jobs.extend(remaining[:overflow])
+            for job_id in expired_jobs:
+                self._delete("jobs", job_id)
+            self.evicted_jobs += len(expired_jobs)
+            self._sweep_outputs_locked(expired_files)
+            # Batches: a jobokkal azonos TTL
+            for batch_id, record in self._scan("batches"):
+                if now - record.created_at <= self.job_ttl:
+                    break  # created_at szerint rendezett
+                self._delete("batches", batch_id)
+            known_dirs = {r.temp_dir for _, r in self._scan("files") if r.temp_dir}
+
+        # Más node fájljait az ottani sweeper takarítja (árva könyvtárként)
+        for _, record in expired_files:
+            if self.is_local(record):
+                _remove_file_data(record)
+        self._remove_orphan_dirs(known_dirs, now)
+        return len(expired_jobs), len(expired_files)
+
+    def _remove_orphan_dirs(self, known_dirs, now):
+        # Regisztrálatlan (pl. hibás/megszakadt job utáni) yt-audio-* könyvtárak
+        for path in glob.glob(os.path.join(tempfile.gettempdir(), "yt-audio-*")):
+            if path in known_dirs:
+                continue
+            try:
+                if now - os.path.getmtime(path) > self.file_ttl:
+                    shutil.rmtree(path, ignore_errors=True)
+                    self.removed_orphans += 1
+            except OSError:
+                pass
+
+    def start_sweeper(self, interval=60):
+        if self._sweeper is not None:
+            return
+        self._stop.clear()
+
+        def loop():
+            while not self._stop.wait(interval):
+                try:
+                    self.sweep()
+                except Exception as e:
+                    logger.exception(f"❌ Registry sweep failed: {e}")
+
+        self._sweeper = threading.Thread(target=loop, name="registry-sweeper", daemon=True)
+        self._sweeper.start()
+
+    def stop_sweeper(self):
+        self._stop.set()
+        self._sweeper = None
+
+    def status_counts(self):
+        with self._lock:
+            counts = {}
+            for _, record in self._scan("jobs"):
+                counts[record.status] = counts.get(record.status, 0) + 1
+            return counts
+
+    def stats(self):
+        with self._lock:
+            return {
+                "backend": type(self).__name__,
+                "jobs": self._count("jobs"),
+                "files": self._count("files"),
+                "job_status": self.status_counts(),
+                "evicted_jobs": self.evicted_jobs,
+                "evicted_files": self.evicted_files,
+                "removed_orphan_dirs": self.removed_orphans,
+                "outputs": self._count("outputs"),
+                "output_hits": self.output_hits,
+                "output_attached": self.output_attached,
+                "evicted_outputs": self.evicted_outputs,
+            }
+
+
+class MemoryRegistry(Registry):
+    """Folyamaton belüli registry (az alapértelmezett)."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self._tables = {"jobs": OrderedDict(), "files": OrderedDict(), "outputs": OrderedDict(), "batches": OrderedDict()}
+
+    def _get(self, table, key):
+        return self._tables[table].get(key)
+
+    def _put(self, table, key, record):
+        self._tables[table][key] = record
+
+    def _delete(self, table, key):
+        self._tables[table].pop(key, None)
+
+    def _scan(self, table):
+        return list(self._tables[table].items())
+
+    def _count(self, table):
+        return len(self._tables[table])
+
+
+class SQLiteRegistry(Registry):
+    """SQLite alapú registry - a job/file rekordok túlélik az újraindítást."""
+
+    _RECORD_TYPES = {"jobs": JobRecord, "files": FileRecord, "outputs": OutputRecord, "batches": BatchRecord}
+
+    def __init__(self, db_path, recover=True, **kwargs):
+        super().__init__(**kwargs)
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for table in self._RECORD_TYPES:
+            self._conn.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} (id TEXT PRIMARY KEY, created_at REAL, data TEXT)"
+            )
+        # Közös work queue mellett a félbemaradt jobokat a queue claim lejárata futtatja újra,
+        # és a többi worker futó jobjait sem szabad hibásnak jelölni
+        if recover:
+            self._recover_interrupted()
+
+    @contextmanager
+    def _atomic(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _recover_interrupted(self):
+        # Az előző futásból itt ragadt queued/running jobok már sosem fejeződnek be
+        for job_id, record in self._scan("jobs"):
+            if record.status not in TERMINAL_STATUSES:
+                record.status = "error"
+                record.error = "Interrupted by server restart"
+                self._put("jobs", job_id, record)
+
+    def _decode(self, table, data):
+        record_type = self._RECORD_TYPES[table]
+        names = {f.name for f in dataclass_fields(record_type)}
+        return record_type(**{k: v for k, v in json.loads(data).items() if k in names})
+
+    def _get(self, table, key):
+        row = self._conn.execute(f"SELECT data FROM {table} WHERE id = ?", (key,)).fetchone()
+        return self._decode(table, row[0]) if row else None
+
+    def _put(self, table, key, record):
+        self._conn.execute(
+            f"INSERT OR REPLACE INTO {table} (id, created_at, data) VALUES (?, ?, ?)",
+            (key, record.created_at, json.dumps(asdict(record))),
+        )
+
+    def _delete(self, table, key):
+        self._conn.execute(f"DELETE FROM {table} WHERE id = ?", (key,))
+
+    def _scan(self, table):
+        rows = self._conn.execute(f"SELECT id, data FROM {table} ORDER BY created_at").fetchall()
+        return [(key, self._decode(table, data)) for key, data in rows]
+
+    def _count(self, table):
+        return self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+
+class RedisRegistry(Registry):
+    """
+    Redis alapú registry több node-hoz. Táblánként egy HASH (id -> JSON) és egy ZSET
+    (id -> created_at) a sorrendhez. A read-modify-write lépések (update_job, a cancel,
+    claim_output) node-ok között is atomiak: az _atomic egy registry szintű Redis lockot
+    tart (SET NX PX, lease-szel, ha a tartó node meghal), az SQLite BEGIN IMMEDIATE megfelelője.
+    """
+
+    _RECORD_TYPES = SQLiteRegistry._RECORD_TYPES
+    _decode = SQLiteRegistry._decode
+
+    # Csak a saját token törölhető: lejárt lease után egy másik node lockját nem engedjük el
+    _RELEASE = """
+        if redis.call('GET', KEYS[1]) == ARGV[1] then
+            return redis.call('DEL', KEYS[1])
+        end
+        return 0
+    """
+
+    def __init__(self, client, prefix="tube", lock_lease=5.0, lock_timeout=10.0, **kwargs):
+        super().__init__(**kwargs)
+        self.redis = client
+        self.prefix = prefix
+        self.lock_lease = lock_lease
+        self.lock_timeout = lock_timeout
+        self._release_lock = client.register_script(self._RELEASE)
+        self._atomic_depth = 0  # a self._lock alatt: egymásba ágyazott _atomic nem zárol újra
+
+    @contextmanager
+    def _atomic(self):
+        with self._lock:
+            if self._atomic_depth:
+                self._atomic_depth += 1
+                try:
+                    yield
+                finally:
+                    self._atomic_depth -= 1
+                return
+            key = f"{self.prefix}:registry-lock"
+            token = uuid.uuid4().hex
+            deadline = time.monotonic() + self.lock_timeout
+            while not self.redis.set(key, token, nx=True, px=int(self.lock_lease * 1000)):
+                if time.monotonic() > deadline:
+                    raise TimeoutError(f"Registry lock not acquired in {self.lock_timeout:g}s")
+                time.sleep(0.005)
+            self._atomic_depth = 1
+            try:
+                yield
+            finally:
+                self._atomic_depth = 0
+                self._release_lock(keys=[key], args=[token])
+
+    def _key(self, table, suffix=""):
+        return f"{self.prefix}:{table}{suffix}"
+
+    def _get(self, table, key):
+        data = self.redis.hget(self._key(table), key)
+        return self._decode(table, data) if data is not None else None
+
+    def _put(self, table, key, record):
+        pipe = self.redis.pipeline()
+        pipe.hset(self._key(table), key, json.dumps(asdict(record)))
+        pipe.zadd(self._key(table, ":order"), {key: record.created_at})
+        pipe.execute()
+
+    def _delete(self, table, key):
+        pipe = self.redis.pipeline()
+        pipe.hdel(self._key(table), key)
+        pipe.zrem(self._key(table, ":order"), key)
+        pipe.execute()
+
+    def _scan(self, table):
+        keys = self.redis.zrange(self._key(table, ":order"), 0, -1)
+        if not keys:
+            return []
+        values = self.redis.hmget(self._key(table), keys)
+        return [
+            (key.decode() if isinstance(key, bytes) else key, self._decode(table, data))
+            for key, data in zip(keys, values) if data is not None
+        ]
+
+    def _count(self, table):
+        return self.redis.hlen(self._key(table))
+
+
+def create_registry():
+    options = dict(
+        job_ttl=int(os.getenv("JOB_TTL", 6 * 3600)),
+        file_ttl=int(os.getenv("FILE_TTL", 6 * 3600)),
+        max_jobs=int(os.getenv("MAX_JOBS", 10000)),
+        max_files=int(os.getenv("MAX_FILES", 5000)),
+        node=os.getenv("NODE_URL") or None,
+        max_output_bytes=int(os.getenv("OUTPUT_CACHE_MAX_BYTES", 1024 * 1024 * 1024)),
+    )
+    backend = os.getenv("REGISTRY_BACKEND", "memory")
+    if backend == "sqlite":
+        from work_queue import shared_db_path
+        shared_queue = os.getenv("WORK_QUEUE_BACKEND", "memory") != "memory"
+        return SQLiteRegistry(shared_db_path(), recover=not shared_queue, **options)
+    if backend == "redis":
+        from work_queue import redis_client
+        return RedisRegistry(redis_client(), prefix=os.getenv("REDIS_PREFIX", "tube"), **options)
+    return MemoryRegistry(**options)
+
+
+registry = create_registry()
@@ -0,0 +1,224 @@
+# --- JOB SCHEDULER ---
+# Korlátos, prioritásos job sor külön download (hálózat) és encode (CPU) poollal.
+# A FastAPI BackgroundTasks helyett: a HTTP handlerek threadpoolját nem éheztetjük ki,
+# és egyszerre legfeljebb ENCODE_WORKERS ffmpeg fut. A sor maga a work_queue.py
+# backendje: közös (sqlite / redis) sor esetén bármelyik worker claimelheti a jobokat.
+# Minden lépés megszakítható: a task cancel / a stage határidő a cancellation.py tokenen
+# keresztül leállítja a worker szálon futó ffmpeg / yt-dlp munkát, a slot azonnal felszabadul.
+
+import asyncio
+import contextvars
+import functools
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app_logging import get_logger
+from cancellation import CancelToken, current_token
+from work_queue import create_work_queue, MemoryWorkQueue
+
+logger = get_logger("scheduler")
+
+PRIORITY_INTERACTIVE = 0  # /extract
+PRIORITY_BATCH = 10       # /batch
+
+# Stage határidők (sec, 0 = nincs): lejáratkor a lépés TimeoutError-ral megszakad
+STAGE_TIMEOUTS = {
+    "DOWNLOAD": float(os.getenv("DOWNLOAD_TIMEOUT", 900)),
+    "EXTRACT": float(os.getenv("EXTRACT_TIMEOUT", 600)),
+}
+
+
+class QueueFullError(Exception):
+    """A várakozási sor tele van - a kliens retry_after másodperc múlva próbálkozzon újra."""
+
+    def __init__(self, retry_after):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobScheduler:
+    """
+    - submit(job_ids, payload, priority): a payload JSON-szerializálható dict, amit a
+      claimelő worker a handler(job_ids, payload) coroutine-nak ad át
+    - a handler a run_download / run_encode segítségével futtatja a blokkoló lépéseket
+    - egyszerre legfeljebb download_workers + encode_workers entry aktív, a többi sorban vár
+    - claim_timeout: ennyi sec heartbeat nélkül egy claim lejár (a worker meghalt), az
+      entry visszakerül a sorba
+    """
+
+    def __init__(self, download_workers=4, encode_workers=2, max_queue=100, queue=None, claim_timeout=120,
+                 stage_timeouts=None):
+        self.download_workers = download_workers
+        self.encode_workers = encode_workers
+        self.max_queue = max_queue
+        self.max_active = download_workers + encode_workers
+        self.download_pool = ThreadPoolExecutor(download_workers, thread_name_prefix="download")
+        self.encode_pool = ThreadPoolExecutor(encode_workers, thread_name_prefix="encode")
+        self.queue = queue or MemoryWorkQueue()
+        self.claim_timeout = claim_timeout
+        self.stage_timeouts = dict(stage_timeouts or {})
+        self.handler = None
+        self._active = {}  # task: entry_id
+        self._wakeup = None
+        self._dispatcher = None
+        self._avg_job_seconds = 10.0  # EMA, a Retry-After becsléshez
+        self.completed = 0
+        self.rejected = 0
+        self.cancelled = 0
+        self.timed_out = 0
+
+    # --- lifecycle ---
+    def start(self):
+        if self._dispatcher is None:
+            self._wakeup = asyncio.Event()
+            self._dispatcher = asyncio.get_running_loop().create_task(self._dispatch())
+
+    async def shutdown(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+            self._dispatcher = None
+        self.download_pool.shutdown(wait=False, cancel_futures=True)
+        self.encode_pool.shutdown(wait=False, cancel_futures=True)
+
+    # --- submission ---
+    def retry_after(self, depth=None):
+        depth = self.queue.depth() if depth is None else depth
+        waves = (depth + 1) / self.max_active
+        return max(1, math.ceil(waves * self._avg_job_seconds))
+
+    async def submit_many(self, items, priority=PRIORITY_INTERACTIVE):
+        """
+        items: [(job_ids, payload), ...] - vagy mind bekerül a sorba, vagy egyik sem.
+        QueueFullError-t dob, ha nincs elég hely. A közös sor (sqlite / redis) hívásai
+        blokkolhatnak: worker szálon futnak, nem az event loopon.
+        """
+        self.start()
+        depth = await asyncio.to_thread(self.queue.depth)
+        if depth + len(items) > self.max_queue:
+            self.rejected += 1
+            raise QueueFullError(self.retry_after(depth))
+        await asyncio.to_thread(self.queue.push_many, items, priority)
+        self._wakeup.set()
+
+    async def submit(self, job_ids, payload, priority=PRIORITY_INTERACTIVE):
+        await self.submit_many([(job_ids, payload)], priority)
+
+    def queue_position(self, job_id):
+        """1-alapú pozíció a várakozási sorban, vagy None ha már nem vár"""
+        return self.queue.position(job_id)
+
+    # --- stage execution ---
+    async def run_download(self, fn, *args, discard=None, **kwargs):
+        """discard(result): megszakítás után mégis elkészült eredmény eldobása (pl. PreparedSource.close)"""
+        return await self._run_in(self.download_pool, "DOWNLOAD", functools.partial(fn, *args, **kwargs), discard)
+
+    async def run_encode(self, fn, *args, discard=None, **kwargs):
+        return await self._run_in(self.encode_pool, "EXTRACT", functools.partial(fn, *args, **kwargs), discard)
+
+    async def _run_in(self, pool, stage, call, discard=None):
+        # A contextvar-ok (pl. a log job ID, a cancel token) a worker szálon is látszanak
+        loop = asyncio.get_running_loop()
+        context = contextvars.copy_context()
+        # Saját (gyerek) token a lépésnek: a lejárt határidő csak ezt a lépést állítja le,
+        # a job / batch tokenjén osztozó többi lépést nem; a szülő cancel-je ide is eljut
+        parent = current_token.get()
+        token = parent.child() if parent is not None else CancelToken()
+        context.run(current_token.set, token)
+        future = loop.run_in_executor(pool, context.run, call)
+        future.add_done_callback(lambda _: token.detach())
+        timeout = self.stage_timeouts.get(stage) or None
+        try:
+            # shield: a task cancel / timeout nem várja meg a szálat, azt a token állítja le
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except (asyncio.CancelledError, asyncio.TimeoutError) as e:
+            timed_out = not isinstance(e, asyncio.CancelledError)
+            if timed_out:
+                self.timed_out += 1
+                token.cancel(f"{stage} stage timed out after {timeout:g}s")
+            else:
+                self.cancelled += 1
+                token.cancel()
+            future.add_done_callback(functools.partial(self._discard_late, discard))
+            if timed_out:
+                raise TimeoutError(token.reason) from None
+            raise
+
+    @staticmethod
+    def _discard_late(discard, future):
+        # Az exception() lekérése: a JobCancelled ne "never retrieved" warningként jelenjen meg
+        if future.cancelled() or future.exception() is not None or discard is None:
+            return
+        # A takarítás (rmtree) ne az event loopon fusson
+        asyncio.get_running_loop().run_in_executor(None, discard, future.result())
+
+    # --- dispatch ---
+    async def _dispatch(self):
+        last_heartbeat = 0.0
+        while True:
+            try:
+                while len(self._active) < self.max_active:
+                    entry = await asyncio.to_thread(self.queue.claim)
+                    if entry is None:
+                        break
+                    task = asyncio.create_task(self._run(*entry))
+                    self._active[task] = entry[0]
+                if time.monotonic() - last_heartbeat > self.claim_timeout / 4:
+                    last_heartbeat = time.monotonic()
+                    await asyncio.to_thread(self.queue.heartbeat, list(self._active.values()))
+                    requeued = await asyncio.to_thread(self.queue.requeue_stale, self.claim_timeout)
+                    if requeued:
+                        logger.warning(f"⚠️ Requeued {requeued} stale work queue entr(y/ies)")
+            except Exception as e:
+                # Pl. a közös sor (redis / sqlite) átmenetileg nem elérhető - a következő körben újra
+                logger.exception(f"❌ Work queue dispatch failed: {e}")
+            self._wakeup.clear()
+            # Közös sornál más folyamatok is tesznek bele: poll_interval-onként ránézünk
+            timeout = self.queue.poll_interval or (self.claim_timeout / 4 if self._active else None)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _run(self, entry_id, job_ids, payload):
+        started = time.monotonic()
+        try:
+            await self.handler(job_ids, payload)
+        except Exception as e:
+            logger.exception(f"❌ Scheduler entry {job_ids} failed: {e}")
+        finally:
+            elapsed = time.monotonic() - started
+            self._avg_job_seconds = 0.8 * self._avg_job_seconds + 0.2 * elapsed
+            self.completed += 1
+            self._active.pop(asyncio.current_task(), None)
+            try:
+                await asyncio.to_thread(self.queue.ack, entry_id)
+            except Exception as e:
+                logger.exception(f"❌ Work queue ack failed for {job_ids}: {e}")
+            self._wakeup.set()
+
+    def stats(self):
+        return {
+            "backend": type(self.queue).__name__,
+            "queued": self.queue.depth(),
+            "active": len(self._active),
+            "max_queue": self.max_queue,
+            "download_workers": self.download_workers,
+            "encode_workers": self.encode_workers,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "cancelled": self.cancelled,
+            "timed_out": self.timed_out,
+            "avg_job_seconds": round(self._avg_job_seconds, 2),
+        }
+
+
+scheduler = JobScheduler(
+    download_workers=int(os.getenv("DOWNLOAD_WORKERS", 4)),
+    encode_workers=int(os.getenv("ENCODE_WORKERS", max(1, (os.cpu_count() or 2) // 2))),
+    max_queue=int(os.getenv("MAX_QUEUE", 100)),
+    queue=create_work_queue(),
+    claim_timeout=int(os.getenv("CLAIM_TIMEOUT", 120)),
+    stage_timeouts=STAGE_TIMEOUTS,
+)
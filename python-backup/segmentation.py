@@ -0,0 +1,159 @@
+# --- AUTO SEGMENTATION ---
+# Jelölt hangrészletek (sound bite-ok) keresése a teljes forrásban, kézi start/end
+# találgatás helyett. A forrás egyszer dekódolódik (pcm_store memmap, cache-elve), az
+# elemzés fix méretű frame-eken, vektorizált NumPy-jal, chunkonként fut - egy több
+# órás forrás PCM-je sem kerül egyben a memóriába, csak a frame-enkénti jellemzők:
+# - energia: frame RMS (dBFS)
+# - onset: spektrális flux (a magnitúdó spektrum pozitív változása az előző frame-hez képest)
+# Szegmens: csenddel (adaptív küszöb alatti energia) határolt aktív szakasz; a túl hosszúak
+# a legcsendesebb pontjukon kettéválnak. Rangsor: onset erősség a szegmens elején + hangosság.
+
+import os
+
+import pcm_store
+from app_logging import get_logger
+
+logger = get_logger("segmentation")
+
+FRAME_MS = int(os.getenv("SEGMENT_FRAME_MS", 20))
+CHUNK_SECONDS = int(os.getenv("SEGMENT_CHUNK_SECONDS", 60))  # ennyi PCM-et olvasunk egyszerre
+MIN_SILENCE = 0.25    # ennél rövidebb csend nem vág két szegmenst
+PAD = 0.05            # ennyi ráhagyás a szegmens két szélén (a csend rovására)
+ONSET_WINDOW = 0.1    # a szegmens elejének ennyi ideje számít az onset erősséghez
+MAX_SEGMENTS = 200
+
+
+def frame_features(pcm, frame_len, chunk_frames):
+    """(energy_db, onset) frame-enként, chunkonként olvasva a (frames, CHANNELS) int16 memmap-ből"""
+    import numpy as np
+
+    total = len(pcm) // frame_len
+    energy_db = np.empty(total, dtype=np.float32)
+    onset = np.empty(total, dtype=np.float32)
+    window = np.hanning(frame_len).astype(np.float32)
+    previous = None  # az előző chunk utolsó spektruma (a flux folytonos a chunk határon)
+    step = chunk_frames * frame_len
+    for offset in range(0, total * frame_len, step):
+        chunk = np.asarray(pcm[offset:min(offset + step, total * frame_len)], dtype=np.float32)
+        frames = chunk.mean(axis=1).reshape(-1, frame_len) / 32768.0  # mono, (n, frame_len)
+        first = offset // frame_len
+        n = len(frames)
+        rms = np.sqrt(np.mean(frames * frames, axis=1))
+        energy_db[first:first + n] = 20 * np.log10(np.maximum(rms, 1e-6))
+        spectrum = np.abs(np.fft.rfft(frames * window, axis=1))
+        if previous is None:
+            previous = spectrum[:1]
+        flux = np.diff(np.concatenate([previous, spectrum]), axis=0)
+        onset[first:first + n] = np.maximum(flux, 0).sum(axis=1)
+        previous = spectrum[-1:]
+    return energy_db, onset
+
+
+def _runs(mask):
+    """[(start, end)) indexpárok a mask összefüggő True szakaszaira"""
+    import numpy as np
+
+    edges = np.diff(np.concatenate([[0], mask.astype(np.int8), [0]]))
+    return list(zip(np.flatnonzero(edges == 1), np.flatnonzero(edges == -1)))
+
+
+def _split_long(start, end, energy_db, max_frames, min_frames):
+    """A max hossznál hosszabb szakasz darabolása balról: minden vágás a [min, max] hosszú ablak legcsendesebb frame-jénél"""
+    import numpy as np
+
+    pieces = []
+    while end - start > max_frames:
+        lo, hi = start + min_frames, start + max_frames
+        cut = lo + int(np.argmin(energy_db[lo:hi]))
+        pieces.append((start, cut))
+        start = cut
+    pieces.append((start, end))
+    return pieces
+
+
+def find_segments(energy_db, onset, frame_seconds, min_duration=0.3, max_duration=10.0, threshold_db=None, limit=20,
+                  max_end=None):
+    """
+    Rangsorolt jelölt szegmensek a frame jellemzőkből.
+    - max_end: sec, ennél később nem végződhet szegmens (a validate_segment által ellenőrzött hossz)
+    """
+    import numpy as np
+
+    if max_end is not None:
+        usable = max(0, int(max_end / frame_seconds))
+        energy_db, onset = energy_db[:usable], onset[:usable]
+    if len(energy_db) == 0:
+        return [], threshold_db
+    if threshold_db is None:
+        # Adaptív küszöb: a zajpadló (alsó 15%) felett 10 dB-lel, de nem a digitális csendben
+        threshold_db = max(float(np.percentile(energy_db, 15)) + 10.0, -70.0)
+    active = energy_db > threshold_db
+    # Rövid szünetek áthidalása: a MIN_SILENCE-nél rövidebb csend szakaszok aktívvá válnak
+    gap_frames = max(1, int(round(MIN_SILENCE / frame_seconds)))
+    for start, end in _runs(~active):
+        if end - start < gap_frames and start > 0 and end < len(active):
+            active[start:end] = True
+
+    min_frames = max(1, int(round(min_duration / frame_seconds)))
+    max_frames = max(min_frames, int(round(max_duration / frame_seconds)))
+    pad_frames = int(round(PAD / frame_seconds))
+    onset_frames = max(1, int(round(ONSET_WINDOW / frame_seconds)))
+    onset_scale = float(np.percentile(onset, 99)) or 1.0
+    candidates = []
+    for run_start, run_end in _runs(active):
+        for start, end in _split_long(run_start, run_end, energy_db, max_frames, min_frames):
+            if end - start < min_frames:
+                continue
+            loudness = float(np.mean(energy_db[start:end])) - threshold_db
+            strength = float(np.max(onset[max(0, start - 1):start + onset_frames])) / onset_scale
+            # Ráhagyás csak a csend felé (a darabolt szakaszok belső vágásainál nem)
+            first = max(0, start - pad_frames) if start == run_start else start
+            last = min(len(energy_db), end + pad_frames) if end == run_end else end
+            candidates.append({
+                "start": round(float(first * frame_seconds), 3),
+                "end": round(float(last * frame_seconds), 3),
+                "peak_db": round(float(np.max(energy_db[start:end])), 1),
+                "loudness_db": round(loudness, 1),
+                "onset": round(min(strength, 1.0), 3),
+                # Éles indítás + a háttérből kiemelkedő hangosság (30 dB felett telítődik)
+                "score": round(0.6 * min(strength, 1.0) + 0.4 * min(loudness / 30.0, 1.0), 4),
+            })
+    candidates.sort(key=lambda c: -c["score"])
+    for candidate in candidates:
+        candidate["duration"] = round(candidate["end"] - candidate["start"], 3)
+    return candidates[:limit], threshold_db
+
+
+def validate_segment_params(limit, min_duration, max_duration):
+    """A kérés paraméterei - még a letöltés előtt ellenőrizhető (ValueError)"""
+    if not 1 <= limit <= MAX_SEGMENTS:
+        raise ValueError(f"limit: 1 és {MAX_SEGMENTS} között kell lennie")
+    if not 0 < min_duration <= max_duration:
+        raise ValueError("min_duration: 0-nál nagyobb és legfeljebb max_duration")
+
+
+def analyze_segments(source, limit=20, min_duration=0.3, max_duration=10.0, threshold_db=None):
+    """
+    DECODE + elemzés egy letöltött forrásból (CPU munka: a scheduler encode poolján fut).
+    A PCM a pcm_store cache-én át dekódolódik, az elemzés chunkonként olvassa a memmap-et.
+    """
+    validate_segment_params(limit, min_duration, max_duration)
+    frame_len = pcm_store.SAMPLE_RATE * FRAME_MS // 1000
+    frame_seconds = frame_len / pcm_store.SAMPLE_RATE
+    chunk_frames = max(1, CHUNK_SECONDS * pcm_store.SAMPLE_RATE // frame_len)
+    with pcm_store.open_pcm(source.info, source.path) as (pcm, _):
+        logger.info(f"🔎 Segment analysis: {len(pcm)} frames", extra={"frames": len(pcm)})
+        energy_db, onset = frame_features(pcm, frame_len, chunk_frames)
+        duration = len(pcm) / pcm_store.SAMPLE_RATE
+    # A dekódolt PCM hossza kicsit túlnyúlhat a (kerekített) info['duration']-ön, amit a
+    # /batch validate_segment-je ellenőriz: a jelöltek azon belül maradnak
+    max_end = min(duration, source.info.get('duration') or duration)
+    segments, threshold = find_segments(
+        energy_db, onset, frame_seconds, min_duration, max_duration, threshold_db, limit, max_end
+    )
+    return {
+        "title": source.info.get('title'),
+        "duration": round(duration, 3),
+        "threshold_db": round(threshold, 1) if threshold is not None else None,
+        "segments": segments,
+    }
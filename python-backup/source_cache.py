@@ -0,0 +1,181 @@
+# --- SOURCE AUDIO CACHE ---
+# Letöltött forrás audio fájlok lemez cache-e (video ID + format ID kulcs),
+# hogy ugyanabból a videóból vágott újabb klipek kihagyhassák a DOWNLOAD lépést.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+DEFAULT_CACHE_DIR = os.path.join(os.getenv("TMPDIR", "/tmp"), "yt-source-cache")
+DEFAULT_MAX_BYTES = 2 * 1024 * 1024 * 1024  # 2 GB
+
+
+class _Entry:
+    __slots__ = ("path", "size", "pins")
+
+    def __init__(self, path, size):
+        self.path = path
+        self.size = size
+        self.pins = 0
+
+
+class SourceCache:
+    """
+    LRU byte-budget cache of downloaded source audio files.
+    - one download per key at a time (per-key lock), other jobs wait and hit
+    - entries in use by a job are pinned and never evicted under it
+    """
+
+    def __init__(self, root=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.root = root
+        self.staging_dir = os.path.join(root, ".staging")
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()  # key: _Entry (oldest first)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._key_locks = {}  # key: [lock, users] - csak amíg valaki tölt / vár
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        os.makedirs(self.staging_dir, exist_ok=True)
+        self._load_existing()
+
+    @staticmethod
+    def make_key(video_id, format_id):
+        safe = lambda s: "".join(c if c.isalnum() or c in "-_" else "_" for c in str(s))
+        return f"{safe(video_id)}-{safe(format_id)}"
+
+    def _load_existing(self):
+        # Újraindítás után a már letöltött fájlokat visszavesszük (mtime = recency)
+        found = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isfile(path):
+                continue
+            key = os.path.splitext(name)[0]
+            st = os.stat(path)
+            found.append((st.st_mtime, key, path, st.st_size))
+        for _, key, path, size in sorted(found):
+            self._entries[key] = _Entry(path, size)
+            self._bytes += size
+        with self._lock:
+            self._evict_locked()
+
+    @contextmanager
+    def _key_lock(self, key):
+        # [lock, users]: az utolsó várakozó / tulajdonos kiveszi - a dict nem nő korlátlanul
+        with self._lock:
+            slot = self._key_locks.get(key)
+            if slot is None:
+                slot = self._key_locks[key] = [threading.Lock(), 0]
+            slot[1] += 1
+        try:
+            with slot[0]:
+                yield
+        finally:
+            with self._lock:
+                slot[1] -= 1
+                if slot[1] == 0:
+                    del self._key_locks[key]
+
+    def _evict_locked(self):
+        for key in list(self._entries):
+            if self._bytes <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.pins > 0:
+                continue
+            del self._entries[key]
+            self._bytes -= entry.size
+            self.evictions += 1
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def _pin(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not os.path.exists(entry.path):
+                if entry is not None:
+                    del self._entries[key]
+                    self._bytes -= entry.size
+                return None
+            entry.pins += 1
+            self._entries.move_to_end(key)
+            return entry
+
+    def _unpin(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                entry.pins -= 1
+                self._evict_locked()
+
+    def lookup(self, video_id, format_id):
+        """Cache-elt fájl útvonala (vagy None) - nem pinel, csak gyors ellenőrzésre."""
+        key = self.make_key(video_id, format_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            return entry.path if entry is not None else None
+
+    @contextmanager
+    def acquire(self, video_id, format_id, fetch):
+        """
+        Pinned cache entry for (video_id, format_id).
+        - fetch(): a hiányzó forrás letöltése, a letöltött fájl útvonalát adja vissza
+        - yields (path, hit)
+        """
+        key = self.make_key(video_id, format_id)
+        entry = self._pin(key)
+        hit = entry is not None
+        if entry is None:
+            with self._key_lock(key):
+                # Amíg vártunk, egy másik job letölthette
+                entry = self._pin(key)
+                hit = entry is not None
+                if entry is None:
+                    downloaded = fetch()
+                    ext = os.path.splitext(downloaded)[1]
+                    final_path = os.path.join(self.root, key + ext)
+                    os.replace(downloaded, final_path)
+                    size = os.path.getsize(final_path)
+                    with self._lock:
+                        entry = self._entries[key] = _Entry(final_path, size)
+                        entry.pins = 1
+                        self._bytes += size
+                        self._evict_locked()
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        try:
+            os.utime(entry.path, (time.time(), time.time()))
+        except OSError:
+            pass
+        try:
+            yield entry.path, hit
+        finally:
+            self._unpin(key)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+source_cache = SourceCache(
+    root=os.getenv("SOURCE_CACHE_DIR", DEFAULT_CACHE_DIR),
+    max_bytes=int(os.getenv("SOURCE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)),
+)
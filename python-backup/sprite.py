@@ -0,0 +1,90 @@
+# --- AUDIO SPRITE ---
+# Egy teljes soundboard egyetlen kódolt fájlban + offset index (SoundboardGrid /
+# useAudioStorage: egy letöltés és egy decoder klipenkénti fájlok helyett).
+# - a klipek egyetlen ffmpeg futásban fűződnek össze (concat filter), gap mp csenddel
+# - minden klip pontosan a probe-olt hosszára vágva / kiegészítve kerül a helyére
+#   (atrim + apad), így az index offsetjei minta pontosak a sprite-on belül
+# - a sprite kulcsa a klipek tartalom hash-eiből (ETag), a formátumból és a gap-ből
+#   képzett hash: csak akkor épül újra, ha a board változik (a registry output cache-én át)
+
+import hashlib
+import json
+import os
+import subprocess
+
+import ffmpeg
+
+import cancellation
+from tube_audio_extractor import OUTPUT_FORMATS, _run_ffmpeg
+
+SPRITE_MAX_CLIPS = int(os.getenv("SPRITE_MAX_CLIPS", 200))
+SPRITE_TIMEOUT = float(os.getenv("SPRITE_TIMEOUT", 600))  # sec: ennyit várunk egy másik kérés épülő sprite-jára
+SPRITE_SAMPLE_RATE = 48000
+
+
+def sprite_key(etags, output_format, gap):
+    """Tartalom alapú kulcs: ugyanaz a klip készlet (sorrenddel) -> ugyanaz a sprite"""
+    digest = hashlib.sha256(json.dumps([list(etags), output_format, gap]).encode()).hexdigest()[:32]
+    return f"sprite:{digest}"
+
+
+def probe_duration(path):
+    """A klip hossza (sec, ms pontossággal) ffprobe-bal"""
+    process = subprocess.Popen(
+        ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "csv=p=0", path],
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+    )
+    with cancellation.track(process):
+        stdout, stderr = process.communicate()
+    if process.returncode != 0:
+        cancellation.check()
+        raise RuntimeError(f"ffprobe error: {stderr.decode(errors='ignore')}")
+    try:
+        return round(float(stdout.decode().strip()), 3)
+    except ValueError:
+        raise RuntimeError(f"Could not determine clip duration: {path}")
+
+
+def build_sprite(paths, output_path, output_format, gap, progress=None):
+    """
+    A klipek összefűzése egy ffmpeg futásban. Visszaad: [(offset, duration)] klipenként.
+    A klipek közé gap sec csend kerül (az utolsó után nem).
+    """
+    cancellation.check()
+    muxer, encoder, _ = OUTPUT_FORMATS[output_format]
+    durations = [probe_duration(path) for path in paths]
+    streams, offsets, offset = [], [], 0.0
+    for n, (path, duration) in enumerate(zip(paths, durations)):
+        slot = duration + (gap if n < len(paths) - 1 else 0)
+        streams.append(
+            ffmpeg.input(path).audio
+            .filter('aresample', SPRITE_SAMPLE_RATE)
+            .filter('aformat', sample_fmts='fltp', channel_layouts='stereo')
+            .filter('atrim', duration=duration)
+            .filter('asetpts', 'N/SR/TB')
+            .filter('apad', whole_dur=slot)
+        )
+        offsets.append(round(offset, 3))
+        offset += slot
+    joined = ffmpeg.concat(*streams, v=0, a=1)
+    on_time = (lambda t: progress.encode_time(t, offset)) if progress is not None else None
+    _run_ffmpeg(ffmpeg.output(joined, output_path, format=muxer, acodec=encoder), on_time=on_time, stage="SPRITE")
+    return list(zip(offsets, durations))
+
+
+def sprite_index(file_ids, files, layout, output_format, gap):
+    """A kliensnek szóló index: klipenként offset / duration (sec) + a klip metaadatai"""
+    clips = []
+    for file_id, file, (offset, duration) in zip(file_ids, files, layout):
+        metadata = file.metadata or {}
+        clips.append({
+            "file_id": file_id,
+            "offset": offset,
+            "duration": duration,
+            "title": metadata.get("video_title"),
+            "youtube_url": metadata.get("youtube_url"),
+            "start_time": metadata.get("start_time"),
+            "end_time": metadata.get("end_time"),
+        })
+    end = layout[-1][0] + layout[-1][1] if layout else 0.0
+    return {"format": output_format, "gap": gap, "duration": round(end, 3), "clips": clips}
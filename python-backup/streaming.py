@@ -0,0 +1,83 @@
+# --- SUBPROCESS STREAMING ---
+# ffmpeg stdout közvetlen továbbítása HTTP válaszba (StreamingResponse), köztes output
+# fájl nélkül. A blokkoló olvasás egy executor szálon fut (pl. a scheduler encode poolja,
+# így beleszámít az ffmpeg párhuzamossági limitbe), a chunkok egy korlátos queue-n át
+# jutnak az event loopra. Opcionálisan a bájtok egy fájlba is "tee"-zódnak.
+
+import asyncio
+import contextvars
+import subprocess
+import threading
+
+from app_logging import get_logger
+
+logger = get_logger("streaming")
+
+CHUNK_SIZE = 64 * 1024
+
+
+async def stream_command(args, executor, tee_path=None, on_finish=None, chunk_size=CHUNK_SIZE, max_buffered=16):
+    """
+    Async generator: a parancs stdout-ja chunkonként.
+    - tee_path: ide is kiírjuk a teljes kimenetet
+    - on_finish(returncode, stderr): a folyamat végén hívódik (executor szálon),
+      megszakított stream esetén returncode None
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue()
+    slots = threading.Semaphore(max_buffered)  # backpressure: lassú kliens -> ffmpeg vár
+    cancelled = threading.Event()
+    process_ref = []
+
+    def pump():
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        process_ref.append(process)
+        stderr_chunks = []
+        stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+        stderr_reader.start()
+        tee = open(tee_path, "wb") if tee_path else None
+        try:
+            while not cancelled.is_set():
+                chunk = process.stdout.read(chunk_size)
+                if not chunk:
+                    break
+                if tee is not None:
+                    tee.write(chunk)
+                while not slots.acquire(timeout=0.5):
+                    if cancelled.is_set():
+                        break
+                loop.call_soon_threadsafe(queue.put_nowait, chunk)
+        finally:
+            if tee is not None:
+                tee.close()
+            if cancelled.is_set():
+                process.kill()
+            process.wait()
+            stderr_reader.join()
+            # on_finish a stream vége előtt fut, hogy a kliens utána már lássa az eredményt
+            try:
+                if on_finish is not None:
+                    returncode = None if cancelled.is_set() else process.returncode
+                    on_finish(returncode, b"".join(stderr_chunks))
+            except Exception as e:
+                logger.exception(f"❌ Stream finish callback failed: {e}")
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, None)
+
+    future = loop.run_in_executor(executor, contextvars.copy_context().run, pump)
+    completed = False
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                completed = True
+                break
+            slots.release()
+            yield chunk
+    finally:
+        # Kliens bontott vagy hiba: az ffmpeg-et leállítjuk
+        if not completed:
+            cancelled.set()
+            if process_ref:
+                process_ref[0].kill()
+        await asyncio.shield(future)
@@ -0,0 +1,111 @@
+# --- TEST CONFIG ---
+# A modulok laposan a python-backup/ alatt vannak: a tesztek onnan importálnak.
+# Közös fixture: helyi HTTP szerver (Range támogatással, átvitt byte számlálással)
+# a range fetch és a thumbnail resolver tesztekhez.
+# Futtatás: cd python-backup && python -m pytest tests
+
+import os
+import shutil
+import socket
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which("ffmpeg") is None, reason="ffmpeg binary not on PATH")
+
+
+class StubServer:
+    """
+    routes: path -> (status, body bytes, content type). Minden kérés a requests listába
+    kerül (method, path, Range header), a válasz body byte-jai a sent_bytes-ba.
+    """
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self.sent_bytes = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._httpd.server_address[1]}"
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                # Kis, fix küldő buffer: a kliens által el nem olvasott byte-ok ne
+                # számítsanak átvittnek (a kernel autotuning több MB-ot is pufferelne)
+                self.request.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, 64 * 1024)
+                super().setup()
+
+            def log_message(self, *args):
+                pass
+
+            def _respond(self, send_body):
+                with server._lock:
+                    server.requests.append((self.command, self.path, self.headers.get("Range")))
+                route = server.routes.get(self.path.split("?")[0])
+                if route is None:
+                    route = (404, b"", "text/plain")
+                status, body, content_type = route
+                start, end = 0, len(body) - 1
+                range_header = self.headers.get("Range")
+                if status == 200 and range_header and range_header.startswith("bytes="):
+                    first, _, last = range_header[6:].partition("-")
+                    start = int(first) if first else max(len(body) - int(last), 0)
+                    end = min(int(last), len(body) - 1) if first and last else len(body) - 1
+                    if start >= len(body):
+                        self.send_response(416)
+                        self.send_header("Content-Range", f"bytes */{len(body)}")
+                        self.send_header("Content-Length", "0")
+                        self.end_headers()
+                        return
+                    self.send_response(206)
+                    self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+                else:
+                    self.send_response(status)
+                self.send_header("Accept-Ranges", "bytes")
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(end - start + 1))
+                self.end_headers()
+                if not send_body:
+                    return
+                view = memoryview(body)[start:end + 1]
+                try:
+                    for offset in range(0, len(view), 64 * 1024):
+                        chunk = view[offset:offset + 64 * 1024]
+                        self.wfile.write(chunk)
+                        with server._lock:
+                            server.sent_bytes += len(chunk)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # a kliens (ffmpeg) a kellő byte-ok után bontja a kapcsolatot
+
+            def do_GET(self):
+                self._respond(True)
+
+            def do_HEAD(self):
+                self._respond(False)
+
+        return Handler
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+
+@pytest.fixture
+def http_server():
+    server = StubServer().start()
+    yield server
+    server.stop()
@@ -0,0 +1,57 @@
+# Queued JSON logging (app_logging.py): a queue-n átment rekordokban is megmarad a
+# traceback ("exc"), és a job ID a hívó kontextusából kerül a sorba.
+
+import io
+import json
+import logging
+import logging.handlers
+import queue
+
+from app_logging import ContextFilter, DroppingQueueHandler, JsonFormatter, TextFormatter, set_job_ids
+
+
+def _emit(formatter, log):
+    stream = io.StringIO()
+    writer = logging.StreamHandler(stream)
+    writer.setFormatter(formatter)
+    handler = DroppingQueueHandler(queue.Queue(100))
+    handler.addFilter(ContextFilter())
+    listener = logging.handlers.QueueListener(handler.queue, writer)
+    test_logger = logging.getLogger("tube.test-queue")
+    test_logger.addHandler(handler)
+    test_logger.propagate = False
+    test_logger.setLevel(logging.INFO)
+    listener.start()
+    try:
+        log(test_logger)
+    finally:
+        listener.stop()
+        test_logger.removeHandler(handler)
+    return stream.getvalue()
+
+
+def _fail(log):
+    try:
+        raise RuntimeError("boom")
+    except RuntimeError:
+        log.exception("❌ Job %s failed", "job-1")
+
+
+def test_json_keeps_traceback_through_queue():
+    set_job_ids(["job-1"])
+    entry = json.loads(_emit(JsonFormatter(), _fail))
+    assert entry["msg"] == "❌ Job job-1 failed"
+    assert entry["job_id"] == "job-1"
+    assert "RuntimeError: boom" in entry["exc"]
+    assert "Traceback" not in entry["msg"]
+
+
+def test_text_keeps_traceback_through_queue():
+    output = _emit(TextFormatter(), _fail)
+    assert "❌ Job job-1 failed" in output
+    assert "RuntimeError: boom" in output
+
+
+def test_extra_fields_survive_prepare():
+    entry = json.loads(_emit(JsonFormatter(), lambda log: log.info("done", extra={"frames": 42})))
+    assert entry["frames"] == 42 and "exc" not in entry
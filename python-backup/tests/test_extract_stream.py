@@ -0,0 +1,86 @@
+# /extract/stream törzs (main._stream_body) életciklusa: a source pin, a temp könyvtár és
+# az FFMPEG_RUNNING gauge minden kimenetnél felszabadul - végig olvasott, félbehagyott és
+# soha nem iterált válasznál is. A forrás és az ffmpeg parancs helyett helyi stub fut.
+
+import asyncio
+import gc
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import main  # noqa: E402
+from metrics import FFMPEG_RUNNING  # noqa: E402
+from registry import TERMINAL_STATUSES  # noqa: E402
+
+
+class FakeSource:
+    info = {"title": "stub", "duration": 100}
+
+    def __init__(self):
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def stream_env(monkeypatch):
+    sources = []
+
+    def prepare(*args, **kwargs):
+        sources.append(FakeSource())
+        return sources[-1]
+
+    monkeypatch.setattr(main, "prepare_source", prepare)
+    monkeypatch.setattr(main, "segment_stream_command", lambda *a, **k: ["head", "-c", "3000000", "/dev/zero"])
+    return sources
+
+
+def _running():
+    return sum(shard.get(("STREAM",), 0) for shard in FFMPEG_RUNNING._shards)
+
+
+def _body(job_id):
+    req = main.ExtractionRequest(youtube_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ", start_time=1, end_time=2)
+    main.registry.create_job(job_id, status="running")
+    return main._stream_body(job_id, f"file-{job_id}", req)
+
+
+def test_full_stream_registers_output(stream_env):
+    async def run():
+        body = _body("stream-full")
+        assert await body.__anext__() == "mp3"
+        return sum([len(chunk) async for chunk in body])
+
+    assert asyncio.run(run()) == 3_000_000
+    assert stream_env[-1].closed
+    assert main.registry.get_job("stream-full").status == "done"
+    assert _running() == 0
+
+
+def test_abandoned_stream_releases_resources(stream_env):
+    async def run():
+        body = _body("stream-partial")
+        await body.__anext__()
+        await body.__anext__()  # egy chunk, majd a kliens bont
+        await body.aclose()
+
+    asyncio.run(run())
+    assert stream_env[-1].closed
+    assert main.registry.get_job("stream-partial").status == "error"
+    assert _running() == 0
+
+
+def test_never_iterated_stream_releases_resources(stream_env):
+    async def run():
+        body = _body("stream-unread")
+        await body.__anext__()  # a handler idáig jut, a válasz törzse sosem iterálódik
+        del body
+        gc.collect()
+        await asyncio.sleep(0.1)  # az asyncgen finalizer aclose()-a az event loopon fut
+
+    asyncio.run(run())
+    assert stream_env[-1].closed
+    assert main.registry.get_job("stream-unread").status in TERMINAL_STATUSES
+    assert _running() == 0
@@ -0,0 +1,36 @@
+# Stage metrikák (metrics.py / ProgressReporter): egy hibás lépés pontosan egyszer számít a
+# tube_stage_errors_total-ba, és pontosan egy "error" esemény megy a progress stream-re.
+
+import pytest
+
+from metrics import STAGE_ERRORS
+from tube_audio_extractor import ProgressReporter, validate_segment
+
+INFO = {"duration": 60, "title": "fixture"}
+
+
+def _errors(stage):
+    line = f'tube_stage_errors_total{{stage="{stage}"}} '
+    values = [float(sample[len(line):]) for sample in STAGE_ERRORS.render() if sample.startswith(line)]
+    return values[0] if values else 0.0
+
+
+@pytest.mark.parametrize("start, end", [(10, 5), (70, 80), (10, 61), ("x", 5)])
+def test_timestamp_failure_is_reported_once(start, end):
+    events = []
+    before = _errors("TIMESTAMP")
+    with pytest.raises(ValueError, match="Timestamp error"):
+        validate_segment(INFO, start, end, "mp3", ProgressReporter(events.append))
+    assert _errors("TIMESTAMP") == before + 1
+    errors = [event for event in events if event["type"] == "error"]
+    assert len(errors) == 1 and errors[0]["stage"] == "TIMESTAMP"
+    assert not errors[0]["error"].startswith("Timestamp error")
+
+
+def test_format_failure_is_reported_once():
+    events = []
+    before = _errors("FORMAT")
+    with pytest.raises(ValueError):
+        validate_segment(INFO, 1, 2, "xyz", ProgressReporter(events.append))
+    assert _errors("FORMAT") == before + 1
+    assert [event["stage"] for event in events if event["type"] == "error"] == ["FORMAT"]
@@ -0,0 +1,62 @@
+# Közös backendnél (sqlite BEGIN IMMEDIATE, redis lock) a registry / sor hívások blokkolhatnak:
+# az async handlerek ezeket worker szálon futtatják, az event loop közben tovább szolgál ki.
+
+import asyncio
+import time
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import main  # noqa: E402
+from scheduler import JobScheduler  # noqa: E402
+
+DELAY = 0.3
+
+
+@pytest.fixture
+def slow_backend(monkeypatch):
+    """Minden registry / sor művelet DELAY-ig tart (mintha egy másik node tartaná a lockot)"""
+    scheduler = JobScheduler(download_workers=1, encode_workers=1)
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    for target, names in ((main.registry, ("claim_output", "get_job", "update_job", "create_job")),
+                          (scheduler.queue, ("depth", "push_many"))):
+        for name in names:
+            original = getattr(target, name)
+
+            def slow(*args, _original=original, **kwargs):
+                time.sleep(DELAY)
+                return _original(*args, **kwargs)
+
+            monkeypatch.setattr(target, name, slow)
+
+
+async def _ticks_during(coro):
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    try:
+        result = await coro
+    finally:
+        task.cancel()
+    return result, ticks
+
+
+def test_extract_and_cancel_do_not_block_the_loop(slow_backend):
+    async def run():
+        req = main.ExtractionRequest(youtube_url="https://www.youtube.com/watch?v=nonblock001", start_time=1, end_time=2)
+        response, extract_ticks = await _ticks_during(main.extract_audio(req))
+        cancelled, cancel_ticks = await _ticks_during(main.cancel_job(response["job_id"]))
+        await main.scheduler.shutdown()
+        return response, extract_ticks, cancelled, cancel_ticks
+
+    response, extract_ticks, cancelled, cancel_ticks = asyncio.run(run())
+    assert response["status"] == "queued" and cancelled["status"] == "cancelled"
+    # Blokkoló hívásoknál a ticker a handler végéig egyszer sem futna
+    assert extract_ticks >= 20 and cancel_ticks >= 20
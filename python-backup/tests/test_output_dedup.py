@@ -0,0 +1,36 @@
+# Output dedup kulcs (main._output_key): az azonos kérések különböző írásmódjai egy kulcsra,
+# a csak ezredmásodpercben eltérők (hosszú videón is) külön kulcsra és külön jobra jutnak.
+
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+import main  # noqa: E402
+
+
+def _req(start, end, video_id="dQw4w9WgXcQ"):
+    return main.ExtractionRequest(youtube_url=f"https://www.youtube.com/watch?v={video_id}",
+                                  start_time=start, end_time=end)
+
+
+def test_same_clip_spelled_differently_shares_key():
+    assert main._output_key(_req("0:10", "0:12.5")) == main._output_key(_req(10, 12.5))
+
+
+@pytest.mark.parametrize("first, second", [
+    ((1234.567, 1240), (1234.571, 1240)),
+    ((1, "20:34.567"), (1, "20:34.568")),
+    ((1_000_000, 1_000_010), (1_000_001, 1_000_010)),
+])
+def test_millisecond_differences_get_their_own_key(first, second):
+    assert main._output_key(_req(*first)) != main._output_key(_req(*second))
+
+
+def test_millisecond_differences_do_not_attach():
+    video_id = uuid.uuid4().hex[:11]
+    first_job, first = main._claim_job(_req(1234.567, 1240, video_id))
+    second_job, second = main._claim_job(_req(1234.571, 1240, video_id))
+    assert (first, second) == ("new", "new")
+    assert first_job != second_job
@@ -0,0 +1,186 @@
+# Playlist pipeline (main.run_pipeline) stubolt yt-dlp-vel, ami lokális fixture fájlt "tölt le":
+# a letöltések playlist sorrendben, előre futnak, az encode átfedésben dolgozik velük, és
+# minden job a saját eredményét kapja - egy videó lejárt határideje vagy visszavonása a
+# többit nem érinti.
+
+import asyncio
+import subprocess
+import sys
+import threading
+import time
+import types
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("validators")
+
+import main  # noqa: E402
+import tube_audio_extractor  # noqa: E402
+from conftest import requires_ffmpeg  # noqa: E402
+from scheduler import JobScheduler  # noqa: E402
+from ydl_pool import YoutubeDLPool, YDL_OPTS  # noqa: E402
+
+DURATION = 8
+
+
+class StubYoutubeDL:
+    """A YoutubeDL felület általunk használt része: minden videó ugyanaz a fixture fájl"""
+
+    fixture = None
+    delays = {}  # video_id: a szimulált letöltés ideje (sec)
+    events = []  # (kind, video_id, start, end)
+    lock = threading.Lock()
+
+    def __init__(self, opts=None):
+        self.opts = opts or {}
+
+    def extract_info(self, url, download=False):
+        video_id = tube_audio_extractor.extract_video_id(url)
+        return {"id": video_id, "format_id": "stub", "title": f"stub {video_id}", "duration": DURATION,
+                "acodec": "opus", "ext": "webm", "url": self.fixture, "protocol": "file"}
+
+    def prepare_filename(self, info):
+        return self.opts["outtmpl"] % info
+
+    def process_ie_result(self, info, download=True):
+        started = time.monotonic()
+        deadline = started + self.delays.get(info["id"], 0.3)
+        hooks = self.opts.get("progress_hooks", [])
+        while time.monotonic() < deadline:
+            for hook in hooks:  # a hook dobja a JobCancelled-t (cancel / lejárt határidő)
+                hook({"status": "downloading", "downloaded_bytes": 0, "total_bytes": 1})
+            time.sleep(0.02)
+        path = self.prepare_filename(info)
+        with open(self.fixture, "rb") as src, open(path, "wb") as dst:
+            dst.write(src.read())
+        with self.lock:
+            self.events.append(("download", info["id"], started, time.monotonic()))
+        return {**info, "requested_downloads": [{"filepath": path}]}
+
+
+@pytest.fixture
+def pipeline(monkeypatch, tmp_path):
+    fixture = tmp_path / "fixture.webm"
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"sine=frequency=440:sample_rate=48000:duration={DURATION}",
+         "-ac", "2", "-c:a", "libopus", str(fixture)],
+        check=True,
+    )
+    StubYoutubeDL.fixture = str(fixture)
+    StubYoutubeDL.delays = {}
+    StubYoutubeDL.events = []
+    monkeypatch.setitem(sys.modules, "yt_dlp", types.SimpleNamespace(YoutubeDL=StubYoutubeDL))
+    monkeypatch.setattr(tube_audio_extractor, "ydl_pool", YoutubeDLPool(YDL_OPTS, max_size=4))
+    monkeypatch.setattr(main, "scheduler", JobScheduler(download_workers=2, encode_workers=1,
+                                                        stage_timeouts={"DOWNLOAD": 1.5}))
+    monkeypatch.setattr(main, "PIPELINE_DOWNLOADS", 2)
+    monkeypatch.setattr(main, "PIPELINE_PREFETCH", 2)
+
+    cut_segments = main.cut_segments
+
+    def recording_cut(source, *args, **kwargs):
+        started = time.monotonic()
+        try:
+            return cut_segments(source, *args, **kwargs)
+        finally:
+            with StubYoutubeDL.lock:
+                StubYoutubeDL.events.append(("encode", source.info["id"], started, time.monotonic()))
+
+    monkeypatch.setattr(main, "cut_segments", recording_cut)
+    return StubYoutubeDL
+
+
+def _playlist(videos):
+    """videos: [[(start, end), ...], ...] -> (groups, video_ids)"""
+    groups, video_ids = [], []
+    for segments in videos:
+        video_id = uuid.uuid4().hex[:11]  # friss ID: se source cache, se dedup találat
+        reqs = [main.ExtractionRequest(youtube_url=f"https://www.youtube.com/watch?v={video_id}",
+                                       start_time=start, end_time=end) for start, end in segments]
+        job_ids = [str(uuid.uuid4()) for _ in reqs]
+        for job_id in job_ids:
+            main.registry.create_job(job_id)
+        groups.append((job_ids, reqs))
+        video_ids.append(video_id)
+    return groups, video_ids
+
+
+def _events(stub, kind):
+    return {video_id: (start, end) for k, video_id, start, end in stub.events if k == kind}
+
+
+def _status(job_id):
+    return main.registry.get_job(job_id)
+
+
+@requires_ffmpeg
+def test_downloads_run_ahead_of_encodes(pipeline):
+    groups, video_ids = _playlist([[(1, 2), (3, 4)], [(1, 2)], [(2, 30)], [(5, 6)]])
+
+    asyncio.run(main.run_pipeline(groups))
+
+    downloads, encodes = _events(pipeline, "download"), _events(pipeline, "encode")
+    # Playlist sorrendben indulnak, PIPELINE_DOWNLOADS párhuzamosan
+    starts = sorted(video_ids, key=lambda video_id: downloads[video_id][0])
+    assert starts[:2] == sorted(video_ids[:2], key=lambda video_id: downloads[video_id][0])
+    assert set(starts[2:]) == set(video_ids[2:])
+    assert all(encodes[video_id][0] >= downloads[video_id][1] for video_id in video_ids)
+    # Átfedés: az első encode még a későbbi videók letöltése közben fut
+    first_encode = min(encodes.values())
+    assert any(start < first_encode[1] and end > first_encode[0]
+               for video_id, (start, end) in downloads.items() if video_id not in video_ids[:2])
+
+    statuses = [[_status(job_id).status for job_id in job_ids] for job_ids, _ in groups]
+    assert statuses == [["done", "done"], ["done"], ["error"], ["done"]]
+    assert "beyond video length" in _status(groups[2][0][0]).error
+    file_ids = {_status(job_id).file_id for job_ids, _ in groups for job_id in job_ids} - {None}
+    assert len(file_ids) == 4
+    assert all(main.registry.get_file(file_id) is not None for file_id in file_ids)
+
+
+@requires_ffmpeg
+def test_timed_out_download_fails_only_its_video(pipeline):
+    groups, video_ids = _playlist([[(1, 2)], [(1, 2), (3, 4)], [(1, 2)]])
+    pipeline.delays[video_ids[1]] = 30
+
+    started = time.monotonic()
+    asyncio.run(main.run_pipeline(groups))
+
+    assert time.monotonic() - started < 10
+    assert [_status(job_id).status for job_id in groups[0][0] + groups[2][0]] == ["done", "done"]
+    assert all("timed out" in _status(job_id).error for job_id in groups[1][0])
+    assert video_ids[1] not in _events(pipeline, "encode")
+
+
+@requires_ffmpeg
+def test_cancelled_jobs_are_skipped_and_keep_their_status(pipeline):
+    main.scheduler.stage_timeouts = {}  # a leállást a visszavonás okozza, nem a határidő
+    groups, video_ids = _playlist([[(1, 2), (3, 4)], [(1, 2)], [(1, 2)], [(1, 2), (3, 4)], [(1, 2)]])
+    for video_id in video_ids[1:3]:
+        pipeline.delays[video_id] = 0.6
+    pipeline.delays[video_ids[4]] = 30
+    # Sorban várakozás közben visszavont jobok
+    main.registry.update_job(groups[0][0][1], status="cancelled")
+    main.registry.update_job(groups[2][0][0], status="cancelled")
+
+    async def run():
+        pipeline_task = asyncio.create_task(main.run_pipeline(groups))
+        await asyncio.sleep(0.2)
+        await main.cancel_job(groups[3][0][1])  # a videó még nem indult: a másik jobja fut tovább
+        await asyncio.sleep(1.5)
+        await main.cancel_job(groups[4][0][0])  # a videó letöltése közben
+        await pipeline_task
+
+    started = time.monotonic()
+    asyncio.run(run())
+
+    assert time.monotonic() - started < 10
+    assert [_status(job_id).status for job_id in (groups[0][0][0], groups[1][0][0], groups[3][0][0])] == [
+        "done", "done", "done"]
+    cancelled = (groups[0][0][1], groups[2][0][0], groups[3][0][1], groups[4][0][0])
+    assert [_status(job_id).status for job_id in cancelled] == ["cancelled"] * 4
+    assert all(_status(job_id).file_id is None for job_id in cancelled)
+    assert video_ids[2] not in _events(pipeline, "download")
+    assert video_ids[4] not in _events(pipeline, "encode")
@@ -0,0 +1,61 @@
+# Range fetch (tube_audio_extractor._range_fetch): egy helyi HTTP szerverről kiszolgált
+# forrásból csak a klip körüli tartomány jöhet le, nem a teljes fájl.
+
+import os
+import subprocess
+
+import pytest
+
+from conftest import requires_ffmpeg
+from tube_audio_extractor import ProgressReporter, _range_fetch, _range_fetch_window
+
+DURATION = 600  # sec
+
+
+@pytest.fixture(scope="module")
+def source_bytes(tmp_path_factory):
+    """10 perc zaj webm/opus-ban (~10 MB, mint egy valódi YouTube audio stream)"""
+    path = tmp_path_factory.mktemp("source") / "source.webm"
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", f"anoisesrc=d={DURATION}:a=0.3",
+         "-c:a", "libopus", "-b:a", "128k", str(path)],
+        check=True,
+    )
+    return path.read_bytes()
+
+
+def _info(url):
+    return {"url": url, "ext": "webm", "protocol": "https", "duration": DURATION}
+
+
+def test_window_only_for_short_clips():
+    info = _info("http://example.invalid/source.webm")
+    assert _range_fetch_window(info, 300, 305) == (298, 307)
+    assert _range_fetch_window(info, 0, DURATION) is None  # a teljes letöltés cache-elhető
+    assert _range_fetch_window({**info, "protocol": "m3u8_native"}, 300, 305) is None
+    assert _range_fetch_window({**info, "ext": "mkv"}, 300, 305) is None
+
+
+@requires_ffmpeg
+def test_fetch_transfers_only_the_window(http_server, source_bytes, tmp_path):
+    http_server.routes["/source.webm"] = (200, source_bytes, "audio/webm")
+    info = _info(f"{http_server.url}/source.webm")
+    window = _range_fetch_window(info, 300, 305)
+
+    result = _range_fetch(info, window, str(tmp_path), ProgressReporter())
+
+    assert result is not None
+    partial_path, offset = result
+    assert offset == window[0]
+    assert os.path.getsize(partial_path) > 0
+    # ~9 sec a 600-ból: a seek Range kérésekkel megy, nem a teljes fájl jön le
+    assert any(r and not r.startswith("bytes=0-") for _, _, r in http_server.requests)
+    # (a socket bufferekben ragadt, el nem olvasott byte-ok is beleszámítanak)
+    assert http_server.sent_bytes < len(source_bytes) * 0.15
+    assert os.path.getsize(partial_path) < len(source_bytes) * 0.05
+
+
+@requires_ffmpeg
+def test_fetch_failure_returns_none(http_server, tmp_path):
+    info = _info(f"{http_server.url}/missing.webm")
+    assert _range_fetch(info, (298, 307), str(tmp_path), ProgressReporter()) is None
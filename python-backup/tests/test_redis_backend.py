@@ -0,0 +1,172 @@
+# Redis registry és work queue (fakeredis): két "node" (két kliens ugyanazon a szerveren)
+# között is atomi read-modify-write, és egy claimelt entry sosem vész el.
+
+import json
+import threading
+import time
+
+import pytest
+
+fakeredis = pytest.importorskip("fakeredis")
+
+from registry import RedisRegistry  # noqa: E402
+from work_queue import RedisWorkQueue, WORKER_ID  # noqa: E402
+
+
+@pytest.fixture
+def server():
+    return fakeredis.FakeServer()
+
+
+def _client(server):
+    return fakeredis.FakeRedis(server=server)
+
+
+def _registries(server, count=2):
+    return [RedisRegistry(_client(server), prefix="test") for _ in range(count)]
+
+
+def _parallel(count, fn):
+    barrier = threading.Barrier(count)
+    results = [None] * count
+
+    def run(n):
+        barrier.wait()
+        results[n] = fn(n)
+
+    threads = [threading.Thread(target=run, args=(n,)) for n in range(count)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_claim_output_is_atomic_across_nodes(server):
+    nodes = _registries(server)
+    for n in range(16):
+        nodes[0].create_job(f"job-{n}")
+
+    outcomes = _parallel(16, lambda n: nodes[n % 2].claim_output("video:1:2:mp3:0", f"job-{n}"))
+
+    assert [outcome for outcome, _ in outcomes].count("new") == 1
+    owner = nodes[0]._get("outputs", "video:1:2:mp3:0").job_id
+    assert all(existing == owner for outcome, existing in outcomes if outcome == "attach")
+
+
+def test_atomic_section_excludes_other_nodes(server):
+    first, second = _registries(server)
+    first.create_job("job")
+    inside, release = threading.Event(), threading.Event()
+
+    def hold():
+        with first._atomic():
+            inside.set()
+            release.wait(2)
+            first.update_job("job", status="done")
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    inside.wait(2)
+    started = time.monotonic()
+    threading.Timer(0.2, release.set).start()
+    # A cancel check-and-set csak a lock után fut, és már a kész jobot látja
+    job = second.update_job("job", only_active=True, status="cancelled")
+    holder.join()
+
+    assert time.monotonic() - started >= 0.15
+    assert job.status == "done"
+
+
+def test_lock_of_a_dead_node_expires(server):
+    registry = RedisRegistry(_client(server), prefix="test", lock_lease=0.2, lock_timeout=2)
+    registry.create_job("job")
+    registry.redis.set("test:registry-lock", "dead-node", px=200)
+
+    assert registry.update_job("job", status="running").status == "running"
+    assert registry.redis.get("test:registry-lock") is None
+
+
+def test_queue_orders_by_priority_then_submission(server):
+    queue = RedisWorkQueue(_client(server), prefix="test")
+    queue.push_many([(["a"], {"n": 1}), (["b"], {"n": 2})], priority=10)
+    queue.push_many([(["c"], {"n": 3})], priority=0)
+
+    assert queue.depth() == 3
+    assert [queue.position(job_id) for job_id in "cab"] == [1, 2, 3]
+    claimed = [queue.claim()[1] for _ in range(3)]
+    assert claimed == [["c"], ["a"], ["b"]]
+    assert queue.claim() is None
+    assert queue.position("a") is None
+
+
+def test_claim_moves_entry_to_claims_in_one_step(server):
+    queue = RedisWorkQueue(_client(server), prefix="test")
+    queue.push_many([(["a"], {"n": 1})], priority=0)
+
+    entry_id, job_ids, payload = queue.claim()
+
+    assert (job_ids, payload) == (["a"], {"n": 1})
+    claims = queue.redis.hgetall("test:claims")
+    assert json.loads(claims[entry_id.encode()])["worker"] == WORKER_ID
+    queue.ack(entry_id)
+    assert queue.redis.hlen("test:claims") == 0 and queue.redis.hlen("test:work") == 0
+
+
+def test_concurrent_claims_take_each_entry_once(server):
+    queues = [RedisWorkQueue(_client(server), prefix="test") for _ in range(4)]
+    queues[0].push_many([([f"job-{n}"], {"n": n}) for n in range(40)], priority=0)
+
+    def drain(n):
+        taken = []
+        while (entry := queues[n].claim()) is not None:
+            taken.append(entry[2]["n"])
+        return taken
+
+    taken = [n for batch in _parallel(4, drain) for n in batch]
+    assert sorted(taken) == list(range(40))
+
+
+def test_stale_claim_is_requeued_unless_heartbeat(server):
+    queue = RedisWorkQueue(_client(server), prefix="test")
+    queue.push_many([(["a"], {"n": 1}), (["b"], {"n": 2})], priority=0)
+    stale, alive = queue.claim(), queue.claim()
+    old = json.dumps({"worker": "dead:1", "at": time.time() - 600})
+    queue.redis.hset("test:claims", mapping={stale[0]: old, alive[0]: old})
+    queue.redis.hset("test:claims", alive[0], json.dumps({"worker": WORKER_ID, "at": time.time() - 600}))
+    queue.heartbeat([alive[0]])
+
+    assert queue.requeue_stale(timeout=120) == 1
+    assert queue.position("a") == 1
+    assert queue.claim()[0] == stale[0]
+
+
+def test_claim_skips_acked_entries(server):
+    queue = RedisWorkQueue(_client(server), prefix="test")
+    queue.push_many([(["a"], {"n": 1}), (["b"], {"n": 2})], priority=0)
+    # Egy (lejárt claim miatt) újra sorba került, de közben ack-olt entry
+    queue.redis.hdel("test:work", "1")
+
+    assert queue.claim()[1] == ["b"]
+
+
+def test_dedup_lifecycle_across_nodes(server, tmp_path):
+    first, second = _registries(server)
+    first.create_job("job-a", status="queued")
+    key = "video:1:2:mp3:0"
+
+    assert first.claim_output(key, "job-a") == ("new", None)
+    assert second.claim_output(key, "job-b") == ("attach", "job-a")
+
+    path = tmp_path / "out.mp3"
+    path.write_bytes(b"x")
+    first.add_file("file-a", str(path))
+    first.complete_output(key, "job-a", "file-a", 1)
+    first.update_job("job-a", status="done")
+    assert second.claim_output(key, "job-c") == ("hit", "file-a")
+
+    # Sikertelen job után a kulcs felszabadul, a következő kérés újra claimel
+    first.create_job("job-x", status="queued")
+    assert first.claim_output("other", "job-x") == ("new", None)
+    first.release_output("other", "job-x")
+    assert second.claim_output("other", "job-y") == ("new", None)
@@ -0,0 +1,78 @@
+# Stage határidők (scheduler._run_in): a lejárt lépés a saját gyerek tokenjét állítja le,
+# a job / batch tokenjén osztozó többi lépés zavartalanul lefut; a szülő cancel-je viszont
+# minden futó lépéshez eljut.
+
+import asyncio
+import time
+
+import pytest
+
+import cancellation
+from cancellation import CancelToken, JobCancelled, current_token
+from scheduler import JobScheduler
+
+
+def _work(seconds, result):
+    def run():
+        deadline = time.monotonic() + seconds
+        while time.monotonic() < deadline:
+            cancellation.check()
+            time.sleep(0.01)
+        cancellation.check()
+        return result
+    return run
+
+
+def _scheduler():
+    return JobScheduler(download_workers=4, encode_workers=1, stage_timeouts={"DOWNLOAD": 0.3})
+
+
+def test_timed_out_stage_fails_alone():
+    scheduler = _scheduler()
+
+    async def run():
+        parent = CancelToken()
+        current_token.set(parent)
+        results = await asyncio.gather(
+            scheduler.run_download(_work(5, "slow")),
+            scheduler.run_download(_work(0.1, "a")),
+            scheduler.run_download(_work(0.2, "b")),
+            return_exceptions=True,
+        )
+        # A határidő után induló lépés is ugyanazon a (nem cancel-elt) szülőn fut
+        later = await scheduler.run_download(_work(0.05, "later"))
+        return parent, results, later
+
+    parent, results, later = asyncio.run(run())
+    assert isinstance(results[0], TimeoutError)
+    assert results[1:] == ["a", "b"]
+    assert later == "later"
+    assert not parent.cancelled
+    assert scheduler.timed_out == 1
+
+
+def test_parent_cancel_reaches_running_stages():
+    scheduler = _scheduler()
+    scheduler.stage_timeouts = {}
+
+    async def run():
+        parent = CancelToken()
+        current_token.set(parent)
+        asyncio.get_running_loop().call_later(0.1, parent.cancel, "Cancelled by client")
+        return await asyncio.gather(
+            scheduler.run_download(_work(5, "x")),
+            scheduler.run_download(_work(5, "y")),
+            return_exceptions=True,
+        )
+
+    started = time.monotonic()
+    results = asyncio.run(run())
+    assert time.monotonic() - started < 2
+    assert all(isinstance(r, JobCancelled) and str(r) == "Cancelled by client" for r in results)
+
+
+def test_child_of_cancelled_parent_starts_cancelled():
+    parent = CancelToken()
+    parent.cancel("gone")
+    with pytest.raises(JobCancelled, match="gone"):
+        parent.child().check()
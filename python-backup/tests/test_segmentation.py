@@ -0,0 +1,116 @@
+# Auto-segmentation (segmentation.py) szintetikus PCM-en: a csenddel határolt burst-ök
+# megtalálása, a hosszú szakaszok darabolása és a validált videó hosszon belül maradás.
+# A /segments endpoint a letöltést a download, a dekódolást + elemzést az encode poolon futtatja.
+
+import asyncio
+import subprocess
+import threading
+import uuid
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from conftest import requires_ffmpeg  # noqa: E402
+from segmentation import analyze_segments, find_segments, frame_features, validate_segment_params  # noqa: E402
+
+SAMPLE_RATE = 48000
+FRAME_LEN = 960  # 20 ms
+
+
+def _pcm(seconds, bursts):
+    t = np.arange(seconds * SAMPLE_RATE) / SAMPLE_RATE
+    signal = np.random.default_rng(1).standard_normal(len(t)) * 0.002
+    for start, length in bursts:
+        mask = (t >= start) & (t < start + length)
+        signal[mask] += 0.5 * np.sin(2 * np.pi * 440 * t[mask])
+    mono = (np.clip(signal, -1, 1) * 32767).astype("<i2")
+    return np.stack([mono, mono], axis=1)
+
+
+def _segments(pcm, **kwargs):
+    energy_db, onset = frame_features(pcm, FRAME_LEN, chunk_frames=500)
+    return find_segments(energy_db, onset, FRAME_LEN / SAMPLE_RATE, **kwargs)[0]
+
+
+def test_features_do_not_depend_on_chunk_size():
+    pcm = _pcm(12, [(3, 1)])
+    small = frame_features(pcm, FRAME_LEN, chunk_frames=7)
+    large = frame_features(pcm, FRAME_LEN, chunk_frames=10_000)
+    assert np.allclose(small[0], large[0]) and np.allclose(small[1], large[1])
+
+
+def test_bursts_bounded_by_silence():
+    segments = sorted(_segments(_pcm(30, [(5, 1), (20, 2)])), key=lambda s: s["start"])
+    assert [(round(s["start"]), round(s["end"])) for s in segments] == [(5, 6), (20, 22)]
+    assert all(type(s["start"]) is float and type(s["end"]) is float for s in segments)
+
+
+def test_long_run_is_split_at_max_duration():
+    segments = _segments(_pcm(30, [(5, 15)]), max_duration=10.0)
+    assert max(s["duration"] for s in segments) <= 10.0 + 0.05
+    assert sum(s["duration"] for s in segments) == pytest.approx(15.1, abs=0.2)
+
+
+def test_segments_end_within_validated_duration():
+    # A burst a PCM végéig tart, de a videó (info['duration']) 19.5 sec
+    segments = _segments(_pcm(20, [(18, 2)]), max_end=19.5)
+    assert segments and all(s["end"] <= 19.5 for s in segments)
+
+
+class LocalSource:
+    """A PreparedSource helyett: a forrás már a lemezen van"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.info = {"id": f"test-{uuid.uuid4().hex[:11]}", "format_id": "251", "duration": 7, "title": "bursts"}
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+
+
+@pytest.fixture
+def burst_path(tmp_path):
+    path = tmp_path / "source.wav"
+    # 3 sec csend, 1 sec szinusz, 3 sec csend
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i",
+         "aevalsrc=if(between(t\\,3\\,4)\\,0.5*sin(2*PI*440*t)\\,0):d=7:s=48000", "-ac", "2", str(path)],
+        check=True,
+    )
+    return path
+
+
+@requires_ffmpeg
+def test_segments_endpoint_analyzes_on_encode_pool(monkeypatch, burst_path):
+    pytest.importorskip("fastapi")
+    import main
+
+    sources, threads = [], {}
+
+    def prepare(youtube_url, *args, **kwargs):
+        threads["download"] = threading.current_thread().name
+        sources.append(LocalSource(burst_path))
+        return sources[-1]
+
+    def analyze(source, *args):
+        threads["analyze"] = threading.current_thread().name
+        return analyze_segments(source, *args)
+
+    monkeypatch.setattr(main, "prepare_source", prepare)
+    monkeypatch.setattr(main, "analyze_segments", analyze)
+    req = main.SegmentsRequest(youtube_url="https://www.youtube.com/watch?v=dQw4w9WgXcQ")
+    result = asyncio.run(main.detect_segments_endpoint(req))
+
+    assert threads["download"].startswith("download") and threads["analyze"].startswith("encode")
+    assert sources[-1].closed
+    assert [(round(s["start"]), round(s["end"])) for s in result["segments"]] == [(3, 4)]
+    assert result["requests"][0]["start_time"] == result["segments"][0]["start"]
+
+
+def test_invalid_params_fail_before_download():
+    with pytest.raises(ValueError):
+        validate_segment_params(0, 0.3, 10)
+    with pytest.raises(ValueError):
+        validate_segment_params(5, 2, 1)
@@ -0,0 +1,54 @@
+# Source cache per-key lockok: egyidejű kérésekből egyetlen letöltés lesz, és a töltés után
+# (sikeres vagy hibás) a kulcs lockja nem marad a cache-ben.
+
+import threading
+import time
+
+import pytest
+
+from source_cache import SourceCache
+
+
+def _fetcher(tmp_path, calls):
+    def fetch():
+        calls.append(1)
+        time.sleep(0.2)
+        path = tmp_path / f"download-{len(calls)}.webm"
+        path.write_bytes(b"x" * 10)
+        return str(path)
+    return fetch
+
+
+def test_concurrent_misses_download_once_and_drop_the_lock(tmp_path):
+    cache = SourceCache(root=str(tmp_path / "cache"))
+    calls, hits = [], []
+    barrier = threading.Barrier(4)
+
+    def run():
+        barrier.wait()
+        with cache.acquire("video", "251", _fetcher(tmp_path, calls)) as (_, hit):
+            hits.append(hit)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(hits) == [False, True, True, True]
+    assert cache._key_locks == {}
+
+
+def test_failed_fetch_drops_the_lock(tmp_path):
+    cache = SourceCache(root=str(tmp_path / "cache"))
+
+    def fetch():
+        raise RuntimeError("download failed")
+
+    for video_id in ("a", "b", "c"):
+        with pytest.raises(RuntimeError):
+            with cache.acquire(video_id, "251", fetch):
+                pass
+
+    assert cache._key_locks == {}
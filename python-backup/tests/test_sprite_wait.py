@@ -0,0 +1,44 @@
+# /sprite: egy másik kérés épülő sprite-jára várakozás (main._wait_for_sprite) határideje. Egy
+# meghalt / hibás építő után a kulcs felszabadul, és a következő kérés újraépítheti.
+
+import asyncio
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+
+from fastapi import HTTPException  # noqa: E402
+
+import main  # noqa: E402
+
+
+def _claimed(status):
+    key, job_id = f"sprite:{uuid.uuid4().hex}", str(uuid.uuid4())
+    main.registry.create_job(job_id, status=status)
+    assert main.registry.claim_output(key, job_id) == ("new", None)
+    return key, job_id
+
+
+@pytest.mark.parametrize("status", ["running", "error"])
+def test_dead_or_failed_builder_releases_the_key(monkeypatch, status):
+    monkeypatch.setattr(main, "SPRITE_TIMEOUT", 0.3)
+    key, job_id = _claimed(status)
+
+    with pytest.raises(HTTPException) as raised:
+        asyncio.run(main._wait_for_sprite(job_id, key, poll=0.05))
+
+    assert raised.value.status_code == 503
+    assert main.registry._get("outputs", key) is None
+    assert main.registry.claim_output(key, str(uuid.uuid4())) == ("new", None)
+
+
+def test_finished_build_is_returned(monkeypatch):
+    key, job_id = _claimed("running")
+
+    async def run():
+        asyncio.get_running_loop().call_later(
+            0.1, lambda: main.registry.update_job(job_id, status="done", file_id="sprite-file"))
+        return await main._wait_for_sprite(job_id, key, poll=0.02)
+
+    assert asyncio.run(run()) == "sprite-file"
@@ -0,0 +1,87 @@
+# ThumbnailResolver egy helyi stub thumbnail hoszt ellen: találat, fallback a következő
+# felbontásra, negative cache (404) és az átmeneti hibák rövid cache-e.
+
+import asyncio
+import time
+
+from thumbnails import ThumbnailResolver, THUMBNAIL_ORDER
+
+VIDEO_ID = "dQw4w9WgXcQ"
+JPEG = (200, b"\xff\xd8\xff\xe0jpeg", "image/jpeg")
+
+
+def _resolve_twice(resolver, order=THUMBNAIL_ORDER):
+    async def run():
+        try:
+            return await resolver.resolve(VIDEO_ID, order), await resolver.resolve(VIDEO_ID, order)
+        finally:
+            await resolver.close()
+    return asyncio.run(run())
+
+
+def _heads(server):
+    return [path for method, path, _ in server.requests if method == "HEAD"]
+
+
+def test_hit_is_cached(http_server):
+    http_server.routes[f"/vi/{VIDEO_ID}/maxresdefault.jpg"] = JPEG
+    resolver = ThumbnailResolver(base_url=f"{http_server.url}/vi")
+
+    first, second = _resolve_twice(resolver)
+
+    assert first == second == f"{http_server.url}/vi/{VIDEO_ID}/maxresdefault.jpg"
+    assert resolver.hits == 1  # a második hívás hálózat nélkül
+    assert _heads(http_server).count(f"/vi/{VIDEO_ID}/maxresdefault.jpg") == 1
+
+
+def test_missing_resolution_falls_back_and_is_negatively_cached(http_server):
+    http_server.routes[f"/vi/{VIDEO_ID}/hqdefault.jpg"] = JPEG
+    resolver = ThumbnailResolver(base_url=f"{http_server.url}/vi")
+
+    first, second = _resolve_twice(resolver)
+
+    assert first == second == f"{http_server.url}/vi/{VIDEO_ID}/hqdefault.jpg"
+    heads = _heads(http_server)
+    assert heads.count(f"/vi/{VIDEO_ID}/maxresdefault.jpg") == 1  # a 404 a cache-ből jön
+    assert heads.count(f"/vi/{VIDEO_ID}/hqdefault.jpg") == 1
+
+
+def test_all_missing_returns_none_without_reprobing(http_server):
+    resolver = ThumbnailResolver(base_url=f"{http_server.url}/vi")
+
+    first, second = _resolve_twice(resolver)
+
+    assert first is None and second is None
+    assert len(_heads(http_server)) == len(THUMBNAIL_ORDER)
+
+
+def test_transient_error_is_not_cached_as_missing(http_server):
+    http_server.routes[f"/vi/{VIDEO_ID}/maxresdefault.jpg"] = (503, b"", "text/plain")
+    http_server.routes[f"/vi/{VIDEO_ID}/hqdefault.jpg"] = JPEG
+    resolver = ThumbnailResolver(base_url=f"{http_server.url}/vi", error_ttl=0)
+
+    async def run():
+        try:
+            fallback = await resolver.resolve(VIDEO_ID)
+            http_server.routes[f"/vi/{VIDEO_ID}/maxresdefault.jpg"] = JPEG  # a hoszt helyreállt
+            return fallback, await resolver.resolve(VIDEO_ID)
+        finally:
+            await resolver.close()
+
+    fallback, recovered = asyncio.run(run())
+
+    assert fallback == f"{http_server.url}/vi/{VIDEO_ID}/hqdefault.jpg"
+    assert recovered == f"{http_server.url}/vi/{VIDEO_ID}/maxresdefault.jpg"
+
+
+def test_network_error_uses_short_ttl(http_server):
+    url = f"{http_server.url}/vi"
+    http_server.stop()  # a kapcsolat visszautasítva
+    resolver = ThumbnailResolver(base_url=url, negative_ttl=3600, error_ttl=5, timeout=1.0)
+
+    first, _ = _resolve_twice(resolver, order=("maxresdefault",))
+
+    assert first is None
+    expires_at, exists = resolver._status[f"{url}/{VIDEO_ID}/maxresdefault.jpg"]
+    assert exists is False
+    assert expires_at - time.monotonic() <= 5
@@ -0,0 +1,50 @@
+# Waveform peak piramis (waveform.py): build_peaks egy letöltött forrásból dekódol és
+# épít, utána a cached_peaks letöltés / dekódolás nélkül a tárolt piramisból szeletel.
+
+import subprocess
+import uuid
+
+import pytest
+
+pytest.importorskip("numpy")
+
+from conftest import requires_ffmpeg  # noqa: E402
+from waveform import build_peaks, cached_peaks, peaks_window  # noqa: E402
+
+
+class LocalSource:
+    """A PreparedSource helyett: a forrás már a lemezen van"""
+
+    def __init__(self, path):
+        self.path = str(path)
+        self.info = {"id": f"test-{uuid.uuid4().hex[:11]}", "format_id": "251", "duration": 10}
+
+
+@requires_ffmpeg
+def test_build_then_slice_from_cache(tmp_path):
+    path = tmp_path / "source.wav"
+    # 5 sec csend, majd 5 sec szinusz
+    subprocess.run(
+        ["ffmpeg", "-v", "error", "-f", "lavfi", "-i", "aevalsrc=if(gte(t\\,5)\\,0.5*sin(2*PI*440*t)\\,0):d=10:s=48000",
+         "-ac", "2", str(path)],
+        check=True,
+    )
+    source = LocalSource(path)
+    assert cached_peaks(source.info, 100) is None
+
+    built = build_peaks(source, 100)
+    assert built["cached"] is False
+    assert built["duration"] == pytest.approx(10, abs=0.01)
+    assert max(built["max"][:45]) < 0.01 and min(built["max"][55:]) > 0.3
+
+    start_sec, end_sec = peaks_window(50, "0:06", "0:08")
+    zoomed = cached_peaks(source.info, 50, start_sec, end_sec)
+    assert zoomed["cached"] is True
+    assert (zoomed["start"], zoomed["end"]) == (6, 8)
+    assert len(zoomed["min"]) == 50
+
+
+def test_window_validation():
+    with pytest.raises(ValueError):
+        peaks_window(0)
+    assert peaks_window(10, "1:00", None) == (60, None)
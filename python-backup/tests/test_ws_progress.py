@@ -0,0 +1,28 @@
+# WebSocket progress közös registry mellett: ha a pollozott job közben eltűnik (TTL eviction,
+# visszavont sorba állítás), a kliens hibaüzenetet kap és a socket lezárul - nem vár örökké.
+
+import threading
+import uuid
+
+import pytest
+
+pytest.importorskip("fastapi")
+pytest.importorskip("validators")
+
+from fastapi.testclient import TestClient  # noqa: E402
+from starlette.websockets import WebSocketDisconnect  # noqa: E402
+
+import main  # noqa: E402
+
+
+def test_vanished_job_closes_the_socket(monkeypatch):
+    monkeypatch.setattr(main, "_ws_poll_interval", lambda: 0.05)
+    job_id = str(uuid.uuid4())
+    main.registry.create_job(job_id, status="queued")
+
+    with TestClient(main.app).websocket_connect(f"/ws/progress/{job_id}") as ws:
+        assert ws.receive_json()["status"] == "queued"
+        threading.Timer(0.2, main.registry.delete_job, args=(job_id,)).start()
+        assert ws.receive_json() == {"job_id": job_id, "error": "Job not found"}
+        with pytest.raises(WebSocketDisconnect):
+            ws.receive_json()
@@ -0,0 +1,147 @@
+# --- THUMBNAIL RESOLVER ---
+# A legjobb elérhető YouTube thumbnail URL feloldása video ID-nként cache-elve.
+# A jelölt felbontásokat párhuzamosan, egy közös (connection pooling) async HTTP
+# kliensen keresztül ellenőrizzük; a hiányzó (404) felbontásokat is cache-eljük (negative cache),
+# az átmeneti hibákat (hálózat, 5xx, 429) csak rövid ideig.
+
+import asyncio
+import os
+import time
+
+THUMBNAIL_BASE_URL = os.getenv("THUMBNAIL_BASE_URL", "https://img.youtube.com/vi")
+
+# Preferencia sorrendek
+THUMBNAIL_ORDER = (
+    "maxresdefault",  # 1280x720
+    "hqdefault",      # 480x360
+    "mqdefault",      # 320x180
+    "sddefault",      # 640x480
+    "default",        # 120x90
+)
+SCREENSHOT_ORDER = (
+    "mqdefault",      # 320x180 - good for screenshots
+    "hqdefault",      # 480x360
+    "sddefault",      # 640x480
+    "maxresdefault",  # 1280x720
+    "default",        # 120x90
+)
+
+
+class ThumbnailResolver:
+    """
+    - ttl: létező thumbnail URL cache ideje (sec)
+    - negative_ttl: hiányzó (404) felbontás cache ideje (sec)
+    - error_ttl: átmeneti hiba (hálózat, timeout, egyéb státusz) cache ideje (sec, 0 = nincs)
+    """
+
+    def __init__(self, base_url=THUMBNAIL_BASE_URL, ttl=24 * 3600, negative_ttl=3600, error_ttl=30, timeout=5.0,
+                 max_entries=50000):
+        self.base_url = base_url.rstrip("/")
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.error_ttl = error_ttl
+        self.timeout = timeout
+        self._client = None
+        self._status = {}    # url: (expires_at, exists)
+        self._inflight = {}  # url: asyncio.Future
+        self.probes = 0
+        self.hits = 0
+
+    def _get_client(self):
+        if self._client is None:
+            import httpx
+            self._client = httpx.AsyncClient(
+                timeout=self.timeout,
+                limits=httpx.Limits(max_connections=32, max_keepalive_connections=16),
+            )
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def url_for(self, video_id, name):
+        return f"{self.base_url}/{video_id}/{name}.jpg"
+
+    def _cached(self, url):
+        entry = self._status.get(url)
+        if entry is not None and entry[0] > time.monotonic():
+            return entry[1]
+        return None
+
+    def _prune(self):
+        now = time.monotonic()
+        for url in [url for url, (expires_at, _) in self._status.items() if expires_at <= now]:
+            del self._status[url]
+        # Még mindig túl sok: a legrégebben beírtak mennek
+        for url in list(self._status)[:len(self._status) - self.max_entries]:
+            del self._status[url]
+
+    async def _probe(self, url):
+        # Ugyanarra az URL-re futó HEAD-eket összevonjuk
+        future = self._inflight.get(url)
+        if future is not None:
+            return await asyncio.shield(future)
+        future = self._inflight[url] = asyncio.get_running_loop().create_future()
+        try:
+            self.probes += 1
+            try:
+                response = await self._get_client().head(url)
+                status = response.status_code
+            except Exception:
+                status = None
+            exists = status == 200
+            if exists:
+                ttl = self.ttl
+            elif status == 404:
+                ttl = self.negative_ttl
+            else:
+                ttl = self.error_ttl  # átmeneti: egy óráig ne higgyük hiányzónak
+            if ttl > 0:
+                self._status[url] = (time.monotonic() + ttl, exists)
+                if len(self._status) > self.max_entries:
+                    self._prune()
+            future.set_result(exists)
+            return exists
+        finally:
+            if not future.done():
+                future.cancel()
+            del self._inflight[url]
+
+    async def resolve(self, video_id, order=THUMBNAIL_ORDER):
+        """Az első létező thumbnail URL a preferencia sorrendben, vagy None."""
+        urls = [self.url_for(video_id, name) for name in order]
+        known = [self._cached(url) for url in urls]
+        # Ha a preferencia szerinti első ismert-létező előtt nincs ismeretlen, nem kell hálózat
+        for url, exists in zip(urls, known):
+            if exists is None:
+                break
+            if exists:
+                self.hits += 1
+                return url
+        else:
+            self.hits += 1
+            return None
+        unknown = []
+        for url, exists in zip(urls, known):
+            if exists:
+                break  # az ennél rosszabb felbontásokat nem kell ellenőrizni
+            if exists is None:
+                unknown.append(url)
+        await asyncio.gather(*(self._probe(url) for url in unknown))
+        for url in urls:
+            if self._cached(url):
+                return url
+        return None
+
+    def stats(self):
+        return {"cached_urls": len(self._status), "probes": self.probes, "hits": self.hits}
+
+
+thumbnail_resolver = ThumbnailResolver(
+    ttl=int(os.getenv("THUMBNAIL_TTL", 24 * 3600)),
+    negative_ttl=int(os.getenv("THUMBNAIL_NEGATIVE_TTL", 3600)),
+    error_ttl=int(os.getenv("THUMBNAIL_ERROR_TTL", 30)),
+)
@@ -1,165 +1,508 @@
 # --- CORE EXTRACTION ENGINE ---
 
 import os
+import copy
+import logging
 import tempfile
+from contextlib import ExitStack
 import ffmpeg
+from source_cache import source_cache
+from video_info_cache import video_info_cache
+import pcm_store
+import cancellation
+from cancellation import JobCancelled
+from metrics import STAGE_SECONDS, STAGE_ERRORS, DOWNLOADED_BYTES, ENCODED_BYTES, ffmpeg_process
+from app_logging import get_logger
+from ydl_pool import ydl_pool, YDL_OPTS  # noqa: F401 (YDL_OPTS: re-export)
+
+logger = get_logger("extractor")
+
+# --- OUTPUT FORMATS ---
+# ext: (ffmpeg muxer, encoder, forrás codecek amiket újrakódolás nélkül (-c copy) át lehet tenni)
+OUTPUT_FORMATS = {
+    'mp3': ('mp3', 'libmp3lame', ('mp3',)),
+    'wav': ('wav', 'pcm_s16le', ()),
+    'opus': ('opus', 'libopus', ('opus',)),
+    'ogg': ('ogg', 'libvorbis', ('vorbis', 'opus')),
+    'm4a': ('ipod', 'aac', ('aac',)),
+}
+MEDIA_TYPES = {
+    'mp3': 'audio/mp3',
+    'wav': 'audio/wav',
+    'opus': 'audio/ogg',
+    'ogg': 'audio/ogg',
+    'm4a': 'audio/mp4',
+}
+
+def source_codec(info):
+    """A forrás audio codec normalizált neve (yt-dlp 'acodec': opus, mp4a.40.2, ...)"""
+    acodec = (info.get('acodec') or '').lower()
+    if acodec.startswith('mp4a'):
+        return 'aac'
+    return acodec.split('.')[0]
+
+def can_stream_copy(info, output_ext):
+    """Igaz, ha a kért output formátum a forrás codecét újrakódolás nélkül tudja tárolni"""
+    return source_codec(info) in OUTPUT_FORMATS[output_ext][2]
+
+# --- RANGE FETCH ---
+# Rövid klipeknél nem a teljes forrást töltjük le, hanem ffmpeg közvetlenül a
+# feloldott media URL-en seekel és csak a [start-padding, end+padding] tartományt
+# másolja le (-c copy). Ha a container/protokoll nem seekelhető, teljes letöltés.
+RANGE_FETCH_ENABLED = os.getenv("RANGE_FETCH", "1") != "0"
+RANGE_FETCH_PADDING = float(os.getenv("RANGE_FETCH_PADDING", "2"))
+RANGE_FETCH_MAX_RATIO = float(os.getenv("RANGE_FETCH_MAX_RATIO", "0.5"))
+SEEKABLE_PROTOCOLS = ("http", "https")
+SEEKABLE_CONTAINERS = ("webm", "m4a", "mp4", "mp3", "ogg", "opus")
 
 def parse_timestamp(ts):
-    """Bármilyen timestamp string/int -> másodperc (int)"""
-    if isinstance(ts, int):
-        return ts
-    if isinstance(ts, float):
-        return int(ts)
-    if isinstance(ts, str):
-        parts = ts.strip().split(":")
+    """
+    Bármilyen timestamp -> másodperc (int, tört másodpercnél float)
+    - int / float: 90, 90.5
+    - string: "90", "90.5", "1:30", "1:30.250", "01:01:30.5", "1500ms"
+    """
+    import math
+    value = None
+    if isinstance(ts, (int, float)) and not isinstance(ts, bool):
+        value = float(ts)
+    elif isinstance(ts, str):
+        text = ts.strip().lower()
         try:
-            if len(parts) == 1:
-                return int(parts[0])
-            elif len(parts) == 2:
-                return int(parts[0])*60 + int(parts[1])
-            elif len(parts) == 3:
-                return int(parts[0])*3600 + int(parts[1])*60 + int(parts[2])
-        except Exception:
-            pass
-    raise ValueError(f"Érvénytelen timestamp: {ts}")
+            if text.endswith("ms"):
+                value = float(text[:-2]) / 1000
+            else:
+                parts = text.split(":")
+                if len(parts) <= 3:
+                    value = 0.0
+                    for part in parts[:-1]:
+                        value = value*60 + int(part)
+                    value = value*60 + float(parts[-1])
+        except ValueError:
+            value = None
+    if value is None or not math.isfinite(value):
+        raise ValueError(f"Érvénytelen timestamp: {ts}")
+    value = round(value, 6)
+    return int(value) if value.is_integer() else value
+
+def _range_fetch_window(info, start_time, end_time):
+    """(fetch_start, fetch_end) ha a range fetch értelmes ennél a forrásnál, különben None"""
+    if not RANGE_FETCH_ENABLED:
+        return None
+    if info.get('protocol') not in SEEKABLE_PROTOCOLS or not info.get('url'):
+        return None
+    if info.get('ext') not in SEEKABLE_CONTAINERS:
+        return None
+    try:
+        start_sec = parse_timestamp(start_time)
+        end_sec = parse_timestamp(end_time)
+    except ValueError:
+        return None  # a TIMESTAMP lépés adja majd a rendes hibát
+    duration = info.get('duration') or 0
+    if duration <= 0 or start_sec < 0 or end_sec <= start_sec:
+        return None
+    fetch_start = max(0, start_sec - RANGE_FETCH_PADDING)
+    fetch_end = min(duration, end_sec + RANGE_FETCH_PADDING)
+    if fetch_end - fetch_start > duration * RANGE_FETCH_MAX_RATIO:
+        return None  # nagy tartománynál a cache-elhető teljes letöltés jobb
+    return fetch_start, fetch_end
 
-def extract_audio_segment(youtube_url, start_time, end_time, output_format):
+def _range_fetch(info, window, temp_dir, progress):
     """
-    Core extraction engine (ffmpeg-only):
-    - youtube_url: YouTube videó URL
-    - start_time, end_time: timestamp (str/int)
-    - output_format: 'mp3' vagy 'wav'
+    Csak a megadott időablak letöltése a media URL-ről (stream copy).
+    Visszaad: (partial_path, offset_sec) vagy None, ha a seek nem sikerült.
+    """
+    fetch_start, fetch_end = window
+    partial_path = os.path.join(temp_dir, f"source.{info['ext']}")
+    input_opts = {'ss': fetch_start, 't': fetch_end - fetch_start}
+    if info.get('http_headers'):
+        input_opts['headers'] = "".join(f"{k}: {v}\r\n" for k, v in info['http_headers'].items())
+    try:
+        _run_ffmpeg(
+            ffmpeg
+            .input(info['url'], **input_opts)
+            .output(partial_path, c='copy', vn=None),
+            on_time=lambda t: progress.download_time(t, fetch_end - fetch_start),
+            stage="DOWNLOAD",
+        )
+    except ffmpeg.Error:
+        return None
+    if not os.path.exists(partial_path) or os.path.getsize(partial_path) == 0:
+        return None
+    return partial_path, fetch_start
+
+def extract_video_id(url):
+    """YouTube videó ID kinyerése (watch?v=, /shorts/, youtu.be/, /embed/), vagy None"""
+    import re
+    for pattern in (r"[?&]v=([\w-]+)", r"/shorts/([\w-]+)", r"youtu\.be/([\w-]+)", r"/embed/([\w-]+)"):
+        match = re.search(pattern, url or "")
+        if match:
+            return match.group(1)
+    return None
+
+def resolve_video_info(youtube_url):
+    """
+    yt-dlp metadata (download=False) a video info cache-en keresztül.
+    A visszaadott dict megosztott: módosítás előtt copy.deepcopy.
+    """
+    def load():
+        with ydl_pool.lease() as ydl:
+            return ydl.extract_info(youtube_url, download=False)
+    return video_info_cache.get(_video_info_key(youtube_url), load)
+
+def _video_info_key(youtube_url):
+    return extract_video_id(youtube_url) or youtube_url
+
+class ProgressReporter:
+    """
+    Pipeline progress: a megszokott stdout log sorok + strukturált események.
+    - on_event(event): opcionális callback (pl. WebSocket push), worker szálról hívódik
+    Események: {"type": "stage"|"complete"|"error"|"bytes"|"encode", "stage", "progress", ...}
+    """
+
+    # Lépésenkénti progress sávok (%): a byte / idő alapú részletes progress ezen belül mozog
+    DOWNLOAD_RANGE = (10, 30)
+    EXTRACT_RANGE = (70, 100)
+
+    def __init__(self, on_event=None):
+        self.on_event = on_event
+        self._last_percent = None
+
+    def log(self, msg, level=logging.INFO, **fields):
+        logger.log(level, msg, extra=fields)
+
+    def emit(self, event):
+        if self.on_event is not None:
+            self.on_event(event)
+
+    def stage(self, step, percent, msg):
+        self.log(f"🔄 [STEP] {step}: {msg} ({percent}%)", stage=step, progress=percent)
+        self._last_percent = percent
+        self.emit({"type": "stage", "stage": step, "progress": percent, "message": msg})
+
+    def complete(self, step, elapsed, detail):
+        self.log(f"✅ [COMPLETE] {step}: {elapsed:.2f}s - {detail}", stage=step, elapsed=round(elapsed, 3))
+        STAGE_SECONDS.observe(elapsed, stage=step)
+        self.emit({"type": "complete", "stage": step, "elapsed": round(elapsed, 3), "detail": str(detail)})
+
+    def fail(self, step, error):
+        self.log(f"❌ [ERROR] {step}: {error}", logging.ERROR, stage=step)
+        STAGE_ERRORS.inc(stage=step)
+        self.emit({"type": "error", "stage": step, "error": str(error)})
+
+    def warn(self, step, msg):
+        self.log(f"⚠️ [WARN] {step}: {msg}", logging.WARNING, stage=step)
+
+    def _fraction(self, kind, step, band, fraction, **detail):
+        # Csak egész százalék változásnál küldünk eseményt
+        low, high = band
+        percent = int(low + (high - low) * min(max(fraction, 0.0), 1.0))
+        if percent == self._last_percent:
+            return
+        self._last_percent = percent
+        self.emit({"type": kind, "stage": step, "progress": percent, **detail})
+
+    def download_bytes(self, downloaded, total):
+        if total:
+            self._fraction("bytes", "DOWNLOAD", self.DOWNLOAD_RANGE, downloaded / total,
+                           downloaded_bytes=downloaded, total_bytes=total)
+
+    def download_time(self, done_sec, total_sec):
+        if total_sec:
+            self._fraction("bytes", "DOWNLOAD", self.DOWNLOAD_RANGE, done_sec / total_sec)
+
+    def encode_time(self, done_sec, total_sec):
+        if total_sec:
+            self._fraction("encode", "EXTRACT", self.EXTRACT_RANGE, done_sec / total_sec,
+                           out_time=round(done_sec, 2))
+
+def _run_ffmpeg(stream, on_time=None, stage="EXTRACT"):
+    """
+    ffmpeg futtatás -progress pipe:1 kimenettel.
+    - on_time(out_time_sec): a feldolgozott output idő, futás közben
+    - stage: metrika címke (tube_ffmpeg_*)
+    Hiba esetén ffmpeg.Error (stderr-rel), mint a stream.run(); megszakított jobnál
+    (a token leállította a folyamatot) JobCancelled.
+    """
+    import subprocess
+    import threading
+
+    args = stream.global_args('-progress', 'pipe:1', '-nostats').overwrite_output().compile()
+    with ffmpeg_process(stage):
+        process = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with cancellation.track(process):
+            # stderr-t külön szálon olvassuk, különben a pipe betelhet és ffmpeg blokkol
+            stderr_chunks = []
+            stderr_reader = threading.Thread(target=lambda: stderr_chunks.append(process.stderr.read()), daemon=True)
+            stderr_reader.start()
+            for raw in process.stdout:
+                key, _, value = raw.decode(errors='ignore').strip().partition('=')
+                if key == 'out_time_us' and on_time is not None and value.isdigit():
+                    on_time(int(value) / 1_000_000)
+            process.wait()
+            stderr_reader.join()
+        if process.returncode != 0:
+            cancellation.check()
+            raise ffmpeg.Error('ffmpeg', b'', b''.join(stderr_chunks))
+
+class PreparedSource:
+    """
+    VALIDATE + DOWNLOAD eredménye: a vágáshoz kész lokális forrás.
+    - path: forrás fájl (cache entry vagy range fetch-elt részlet)
+    - offset: a részlet kezdete (sec) az eredeti videóban
+    - partial: range fetch-elt részlet (nem a teljes, cache-elt forrás)
+    A source cache entry a close()-ig pinelve marad.
+    """
+
+    def __init__(self, info, path, offset, work_dir, pin, partial=False):
+        self.info = info
+        self.path = path
+        self.offset = offset
+        self.partial = partial
+        self.work_dir = work_dir
+        self._pin = pin
+
+    def close(self):
+        import shutil
+        self._pin.close()
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def prepare_source(youtube_url, window_start=None, window_end=None, progress=None):
+    """
+    VALIDATE + DOWNLOAD lépések.
+    - window_start, window_end: a később kivágandó tartomány (range fetch döntéshez)
     """
-    import yt_dlp
     import validators
     import shutil
 
     import time
-    def progress(msg):
-        print(msg, flush=True)
+    progress = progress or ProgressReporter()
+    cancellation.check()
 
     step = "VALIDATE"
     t0 = time.time()
-    progress(f"🔄 [STEP] {step}: URL validation (0%)")
+    progress.stage(step, 0, "URL validation")
     if not validators.url(youtube_url):
-        progress(f"❌ [ERROR] {step}: Invalid YouTube URL")
+        progress.fail(step, "Invalid YouTube URL")
         raise ValueError("Invalid YouTube URL!")
     t1 = time.time()
-    progress(f"✅ [COMPLETE] {step}: {t1-t0:.2f}s - N/A")
+    progress.complete(step, t1-t0, "N/A")
 
     step = "DOWNLOAD"
     t0 = time.time()
-    progress(f"🔄 [STEP] {step}: Downloading video audio (10%)")
-    ydl_opts = {
-        'format': 'bestaudio/best',
-        'quiet': True,
-        'outtmpl': None,  # temp file
-        'noplaylist': True,
-        'no_warnings': True,
-        'prefer_ffmpeg': True,
-        'extractaudio': True,
-        'cachedir': False,
-        # Additional options to avoid blocking
-        'extractor_retries': 3,
-        'fragment_retries': 3,
-        'retries': 3,
-        'socket_timeout': 30,
-        # Add comprehensive headers to avoid 403 errors
-        'http_headers': {
-            'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Accept-Language': 'en-us,en;q=0.5',
-            'Accept-Encoding': 'gzip,deflate',
-            'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
-            'Keep-Alive': '300',
-            'Connection': 'keep-alive',
-        }
-    }
-    temp_dir = tempfile.mkdtemp(prefix="yt-audio-")
-    temp_audio_path = os.path.join(temp_dir, "audio.%(ext)s")
-    ydl_opts['outtmpl'] = temp_audio_path
+    progress.stage(step, 10, "Downloading video audio")
+    work_dir = tempfile.mkdtemp(prefix="yt-audio-")
+    # A cache entry a teljes EXTRACT lépés alatt pinelve marad
+    source_pin = ExitStack()
 
     try:
-        with yt_dlp.YoutubeDL(ydl_opts) as ydl:
-            info = ydl.extract_info(youtube_url, download=True)
-            downloaded_path = ydl.prepare_filename(info)
-            t1 = time.time()
-            size = os.path.getsize(downloaded_path)/1024/1024 if os.path.exists(downloaded_path) else 0
-            progress(f"✅ [COMPLETE] {step}: {t1-t0:.2f}s - {size:.2f}MB")
-            # Print metadata for the actual processed video
-            print("\n--- VIDEO METADATA ---")
-            print(f"Title: {info.get('title')}")
-            print(f"Duration: {info.get('duration')} seconds ({info.get('duration')//60}:{info.get('duration')%60:02d})")
-            print(f"Channel: {info.get('uploader')}")
-            print(f"Views: {info.get('view_count'):,}")
-            print(f"URL: {youtube_url}")
-            print("-----------------------\n")
+        # A metadata a video info cache-ből jön (a /video-info már feloldhatta)
+        info = resolve_video_info(youtube_url)
+
+        def on_download(d):
+            # A hookból dobott kivétel a yt-dlp letöltést is megszakítja
+            cancellation.check()
+            if d.get('status') == 'downloading':
+                progress.download_bytes(d.get('downloaded_bytes') or 0,
+                                        d.get('total_bytes') or d.get('total_bytes_estimate'))
+
+        def fetch_source():
+            with ydl_pool.lease(on_progress=on_download) as ydl:
+                dl_info = ydl.process_ie_result(copy.deepcopy(info), download=True)
+                requested = dl_info.get('requested_downloads') or []
+                if requested and requested[0].get('filepath'):
+                    return requested[0]['filepath']
+                return ydl.prepare_filename(dl_info)
+
+        # Range fetch csak akkor, ha a teljes forrás még nincs a cache-ben
+        source_offset = 0
+        partial = None
+        window = None
+        # PCM módban a teljes forrás kell (egyszer dekódoljuk, utána minden vágás onnan megy)
+        if window_start is not None and window_end is not None and not pcm_store.enabled():
+            window = _range_fetch_window(info, window_start, window_end)
+        if window and not source_cache.lookup(info.get('id'), info.get('format_id')):
+            partial = _range_fetch(info, window, work_dir, progress)
+            if partial is None:
+                progress.warn(step, "Range fetch not possible, falling back to full download")
+        if partial is not None:
+            downloaded_path, source_offset = partial
+            fetch_mode = f"range {window[0]:.0f}-{window[1]:.0f}s"
+        else:
+            downloaded_path, cache_hit = source_pin.enter_context(
+                source_cache.acquire(info.get('id'), info.get('format_id'), fetch_source)
+            )
+            fetch_mode = 'cache hit' if cache_hit else 'downloaded'
+        t1 = time.time()
+        size_bytes = os.path.getsize(downloaded_path) if os.path.exists(downloaded_path) else 0
+        if partial is not None:
+            DOWNLOADED_BYTES.inc(size_bytes, mode="range")
+        elif not cache_hit:
+            DOWNLOADED_BYTES.inc(size_bytes, mode="full")
+        size = size_bytes/1024/1024
+        progress.complete(step, t1-t0, f"{size:.2f}MB ({fetch_mode})")
+        # Metadata for the actual processed video
+        logger.info(
+            "Video metadata: %s", info.get('title'),
+            extra={
+                "title": info.get('title'),
+                "duration": info.get('duration'),
+                "uploader": info.get('uploader'),
+                "view_count": info.get('view_count'),
+                "url": youtube_url,
+            },
+        )
     except Exception as e:
-        progress(f"❌ [ERROR] {step}: {e}")
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        progress.fail(step, e)
+        source_pin.close()
+        shutil.rmtree(work_dir, ignore_errors=True)
+        token = cancellation.current_token.get()
+        if token is not None and token.cancelled:
+            raise JobCancelled(token.reason) from e
+        # A cache-elt media URL lejárhatott - a következő próbálkozás oldja fel újra
+        video_info_cache.invalidate(_video_info_key(youtube_url))
         raise RuntimeError(f"YouTube download error: {e}")
 
+    return PreparedSource(info, downloaded_path, source_offset, work_dir, source_pin, partial is not None)
+
+def validate_segment(info, start_time, end_time, output_format, progress=None):
+    """TIMESTAMP + FORMAT lépések egy szegmensre. Visszaad: (start_sec, end_sec, output_ext)"""
+    import time
+    progress = progress or ProgressReporter()
+
     step = "TIMESTAMP"
     t0 = time.time()
-    progress(f"🔄 [STEP] {step}: Timestamp validation (30%)")
+    progress.stage(step, 30, "Timestamp validation")
     try:
         start_sec = parse_timestamp(start_time)
         end_sec = parse_timestamp(end_time)
         if start_sec < 0 or end_sec <= start_sec:
-            progress(f"❌ [ERROR] {step}: Invalid time interval: start time must be >= 0 and less than end time.")
             raise ValueError("Invalid time interval: start time must be >= 0 and less than end time.")
-        video_length = int(info.get('duration', 0))
+        video_length = info.get('duration') or 0
         if video_length == 0:
-            progress(f"❌ [ERROR] {step}: Could not determine video length.")
             raise ValueError("Could not determine video length.")
         if start_sec >= video_length:
-            progress(f"❌ [ERROR] {step}: Start time ({start_sec}s) is beyond video length ({video_length}s).")
             raise ValueError(f"Start time ({start_sec}s) is beyond video length ({video_length}s).")
         if end_sec > video_length:
-            progress(f"❌ [ERROR] {step}: End time ({end_sec}s) is beyond video length ({video_length}s). Video duration: {video_length}s.")
             raise ValueError(f"End time ({end_sec}s) is beyond video length ({video_length}s). Video duration: {video_length}s.")
         t1 = time.time()
-        progress(f"✅ [COMPLETE] {step}: {t1-t0:.2f}s - N/A")
+        progress.complete(step, t1-t0, "N/A")
     except Exception as e:
-        progress(f"❌ [ERROR] {step}: {e}")
-        shutil.rmtree(temp_dir, ignore_errors=True)
+        # Egyetlen hibajelzés (metrika + esemény) lépésenként: a fenti raise-ek is ide futnak
+        progress.fail(step, e)
         raise ValueError(f"Timestamp error: {e}")
 
-    # 4. Audio segment cutting & format conversion (ffmpeg streaming)
     step = "FORMAT"
     t0 = time.time()
-    progress(f"🔄 [STEP] {step}: Output format validation (50%)")
+    progress.stage(step, 50, "Output format validation")
     output_ext = output_format.lower()
-    if output_ext not in ("mp3", "wav"):
-        progress(f"❌ [ERROR] {step}: Only mp3 or wav output formats are supported.")
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        raise ValueError("Only mp3 or wav output formats are supported.")
-    output_path = os.path.join(temp_dir, f"output.{output_ext}")
+    if output_ext not in OUTPUT_FORMATS:
+        supported = ", ".join(OUTPUT_FORMATS)
+        progress.fail(step, f"Only {supported} output formats are supported.")
+        raise ValueError(f"Only {supported} output formats are supported.")
     t1 = time.time()
-    progress(f"✅ [COMPLETE] {step}: {t1-t0:.2f}s - {output_ext}")
+    progress.complete(step, t1-t0, output_ext)
+    return start_sec, end_sec, output_ext
+
+def cut_segments(source, segments, progress=None, precise=False):
+    """
+    EXTRACT lépés: több szegmens kivágása egyetlen ffmpeg futással (több output).
+    - segments: [(start_time, end_time, output_format), ...]
+    - precise: mindig újrakódol (minta pontos vágás); különben ha a forrás codec
+      egyezik az output formátuméval, stream copy (packet pontosság, ~20ms)
+    - visszaad: szegmensenként (output_path, temp_dir, video_metadata) vagy Exception
+    """
+    import shutil
+    import time
+    progress = progress or ProgressReporter()
+    cancellation.check()
+
+    info = source.info
+    results = [None] * len(segments)
+    valid = []  # (index, start_sec, end_sec, output_ext)
+    for i, (start_time, end_time, output_format) in enumerate(segments):
+        try:
+            valid.append((i, *validate_segment(info, start_time, end_time, output_format, progress)))
+        except ValueError as e:
+            results[i] = e
+    if not valid:
+        return results
+
     step = "EXTRACT"
     t0 = time.time()
-    progress(f"🔄 [STEP] {step}: Audio extraction and conversion (70%)")
+    progress.stage(step, 70, f"Audio extraction and conversion - {len(valid)} segment(s)")
+    temp_dirs = []
+    output_paths = []
+    ffmpeg_segments = []  # (start_sec, end_sec, output_path, muxer, codec)
+    pcm_segments = []     # (start_sec, end_sec, output_path, output_ext, muxer, encoder)
+    # PCM mód: az újrakódolandó szegmensek a dekódolt PCM memmap-ből jönnek (csak teljes forrásnál)
+    use_pcm = pcm_store.enabled() and not source.partial
+    for i, start_sec, end_sec, output_ext in valid:
+        temp_dir = tempfile.mkdtemp(prefix="yt-audio-")
+        output_path = os.path.join(temp_dir, f"output.{output_ext}")
+        temp_dirs.append(temp_dir)
+        output_paths.append(output_path)
+        muxer, encoder, _ = OUTPUT_FORMATS[output_ext]
+        # Fast path: a forrás már a kért codecben van -> nincs decode/encode
+        if not precise and can_stream_copy(info, output_ext):
+            ffmpeg_segments.append((start_sec, end_sec, output_path, muxer, 'copy'))
+        elif use_pcm:
+            pcm_segments.append((start_sec, end_sec, output_path, output_ext, muxer, encoder))
+        else:
+            ffmpeg_segments.append((start_sec, end_sec, output_path, muxer, encoder))
+    copied = sum(1 for seg in ffmpeg_segments if seg[4] == 'copy')
     try:
-        process = (
-            ffmpeg
-            .input(downloaded_path, ss=start_sec, to=end_sec)
-            .output(output_path, format=output_ext)
-            .overwrite_output()
-            .run(capture_stdout=True, capture_stderr=True)
-        )
+        if ffmpeg_segments:
+            # Közös input seek a legkorábbi szegmensre, outputonként pontos -ss/-to
+            base = max(0, min(seg[0] for seg in ffmpeg_segments) - source.offset)
+            stream = ffmpeg.input(source.path, ss=base)
+            outputs = [
+                stream['a'].output(
+                    output_path,
+                    ss=start_sec - source.offset - base,
+                    to=end_sec - source.offset - base,
+                    format=muxer,
+                    acodec=codec,
+                )
+                for start_sec, end_sec, output_path, muxer, codec in ffmpeg_segments
+            ]
+            total = max(seg[1] for seg in ffmpeg_segments) - source.offset - base
+            on_time = None if pcm_segments else (lambda t: progress.encode_time(t, total))
+            _run_ffmpeg(ffmpeg.merge_outputs(*outputs), on_time=on_time)
+        if pcm_segments:
+            with pcm_store.open_pcm(info, source.path) as (pcm, pcm_hit):
+                for n, (start_sec, end_sec, output_path, output_ext, muxer, encoder) in enumerate(pcm_segments, 1):
+                    if output_ext == 'wav':
+                        pcm_store.write_wav_slice(pcm, start_sec, end_sec, output_path)
+                    else:
+                        pcm_store.encode_slice(pcm, start_sec, end_sec, output_path, muxer, encoder)
+                    progress.encode_time(n, len(pcm_segments))
+                    cancellation.check()
         t1 = time.time()
-        size = os.path.getsize(output_path)/1024/1024 if os.path.exists(output_path) else 0
-        progress(f"✅ [COMPLETE] {step}: {t1-t0:.2f}s - {size:.2f}MB")
-    except ffmpeg.Error as e:
-        err_msg = e.stderr.decode(errors='ignore') if hasattr(e, 'stderr') else str(e)
-        progress(f"❌ [ERROR] {step}: {err_msg}")
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        raise RuntimeError(f"FFmpeg segmentation/conversion error: {err_msg}")
+        size = sum(os.path.getsize(p) for p in output_paths if os.path.exists(p))/1024/1024
+        detail = f"{size:.2f}MB ({copied}/{len(valid)} stream copy"
+        if pcm_segments:
+            detail += f", {len(pcm_segments)} from PCM {'cache' if pcm_hit else 'decode'}"
+        progress.complete(step, t1-t0, detail + ")")
     except Exception as e:
-        progress(f"❌ [ERROR] {step}: {e}")
-        shutil.rmtree(temp_dir, ignore_errors=True)
-        raise RuntimeError(f"FFmpeg segmentation/conversion error: {e}")
+        if isinstance(e, ffmpeg.Error):
+            err_msg = e.stderr.decode(errors='ignore') if hasattr(e, 'stderr') else str(e)
+        else:
+            err_msg = str(e)
+        progress.fail(step, err_msg)
+        for temp_dir in temp_dirs:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        if isinstance(e, JobCancelled):
+            raise
+        error = RuntimeError(f"FFmpeg segmentation/conversion error: {err_msg}")
+        for i, *_ in valid:
+            results[i] = error
+        return results
 
     # 5. File output (return path + metadata)
     video_metadata = {
@@ -168,17 +511,93 @@ def extract_audio_segment(youtube_url, start_time, end_time, output_format):
         "uploader": info.get('uploader'),
         "view_count": info.get('view_count')
     }
-    return output_path, temp_dir, video_metadata
+    for (i, _, _, output_ext), output_path, temp_dir in zip(valid, output_paths, temp_dirs):
+        ENCODED_BYTES.inc(os.path.getsize(output_path), format=output_ext)
+        results[i] = (output_path, temp_dir, dict(video_metadata))
+    return results
+
+def segment_stream_command(source, start_sec, end_sec, output_ext, precise=False):
+    """
+    ffmpeg parancs (args lista), ami a kivágott szegmenst a stdout-ra írja (pipe:1).
+    Nem seekelhető kimenet: m4a fragmentált MP4-ként megy, a wav header méreteit
+    utólag a fix_wav_header javítja a tee-zett fájlban.
+    """
+    muxer, encoder, _ = OUTPUT_FORMATS[output_ext]
+    codec = 'copy' if not precise and can_stream_copy(source.info, output_ext) else encoder
+    output_opts = {'format': muxer, 'acodec': codec}
+    if muxer == 'ipod':
+        output_opts['movflags'] = 'frag_keyframe+empty_moov'
+    return (
+        ffmpeg
+        .input(source.path, ss=start_sec - source.offset, to=end_sec - source.offset)['a']
+        .output('pipe:1', **output_opts)
+        .global_args('-v', 'error')
+        .compile()
+    )
+
+def fix_wav_header(path):
+    """Pipe-ra írt wav RIFF / data chunk méreteinek javítása (ffmpeg ott nem tud visszaseekelni)"""
+    import struct
+    size = os.path.getsize(path)
+    with open(path, "r+b") as f:
+        header = f.read(4096)
+        data_pos = header.find(b"data", 12)
+        if header[:4] != b"RIFF" or data_pos < 0:
+            return
+        f.seek(4)
+        f.write(struct.pack("<I", min(size - 8, 0xFFFFFFFF)))
+        f.seek(data_pos + 4)
+        f.write(struct.pack("<I", min(size - data_pos - 8, 0xFFFFFFFF)))
+
+def extract_audio_segment(youtube_url, start_time, end_time, output_format, progress=None, precise=False):
+    """
+    Core extraction engine (ffmpeg-only):
+    - youtube_url: YouTube videó URL
+    - start_time, end_time: timestamp (str/int/float, pl. "1:30.250", "1500ms")
+    - output_format: OUTPUT_FORMATS kulcs ('mp3', 'wav', 'opus', 'ogg', 'm4a')
+    - progress: opcionális ProgressReporter (események pl. WebSocket felé)
+    - precise: stream copy helyett mindig újrakódolás (minta pontos vágás)
+    """
+    progress = progress or ProgressReporter()
+    with prepare_source(youtube_url, start_time, end_time, progress) as source:
+        result = cut_segments(source, [(start_time, end_time, output_format)], progress, precise)[0]
+    if isinstance(result, Exception):
+        raise result
+    return result
+
+def segments_window(segments):
+    """(legkorábbi start, legkésőbbi end) a range fetch döntéshez, vagy (None, None)"""
+    starts, ends = [], []
+    for start_time, end_time, _ in segments:
+        try:
+            starts.append(parse_timestamp(start_time))
+            ends.append(parse_timestamp(end_time))
+        except ValueError:
+            pass
+    return (min(starts), max(ends)) if starts and ends else (None, None)
+
+def extract_audio_segments(youtube_url, segments, progress=None, precise=False):
+    """
+    Batch engine: ugyanabból a videóból több szegmens - egy letöltés, egy ffmpeg futás.
+    - segments: [(start_time, end_time, output_format), ...]
+    - visszaad: szegmensenként (output_path, temp_dir, video_metadata) vagy Exception
+    """
+    progress = progress or ProgressReporter()
+    with prepare_source(youtube_url, *segments_window(segments), progress) as source:
+        return cut_segments(source, segments, progress, precise)
 
 # --- Példa hívás ---
 if __name__ == "__main__":
     import argparse
     import shutil, re
+    from app_logging import setup_logging
+    setup_logging(fmt="text")
     parser = argparse.ArgumentParser(description="YouTube audio segment extractor")
     parser.add_argument("url", nargs="?", default="https://www.youtube.com/watch?v=mqLMPjeAWGQ&pp=0gcJCcYJAYcqIYzv", help="YouTube video URL")
     parser.add_argument("start", nargs="?", default="00:00", help="Start timestamp (e.g. 0:38 or 00:38)")
     parser.add_argument("end", nargs="?", default="00:05", help="End timestamp (e.g. 0:39 or 00:39)")
-    parser.add_argument("--fmt", default="mp3", choices=["mp3", "wav"], help="Output format (mp3 or wav)")
+    parser.add_argument("--fmt", default="mp3", choices=list(OUTPUT_FORMATS), help="Output format (mp3, wav, opus, ogg, m4a)")
+    parser.add_argument("--precise", action="store_true", help="Always re-encode (sample-accurate cut, no stream copy)")
     args = parser.parse_args()
 
     url = args.url
@@ -186,7 +605,7 @@ if __name__ == "__main__":
     end = args.end
     fmt = args.fmt
     try:
-        out_path, tmp_dir, video_metadata = extract_audio_segment(url, start, end, fmt)
+        out_path, tmp_dir, video_metadata = extract_audio_segment(url, start, end, fmt, precise=args.precise)
         # --- OUTPUT MANAGEMENT ---
         os.makedirs("output", exist_ok=True)
         # Extract video ID from URL
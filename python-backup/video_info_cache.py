@@ -0,0 +1,83 @@
+# --- VIDEO INFO CACHE ---
+# yt-dlp metadata (extract_info, download=False) TTL cache-e normalizált video ID kulccsal.
+# Ugyanarra az ID-ra érkező párhuzamos lekérések egyetlen extraction-t osztanak meg.
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+
+class VideoInfoCache:
+    """
+    - ttl: másodperc, ennyi ideig érvényes egy entry (a feloldott media URL-ek is lejárnak)
+    - max_entries: LRU korlát
+    A visszaadott info dict megosztott - a hívók nem módosíthatják (copy.deepcopy).
+    """
+
+    def __init__(self, ttl=600, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key: (expires_at, info)
+        self._inflight = {}  # key: Future
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+    def get(self, key, loader):
+        """Cache-elt info a kulcshoz, vagy loader() eredménye (egyszerre csak egy fut kulcsonként)."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not owner:
+            return future.result()
+
+        try:
+            info = loader()
+        except BaseException as e:
+            # Hibát nem cache-elünk, de a várakozók megkapják
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            del self._inflight[key]
+            self._entries[key] = (time.monotonic() + self.ttl, info)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        future.set_result(info)
+        return info
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+            }
+
+
+video_info_cache = VideoInfoCache(
+    ttl=int(os.getenv("VIDEO_INFO_TTL", 600)),
+    max_entries=int(os.getenv("VIDEO_INFO_MAX_ENTRIES", 512)),
+)
@@ -0,0 +1,154 @@
+# --- WAVEFORM PEAK PYRAMID ---
+# Min/max peak adatok a klip választóhoz (AddSoundForm), hogy a start/end időt a
+# hanghullám alapján lehessen megadni. A dekódolt PCM-ből (pcm_store) egyetlen
+# vektorizált NumPy menetben épül egy több szintű piramis:
+# - level0: BLOCK_FRAMES frame-enkénti min/max
+# - levelN: az előző szint LEVEL_FACTOR blokkjainak min/max-a
+# A piramis a PCM cache mellett (.peaks) tárolódik, így a zoom csak egy finomabb
+# szint szeletelése - nincs újabb letöltés / dekódolás. A letöltés (prepare_source) a
+# scheduler download poolján, a dekódolás + piramis (build_peaks) az encode poolján fut.
+
+import os
+import uuid
+
+import pcm_store
+from source_cache import SourceCache
+from tube_audio_extractor import parse_timestamp
+from app_logging import get_logger
+
+logger = get_logger("waveform")
+
+BLOCK_FRAMES = int(os.getenv("WAVEFORM_BLOCK_FRAMES", 256))  # ~5.3 ms 48 kHz-en
+LEVEL_FACTOR = 4
+CHUNK_BLOCKS = 4096  # ennyi blokkot olvasunk egyszerre a memmap-ből
+MAX_POINTS = 10000
+
+peaks_cache = SourceCache(
+    root=os.path.join(pcm_store.pcm_cache.root, ".peaks"),
+    max_bytes=int(os.getenv("WAVEFORM_CACHE_MAX_BYTES", 256 * 1024 * 1024)),
+)
+
+
+def build_pyramid(pcm, output_path):
+    """A teljes piramis egy menetben a (frames, CHANNELS) int16 PCM-ből, .npz fájlba"""
+    import numpy as np
+
+    frames = len(pcm)
+    blocks = -(-frames // BLOCK_FRAMES)
+    mins = np.empty(blocks, dtype="<i2")
+    maxs = np.empty(blocks, dtype="<i2")
+    step = CHUNK_BLOCKS * BLOCK_FRAMES
+    for offset in range(0, frames, step):
+        chunk = np.asarray(pcm[offset:offset + step])
+        first = offset // BLOCK_FRAMES
+        full = len(chunk) // BLOCK_FRAMES
+        if full:
+            # (blokk, BLOCK_FRAMES * CHANNELS): a csatornák is egy peak-be kerülnek
+            grouped = chunk[:full * BLOCK_FRAMES].reshape(full, -1)
+            mins[first:first + full] = grouped.min(axis=1)
+            maxs[first:first + full] = grouped.max(axis=1)
+        if len(chunk) % BLOCK_FRAMES:
+            tail = chunk[full * BLOCK_FRAMES:]
+            mins[first + full] = tail.min()
+            maxs[first + full] = tail.max()
+
+    levels = [(mins, maxs)]
+    while len(levels[-1][0]) > 1:
+        lo, hi = levels[-1]
+        edges = np.arange(0, len(lo), LEVEL_FACTOR)
+        levels.append((np.minimum.reduceat(lo, edges), np.maximum.reduceat(hi, edges)))
+
+    arrays = {f"level{k}": np.stack([lo, hi], axis=1) for k, (lo, hi) in enumerate(levels)}
+    np.savez(output_path, frames=np.int64(frames), **arrays)
+    return output_path
+
+
+def select_peaks(pyramid, points, start_sec=None, end_sec=None):
+    """
+    `points` darab (min, max) pár a [start_sec, end_sec) tartományra.
+    A legdurvább olyan szintet választja, ami még legalább `points` blokkot ad,
+    és azt vonja össze pontosan `points` vödörbe.
+    """
+    import numpy as np
+
+    frames = int(pyramid["frames"])
+    start = 0 if start_sec is None else min(int(start_sec * pcm_store.SAMPLE_RATE), frames)
+    end = frames if end_sec is None else min(int(end_sec * pcm_store.SAMPLE_RATE), frames)
+    if end <= start:
+        raise ValueError("A start időnek kisebbnek kell lennie, mint az end idő (és a videón belül)!")
+
+    level = 0
+    while f"level{level + 1}" in pyramid.files:
+        block = BLOCK_FRAMES * LEVEL_FACTOR ** (level + 1)
+        if (end - start) / block < points:
+            break
+        level += 1
+    block = BLOCK_FRAMES * LEVEL_FACTOR ** level
+    # Csak a kért szint töltődik be az .npz-ből
+    peaks = pyramid[f"level{level}"][start // block:-(-end // block)]
+    if len(peaks) > points:
+        edges = np.arange(points) * len(peaks) // points
+        peaks = np.stack([np.minimum.reduceat(peaks[:, 0], edges), np.maximum.reduceat(peaks[:, 1], edges)], axis=1)
+
+    scale = 1 / 32768
+    return {
+        "duration": round(frames / pcm_store.SAMPLE_RATE, 3),
+        "start": round(start / pcm_store.SAMPLE_RATE, 3),
+        "end": round(end / pcm_store.SAMPLE_RATE, 3),
+        "level": level,
+        "seconds_per_point": round((end - start) / len(peaks) / pcm_store.SAMPLE_RATE, 6),
+        "min": np.round(peaks[:, 0] * scale, 4).tolist(),
+        "max": np.round(peaks[:, 1] * scale, 4).tolist(),
+    }
+
+
+def peaks_window(points, start_time=None, end_time=None):
+    """A kérés paramétereinek ellenőrzése: (start_sec, end_sec), ValueError ha hibás"""
+    if not 1 <= points <= MAX_POINTS:
+        raise ValueError(f"points: 1 és {MAX_POINTS} között kell lennie")
+    start_sec = parse_timestamp(start_time) if start_time is not None else None
+    end_sec = parse_timestamp(end_time) if end_time is not None else None
+    return start_sec, end_sec
+
+
+def cached_peaks(info, points, start_sec=None, end_sec=None):
+    """Peak adatok a már tárolt piramisból (nincs letöltés / dekódolás), vagy None"""
+    import numpy as np
+
+    if peaks_cache.lookup(info.get('id'), info.get('format_id')) is None:
+        return None
+
+    def evicted():
+        raise LookupError("waveform pyramid evicted")
+
+    try:
+        with peaks_cache.acquire(info.get('id'), info.get('format_id'), evicted) as (path, _):
+            with np.load(path) as pyramid:
+                result = select_peaks(pyramid, points, start_sec, end_sec)
+    except LookupError:
+        return None  # a lookup és a pin között kiesett: építés
+    result["cached"] = True
+    return result
+
+
+def build_peaks(source, points, start_sec=None, end_sec=None):
+    """
+    DECODE + piramis egy letöltött forrásból (CPU munka: a scheduler encode poolján fut),
+    majd a kért szelet. A PCM a pcm_store cache-én át dekódolódik (videónként egyszer).
+    """
+    import numpy as np
+
+    info = source.info
+
+    def build():
+        with pcm_store.open_pcm(info, source.path) as (pcm, _):
+            key = SourceCache.make_key(info.get('id'), info.get('format_id'))
+            staging_path = os.path.join(peaks_cache.staging_dir, f"{key}-{uuid.uuid4().hex}.npz")
+            logger.info(f"📈 Building waveform pyramid: {len(pcm)} frames", extra={"frames": len(pcm)})
+            return build_pyramid(pcm, staging_path)
+
+    with peaks_cache.acquire(info.get('id'), info.get('format_id'), build) as (path, hit):
+        with np.load(path) as pyramid:
+            result = select_peaks(pyramid, points, start_sec, end_sec)
+    result["cached"] = hit
+    return result
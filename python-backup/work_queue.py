@@ -0,0 +1,341 @@
+# --- WORK QUEUE ---
+# A scheduler várakozási sora, cserélhető backenddel:
+# - memory: folyamaton belüli heap (alapértelmezett, egy uvicorn worker)
+# - sqlite: közös adatbázis fájl, a claim egy BEGIN IMMEDIATE tranzakció (fájl lock),
+#   így egy hoszton több uvicorn worker / konténer osztozik a soron
+# - redis: Redis protokoll (ZSET + HASH), több node; bármilyen RESP szerverrel
+#   (redis, valkey, fakeredis) működik, a kliens be is adható
+# Egy entry: (entry_id, job_ids, payload) - a payload JSON-szerializálható dict.
+# A claimelt entry-t a futtató worker heartbeat-eli; ha a worker meghal, a claim
+# lejár és az entry visszakerül a sorba.
+
+import heapq
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+
+WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+
+class WorkQueue:
+    """Közös interfész; poll_interval: None = elég az in-process wakeup, különben ennyi sec-enként claimelünk"""
+
+    poll_interval = None
+
+    def push_many(self, items, priority):
+        """items: [(job_ids, payload)] - egy lépésben"""
+        raise NotImplementedError
+
+    def claim(self):
+        """A következő entry (entry_id, job_ids, payload), vagy None ha üres a sor"""
+        raise NotImplementedError
+
+    def ack(self, entry_id):
+        """A claimelt entry lefutott (sikeresen vagy hibával) - végleg törölhető"""
+        raise NotImplementedError
+
+    def heartbeat(self, entry_ids):
+        pass
+
+    def requeue_stale(self, timeout):
+        """timeout sec óta heartbeat nélküli claimek visszarakása; visszaadja a darabszámot"""
+        return 0
+
+    def depth(self):
+        raise NotImplementedError
+
+    def position(self, job_id):
+        """1-alapú pozíció a sorban, vagy None"""
+        raise NotImplementedError
+
+
+class MemoryWorkQueue(WorkQueue):
+    def __init__(self):
+        self._heap = []  # (priority, seq, entry_id, job_ids, payload)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def push_many(self, items, priority):
+        with self._lock:
+            for job_ids, payload in items:
+                seq = next(self._seq)
+                heapq.heappush(self._heap, (priority, seq, str(seq), list(job_ids), payload))
+
+    def claim(self):
+        with self._lock:
+            if not self._heap:
+                return None
+            _, _, entry_id, job_ids, payload = heapq.heappop(self._heap)
+            return entry_id, job_ids, payload
+
+    def ack(self, entry_id):
+        pass
+
+    def depth(self):
+        return len(self._heap)
+
+    def position(self, job_id):
+        with self._lock:
+            ordered = sorted(self._heap, key=lambda item: item[:2])
+        for position, item in enumerate(ordered, start=1):
+            if job_id in item[3]:
+                return position
+        return None
+
+
+class SQLiteWorkQueue(WorkQueue):
+    poll_interval = float(os.getenv("QUEUE_POLL_INTERVAL", 0.5))
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self._conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS work_queue ("
+            "id INTEGER PRIMARY KEY AUTOINCREMENT, priority INTEGER, job_ids TEXT, payload TEXT, "
+            "claimed_by TEXT, claimed_at REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS work_queue_order ON work_queue (claimed_by, priority, id)")
+        self._lock = threading.Lock()
+
+    def _transaction(self, fn):
+        # BEGIN IMMEDIATE: írási lock az adatbázis fájlon, a claim így folyamatok között is atomi
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return result
+
+    def push_many(self, items, priority):
+        rows = [(priority, json.dumps(list(job_ids)), json.dumps(payload)) for job_ids, payload in items]
+        self._transaction(lambda: self._conn.executemany(
+            "INSERT INTO work_queue (priority, job_ids, payload) VALUES (?, ?, ?)", rows
+        ))
+
+    def claim(self):
+        def take():
+            row = self._conn.execute(
+                "SELECT id, job_ids, payload FROM work_queue WHERE claimed_by IS NULL ORDER BY priority, id LIMIT 1"
+            ).fetchone()
+            if row is None:
+                return None
+            self._conn.execute(
+                "UPDATE work_queue SET claimed_by = ?, claimed_at = ? WHERE id = ?", (WORKER_ID, time.time(), row[0])
+            )
+            return str(row[0]), json.loads(row[1]), json.loads(row[2])
+        return self._transaction(take)
+
+    def ack(self, entry_id):
+        with self._lock:
+            self._conn.execute("DELETE FROM work_queue WHERE id = ?", (int(entry_id),))
+
+    def heartbeat(self, entry_ids):
+        with self._lock:
+            self._conn.executemany(
+                "UPDATE work_queue SET claimed_at = ? WHERE id = ? AND claimed_by = ?",
+                [(time.time(), int(entry_id), WORKER_ID) for entry_id in entry_ids],
+            )
+
+    def requeue_stale(self, timeout):
+        with self._lock:
+            cursor = self._conn.execute(
+                "UPDATE work_queue SET claimed_by = NULL, claimed_at = NULL "
+                "WHERE claimed_by IS NOT NULL AND claimed_at < ?", (time.time() - timeout,)
+            )
+            return cursor.rowcount
+
+    def depth(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM work_queue WHERE claimed_by IS NULL").fetchone()[0]
+
+    def position(self, job_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT job_ids FROM work_queue WHERE claimed_by IS NULL ORDER BY priority, id"
+            ).fetchall()
+        for position, (job_ids,) in enumerate(rows, start=1):
+            if job_id in json.loads(job_ids):
+                return position
+        return None
+
+
+class RedisWorkQueue(WorkQueue):
+    """
+    Kulcsok (prefix alatt):
+    - queue: ZSET entry_id -> priority * 1e12 + seq (ZPOPMIN = következő)
+    - work: HASH entry_id -> {"job_ids", "payload", "priority"}
+    - claims: HASH entry_id -> {"worker", "at"}
+    - jobs: HASH job_id -> entry_id (queue_position-höz)
+    A push, a claim és a requeue egy-egy Lua script (atomi a szerveren): egy entry
+    mindig vagy a sorban, vagy a claims-ben van, a worker halála nem veszíti el.
+    """
+
+    poll_interval = float(os.getenv("QUEUE_POLL_INTERVAL", 0.5))
+
+    # KEYS: seq, work, jobs, queue; ARGV: priority, majd entry-nként: entry JSON, job szám, job_id-k
+    _PUSH = """
+        local priority = tonumber(ARGV[1])
+        local ids = {}
+        local i = 2
+        while i <= #ARGV do
+            local seq = redis.call('INCR', KEYS[1])
+            local entry_id = tostring(seq)
+            redis.call('HSET', KEYS[2], entry_id, ARGV[i])
+            local count = tonumber(ARGV[i + 1])
+            for j = 1, count do
+                redis.call('HSET', KEYS[3], ARGV[i + 1 + j], entry_id)
+            end
+            redis.call('ZADD', KEYS[4], priority * 1e12 + seq, entry_id)
+            ids[#ids + 1] = entry_id
+            i = i + 2 + count
+        end
+        return ids
+    """
+    # KEYS: queue, work, claims, jobs; ARGV: claim JSON. Pop + claim egy lépésben; a work
+    # nélküli (már ack-olt) entry-ket átugorja
+    _CLAIM = """
+        while true do
+            local popped = redis.call('ZPOPMIN', KEYS[1])
+            if #popped == 0 then
+                return nil
+            end
+            local entry_id = popped[1]
+            local raw = redis.call('HGET', KEYS[2], entry_id)
+            if raw then
+                redis.call('HSET', KEYS[3], entry_id, ARGV[1])
+                local job_ids = cjson.decode(raw)['job_ids']
+                if #job_ids > 0 then
+                    redis.call('HDEL', KEYS[4], unpack(job_ids))
+                end
+                return {entry_id, raw}
+            end
+        end
+    """
+    # KEYS: claims, work, jobs, queue; ARGV: entry_id, a lejártnak látott claim JSON.
+    # Csak akkor rakja vissza, ha a claim azóta nem változott (nem jött heartbeat)
+    _REQUEUE = """
+        if redis.call('HGET', KEYS[1], ARGV[1]) ~= ARGV[2] then
+            return 0
+        end
+        redis.call('HDEL', KEYS[1], ARGV[1])
+        local raw = redis.call('HGET', KEYS[2], ARGV[1])
+        if not raw then
+            return 0
+        end
+        local entry = cjson.decode(raw)
+        for _, job_id in ipairs(entry['job_ids']) do
+            redis.call('HSET', KEYS[3], job_id, ARGV[1])
+        end
+        redis.call('ZADD', KEYS[4], entry['priority'] * 1e12 + tonumber(ARGV[1]), ARGV[1])
+        return 1
+    """
+
+    # KEYS: claims; ARGV: worker, claim JSON, entry_id-k. Csak a saját, még élő claimeket
+    # frissíti (a másik node által már visszarakott entry-t nem "foglalja vissza")
+    _HEARTBEAT = """
+        for i = 3, #ARGV do
+            local raw = redis.call('HGET', KEYS[1], ARGV[i])
+            if raw and cjson.decode(raw)['worker'] == ARGV[1] then
+                redis.call('HSET', KEYS[1], ARGV[i], ARGV[2])
+            end
+        end
+    """
+
+    def __init__(self, client, prefix="tube"):
+        self.redis = client
+        self.prefix = prefix
+        self._push = client.register_script(self._PUSH)
+        self._heartbeat = client.register_script(self._HEARTBEAT)
+        self._claim = client.register_script(self._CLAIM)
+        self._requeue = client.register_script(self._REQUEUE)
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def push_many(self, items, priority):
+        args = [priority]
+        for job_ids, payload in items:
+            args.append(json.dumps({"job_ids": list(job_ids), "payload": payload, "priority": priority}))
+            args.append(len(job_ids))
+            args.extend(job_ids)
+        self._push(keys=[self._key("seq"), self._key("work"), self._key("jobs"), self._key("queue")], args=args)
+
+    def claim(self):
+        claim = json.dumps({"worker": WORKER_ID, "at": time.time()})
+        result = self._claim(
+            keys=[self._key("queue"), self._key("work"), self._key("claims"), self._key("jobs")], args=[claim]
+        )
+        if not result:
+            return None
+        entry_id, raw = _text(result[0]), result[1]
+        entry = json.loads(raw)
+        return entry_id, entry["job_ids"], entry["payload"]
+
+    def ack(self, entry_id):
+        pipe = self.redis.pipeline()  # MULTI / EXEC
+        pipe.zrem(self._key("queue"), entry_id)
+        pipe.hdel(self._key("claims"), entry_id)
+        pipe.hdel(self._key("work"), entry_id)
+        pipe.execute()
+
+    def heartbeat(self, entry_ids):
+        if not entry_ids:
+            return
+        claim = json.dumps({"worker": WORKER_ID, "at": time.time()})
+        self._heartbeat(keys=[self._key("claims")], args=[WORKER_ID, claim, *entry_ids])
+
+    def requeue_stale(self, timeout):
+        requeued = 0
+        deadline = time.time() - timeout
+        keys = [self._key("claims"), self._key("work"), self._key("jobs"), self._key("queue")]
+        for entry_id, raw in self.redis.hgetall(self._key("claims")).items():
+            if json.loads(raw)["at"] >= deadline:
+                continue
+            requeued += self._requeue(keys=keys, args=[_text(entry_id), raw])
+        return requeued
+
+    def depth(self):
+        return self.redis.zcard(self._key("queue"))
+
+    def position(self, job_id):
+        entry_id = self.redis.hget(self._key("jobs"), job_id)
+        if entry_id is None:
+            return None
+        rank = self.redis.zrank(self._key("queue"), _text(entry_id))
+        return None if rank is None else rank + 1
+
+
+def _text(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def redis_client(url=None):
+    """redis-py kliens REDIS_URL-ről (opcionális függőség)"""
+    try:
+        import redis
+    except ImportError as e:
+        raise RuntimeError("The redis backend requires the 'redis' package (pip install redis)") from e
+    return redis.Redis.from_url(url or os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+
+
+def shared_db_path():
+    return os.getenv("REGISTRY_DB_PATH", os.path.join(tempfile.gettempdir(), "tube-registry.sqlite3"))
+
+
+def create_work_queue():
+    backend = os.getenv("WORK_QUEUE_BACKEND", "memory")
+    if backend == "sqlite":
+        return SQLiteWorkQueue(os.getenv("WORK_QUEUE_DB_PATH", shared_db_path()))
+    if backend == "redis":
+        return RedisWorkQueue(redis_client(), prefix=os.getenv("REDIS_PREFIX", "tube"))
+    return MemoryWorkQueue()
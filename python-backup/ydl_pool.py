@@ -0,0 +1,174 @@
+# --- YOUTUBEDL POOL ---
+# Előre konfigurált, újrahasznosított YoutubeDL példányok (metadata + letöltés közös
+# opciókkal), hívásonkénti YoutubeDL építés helyett. Egy példányt egyszerre csak egy
+# szál használ (lease); a progress hook a példányon egy továbbító, ami a lease
+# idejére az aktuális callbackre mutat. A yt_dlp import lusta: az első példány
+# létrehozásakor (vagy a startup warm() alatt, háttérben) töltődik be.
+
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+from source_cache import source_cache
+from app_logging import get_logger
+
+logger = get_logger("ydl_pool")
+
+# --- yt-dlp beállítások (metadata + letöltés közös) ---
+YDL_OPTS = {
+    'format': 'bestaudio/best',
+    'quiet': True,
+    # A forrás a source cache staging könyvtárába töltődik, onnan kerül a cache-be
+    'outtmpl': os.path.join(source_cache.staging_dir, "%(id)s-%(format_id)s.%(ext)s"),
+    'noplaylist': True,
+    'no_warnings': True,
+    'prefer_ffmpeg': True,
+    'extractaudio': True,
+    'cachedir': False,
+    # Additional options to avoid blocking
+    'extractor_retries': 3,
+    'fragment_retries': 3,
+    'retries': 3,
+    'socket_timeout': 30,
+    # Add comprehensive headers to avoid 403 errors
+    'http_headers': {
+        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0.0.0 Safari/537.36',
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Accept-Language': 'en-us,en;q=0.5',
+        'Accept-Encoding': 'gzip,deflate',
+        'Accept-Charset': 'ISO-8859-1,utf-8;q=0.7,*;q=0.7',
+        'Keep-Alive': '300',
+        'Connection': 'keep-alive',
+    }
+}
+
+
+class _Pooled:
+    __slots__ = ("ydl", "on_progress")
+
+
+class YoutubeDLPool:
+    """
+    - lease(on_progress=None): egy szabad példány (vagy új, ha még nincs max_size);
+      ha mind foglalt, vár
+    - warm(count): példányok előre létrehozása (startupkor, háttér szálon)
+    - hibával végződő lease után a példányt eldobjuk (lehet félkész állapotban)
+    """
+
+    def __init__(self, options, max_size=8):
+        self.options = options
+        self.max_size = max_size
+        self._idle = []
+        self._created = 0
+        self._cond = threading.Condition()
+        self.leases = 0
+        self.waits = 0
+        self.discarded = 0
+        self.warm_seconds = None
+
+    def _create(self):
+        import yt_dlp
+
+        pooled = _Pooled()
+        pooled.on_progress = None
+
+        def dispatch(d):
+            if pooled.on_progress is not None:
+                pooled.on_progress(d)
+
+        pooled.ydl = yt_dlp.YoutubeDL({**self.options, 'progress_hooks': [dispatch]})
+        return pooled
+
+    def _take(self):
+        with self._cond:
+            while not self._idle and self._created >= self.max_size:
+                self.waits += 1
+                self._cond.wait()
+            self.leases += 1
+            if self._idle:
+                return self._idle.pop()
+            self._created += 1
+        try:
+            return self._create()
+        except BaseException:
+            with self._cond:
+                self._created -= 1
+                self._cond.notify()
+            raise
+
+    def _give_back(self, pooled, broken):
+        pooled.on_progress = None
+        with self._cond:
+            if broken:
+                self._created -= 1
+                self.discarded += 1
+            else:
+                self._idle.append(pooled)
+            self._cond.notify()
+        if broken:
+            _close(pooled)
+
+    @contextmanager
+    def lease(self, on_progress=None):
+        pooled = self._take()
+        pooled.on_progress = on_progress
+        broken = True
+        try:
+            yield pooled.ydl
+            broken = False
+        finally:
+            self._give_back(pooled, broken)
+
+    def warm(self, count=None):
+        """count (alapból max_size) példány létrehozása, hogy az első kérés ne várjon"""
+        t0 = time.perf_counter()
+        count = min(self.max_size, self.max_size if count is None else count)
+        created = []
+        missing = 0
+        try:
+            with self._cond:
+                missing = max(0, count - self._created)
+                self._created += missing
+            for _ in range(missing):
+                created.append(self._create())
+        except Exception as e:
+            logger.warning(f"⚠️ YoutubeDL pool warm-up failed: {e}")
+        finally:
+            with self._cond:
+                self._created -= missing - len(created)
+                self._idle.extend(created)
+                self._cond.notify_all()
+        self.warm_seconds = round(time.perf_counter() - t0, 3)
+        logger.info(f"🔥 YoutubeDL pool warmed: {len(created)} instance(s) in {self.warm_seconds}s")
+
+    def close(self):
+        with self._cond:
+            idle, self._idle = self._idle, []
+            self._created -= len(idle)
+        for pooled in idle:
+            _close(pooled)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "max_size": self.max_size,
+                "created": self._created,
+                "idle": len(self._idle),
+                "leases": self.leases,
+                "waits": self.waits,
+                "discarded": self.discarded,
+                "warm_seconds": self.warm_seconds,
+            }
+
+
+def _close(pooled):
+    close = getattr(pooled.ydl, "close", None)
+    if close is not None:
+        try:
+            close()
+        except Exception:
+            pass
+
+
+ydl_pool = YoutubeDLPool(YDL_OPTS, max_size=int(os.getenv("YDL_POOL_SIZE", 8)))
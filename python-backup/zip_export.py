@@ -0,0 +1,86 @@
+# --- STREAMING ZIP EXPORT ---
+# Egy batch / soundboard összes klipje egyetlen letöltésben (a frontend useAudioStorage
+# így nem kér fájlonként egy /download-ot). Az archívum menet közben készül: a zipfile
+# egy nem seekelhető writer-be ír (data descriptor-os entry-k), amit minden chunk után
+# kiürítünk - sem memóriában, sem lemezen nincs meg egyben a ZIP.
+# A már tömörített formátumok (mp3, m4a, opus, ogg) STORED entry-k, a wav DEFLATED.
+# Utolsó entry: manifest.json a klipek metaadataival és a kimaradt fájlokkal.
+
+import io
+import json
+import os
+import re
+import time
+import zipfile
+
+CHUNK_SIZE = int(os.getenv("ZIP_CHUNK_SIZE", 256 * 1024))
+DEFLATE_FORMATS = {"wav"}
+MANIFEST_NAME = "manifest.json"
+
+
+class _ChunkWriter(io.RawIOBase):
+    """Nem seekelhető kimenet a zipfile-nak: a megírt byte-ok a következő drain()-ig"""
+
+    def __init__(self):
+        self._chunks = []
+        self.pending = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self.pending += len(data)
+        return len(data)
+
+    def drain(self):
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        self.pending = 0
+        return data
+
+
+def archive_name(metadata, used):
+    """Olvasható, egyedi entry név: "<cím> <start>-<end>.<formátum>" """
+    title = re.sub(r'[\\/:*?"<>|\x00-\x1f]+', "_", str(metadata.get("video_title") or "clip")).strip(" .")[:80]
+    span = f"{metadata.get('start_time', '')}-{metadata.get('end_time', '')}".replace(":", ".")
+    ext = str(metadata.get("output_format") or "bin").lower()
+    base = f"{title or 'clip'} {span}"
+    name, n = f"{base}.{ext}", 1
+    while name in used:
+        n += 1
+        name = f"{base} ({n}).{ext}"
+    used.add(name)
+    return name
+
+
+def iter_zip(items, missing=(), chunk_size=CHUNK_SIZE):
+    """
+    items: [(file_id, path, metadata)] - a ZIP byte-jai chunkonként (generator).
+    missing: [{"file_id", "reason"}] - a manifestbe kerül; a közben eltűnt fájlok is ide jönnek.
+    """
+    out = _ChunkWriter()
+    used = {MANIFEST_NAME}
+    manifest = {"created_at": time.time(), "files": [], "missing": list(missing)}
+    with zipfile.ZipFile(out, "w") as archive:
+        for file_id, path, metadata in items:
+            try:
+                source = open(path, "rb")
+            except OSError:
+                manifest["missing"].append({"file_id": file_id, "reason": "deleted"})
+                continue
+            with source:
+                name = archive_name(metadata, used)
+                info = zipfile.ZipInfo.from_file(path, name)
+                fmt = str(metadata.get("output_format") or "").lower()
+                info.compress_type = zipfile.ZIP_DEFLATED if fmt in DEFLATE_FORMATS else zipfile.ZIP_STORED
+                with archive.open(info, "w") as entry:
+                    while chunk := source.read(chunk_size):
+                        entry.write(chunk)
+                        if out.pending >= chunk_size:
+                            yield out.drain()
+            manifest["files"].append({"file_id": file_id, "name": name, "size": info.file_size, **metadata})
+            if out.pending:
+                yield out.drain()
+        archive.writestr(MANIFEST_NAME, json.dumps(manifest, indent=2, ensure_ascii=False))
+    yield out.drain()